@@ -0,0 +1,292 @@
+import io
+import os
+import struct
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import snapshot
+from core import SAVE_DATA_FILE_NAME, Entity
+
+JOURNAL_MAGIC = b"ECSJ"
+SEGMENT = "<4sIQQQ"
+
+
+def journalName(filename):
+    '''
+    Determina o nome do diário de um arquivo salvo.
+    filename: str o nome do arquivo base.
+    return: str o nome do diário.
+    '''
+    return filename + ".journal"
+
+
+def duplicate(entity):
+    '''
+    Copia a entidade e os seus componentes sem chamar __init__, para que a cópia possa ser salva em outra thread
+    enquanto o jogo continua alterando a original.
+    entity: Entity a entidade copiada.
+    return: Entity a cópia, fora de qualquer cena.
+    '''
+    clone = Entity.restore(entity.id, entity.signature)
+    for signature, component in entity.components.items():
+        copy = component.copy()
+        copy.entity = clone
+        clone.components[signature] = copy
+    return clone
+
+
+def segment(tick, entities, destroyed):
+    '''
+    Codifica um segmento do diário.
+    O segmento é um cabeçalho seguido das entidades no formato do módulo snapshot e dos ids destruídos,
+    tudo alinhado em 8 bytes.
+    tick: int o tick da cena quando as entidades foram copiadas.
+    entities: list[Entity] as entidades alteradas.
+    destroyed: iterable[int] os ids das entidades destruídas.
+    return: bytes o segmento.
+    '''
+    body = io.BytesIO()
+    snapshot.dump(entities, body)
+    ids = array("q", sorted(destroyed))
+    if sys.byteorder != "little":
+        ids.byteswap()
+    data = body.getvalue()
+    return struct.pack(SEGMENT, JOURNAL_MAGIC, 0, tick, len(data), len(ids)) + data + ids.tobytes()
+
+
+def parse(data):
+    '''
+    Percorre os segmentos completos de um diário já lido.
+    Um segmento incompleto no final, deixado por uma escrita interrompida, é ignorado.
+    data: bytes o conteúdo do diário.
+    return: iterator[tuple[int, list[Entity], array[int]]] o tick, as entidades alteradas e os ids destruídos de cada segmento.
+    '''
+    offset = 0
+    header = struct.calcsize(SEGMENT)
+    while offset + header <= len(data):
+        magic, _, tick, size, count = struct.unpack_from(SEGMENT, data, offset)
+        end = offset + header + size + 8 * count
+        if magic != JOURNAL_MAGIC or end > len(data):
+            break
+        entities = snapshot.Snapshot(data[offset + header:offset + header + size]).entities()
+        ids = array("q")
+        ids.frombytes(data[offset + header + size:end])
+        if sys.byteorder != "little":
+            ids.byteswap()
+        yield tick, entities, ids
+        offset = end
+
+
+def segments(filename):
+    '''
+    Percorre os segmentos completos do diário.
+    filename: str o nome do diário.
+    return: iterator[tuple[int, list[Entity], array[int]]] o tick, as entidades alteradas e os ids destruídos de cada segmento.
+    '''
+    if not os.path.exists(filename):
+        return
+    with open(filename, "rb") as infile:
+        data = infile.read()
+    yield from parse(data)
+
+
+def apply(state, entities, destroyed):
+    '''
+    Aplica um segmento sobre o estado.
+    state: dict[int, Entity] as entidades pelo id, alterado no lugar.
+    entities: list[Entity] as entidades alteradas.
+    destroyed: iterable[int] os ids das entidades destruídas.
+    '''
+    for id in destroyed:
+        state.pop(id, None)
+    for entity in entities:
+        state[entity.id] = entity
+
+
+def replay(filename):
+    '''
+    Reconstrói o estado salvo aplicando os segmentos do diário sobre o arquivo base.
+    filename: str o nome do arquivo base.
+    return: dict[int, Entity] as entidades pelo id.
+    '''
+    state = dict()
+    if os.path.exists(filename):
+        with open(filename, "rb") as infile:
+            state = {entity.id: entity for entity in snapshot.Snapshot(infile.read()).entities()}
+    for _, entities, destroyed in segments(journalName(filename)):
+        apply(state, entities, destroyed)
+    return state
+
+
+def compact(filename):
+    '''
+    Incorpora o diário ao arquivo base e esvazia o diário.
+    O novo arquivo base é escrito ao lado e substitui o anterior de forma atômica.
+    filename: str o nome do arquivo base.
+    '''
+    state = replay(filename)
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as outfile:
+        snapshot.dump(state.values(), outfile)
+    os.replace(temporary, filename)
+    open(journalName(filename), "wb").close()
+
+
+def restore(filename, ECS):
+    '''
+    Carrega para a cena o estado do arquivo base com o diário aplicado.
+    O contador de ids do sistema avança para além dos ids carregados.
+    filename: str o nome do arquivo base.
+    ECS: EntityComponentSystem o sistema.
+    '''
+    entities = list(replay(filename).values())
+    ECS.scene.clear()
+    ECS.scene.createMany(entities)
+    ECS.id = max([ECS.id] + [entity.id for entity in entities])
+
+
+class Autosave:
+    '''
+    Salvamento automático incremental em segundo plano.
+    A cada every quadros, frame copia somente as entidades alteradas ou destruídas desde a cópia anterior, usando o
+    rastreamento de alterações da cena, e uma thread acrescenta a cópia ao diário como um segmento. A cada compaction
+    segmentos o diário é incorporado ao arquivo base pela mesma thread.
+    As destruições ficam retidas na cena até serem copiadas, mesmo quando a escrita anterior demora mais que history
+    ticks. Depois de um Scene.clear, como em loadState ou na volta de um rewind, a cena inteira é gravada como novo
+    arquivo base, já que os registros anteriores foram descartados.
+    Componentes que não notificam a cena ao serem alterados devem chamar Scene.modified para serem salvos.
+    ECS: EntityComponentSystem o sistema salvo.
+    filename: str o nome do arquivo base.
+    every: int o número de quadros entre duas cópias.
+    compaction: int o número de segmentos acumulados antes de uma compactação.
+    since: None or int o tick da cópia anterior.
+    future: None or concurrent.futures.Future a escrita em andamento.
+    '''
+    def __init__(self, ECS, filename = SAVE_DATA_FILE_NAME, every = 60, compaction = 32, executor = None):
+        '''
+        ECS: EntityComponentSystem o sistema salvo.
+        filename: str o nome do arquivo base.
+        every: int o número de quadros entre duas cópias.
+        compaction: int o número de segmentos acumulados antes de uma compactação.
+        executor: None or concurrent.futures.Executor o executor das escritas, por padrão uma thread própria.
+        '''
+        self.ECS = ECS
+        self.filename = filename
+        self.every = every
+        self.compaction = compaction
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.since = None
+        self.frames = 0
+        self.written = 0
+        self.future = None
+
+    def start(self):
+        '''
+        Passa a rastrear todos os componentes registrados e grava o estado completo como novo arquivo base.
+        A cópia completa é feita uma única vez, antes do laço do jogo, e avança o tick da cena.
+        '''
+        scene = self.ECS.scene
+        scene.track((1 << len(self.ECS.registry)) - 1)
+        scene.history = max(scene.history, 2 * self.every)
+        self.checkpoint()
+
+    def checkpoint(self):
+        '''
+        Copia todas as entidades da cena e agenda a escrita do novo arquivo base, que esvazia o diário.
+        O tick da cena é avançado, de modo que as alterações seguintes ficam para o próximo segmento.
+        '''
+        scene = self.ECS.scene
+        entities = [duplicate(entity) for entity in scene.entities]
+        self.since = scene.advance()
+        scene.retained[self] = self.since
+        self.wait()
+        self.future = self.executor.submit(self.base, entities)
+        self.written = 0
+
+    def frame(self):
+        '''
+        Deve ser chamado no fim de cada quadro.
+        Quando every quadros passaram e a escrita anterior terminou, copia as entidades alteradas e agenda a escrita
+        do segmento. Se a escrita anterior ainda está em andamento a cópia fica para o próximo quadro.
+        Uma exceção da escrita anterior é propagada.
+        return: bool true se um segmento foi agendado.
+        '''
+        self.frames = self.frames + 1
+        if self.frames < self.every:
+            return False
+        if self.future is not None and not self.future.done():
+            return False
+        self.wait()
+        self.frames = 0
+        self.schedule()
+        return True
+
+    def schedule(self):
+        '''
+        Copia as entidades alteradas ou destruídas desde a cópia anterior e agenda a escrita do segmento, ou de um
+        novo arquivo base quando a cena foi esvaziada por Scene.clear desde a cópia anterior.
+        O tick da cena é avançado, de modo que as alterações seguintes ficam para o próximo segmento.
+        '''
+        scene = self.ECS.scene
+        if scene.cleared is not None and scene.cleared >= self.since:
+            self.checkpoint()
+            return
+        tick = scene.tick
+        changed = scene.changedSince(self.since, (1 << len(self.ECS.registry)) - 1)
+        entities = [duplicate(entity) for entity in changed if entity.scene is scene]
+        destroyed = [entity.id for entity in scene.destroyedSince(self.since) if entity.id not in scene.ids]
+        self.since = scene.advance()
+        scene.retained[self] = self.since
+        if not entities and not destroyed:
+            return
+        self.written = self.written + 1
+        self.future = self.executor.submit(self.append, tick, entities, destroyed, self.written >= self.compaction)
+        if self.written >= self.compaction:
+            self.written = 0
+
+    def base(self, entities):
+        '''
+        Grava o arquivo base e esvazia o diário, na thread de escrita.
+        entities: list[Entity] as cópias de todas as entidades.
+        '''
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as outfile:
+            snapshot.dump(entities, outfile)
+        os.replace(temporary, self.filename)
+        open(journalName(self.filename), "wb").close()
+
+    def append(self, tick, entities, destroyed, compacting):
+        '''
+        Acrescenta um segmento ao diário e compacta quando necessário, na thread de escrita.
+        tick: int o tick da cópia.
+        entities: list[Entity] as cópias das entidades alteradas.
+        destroyed: list[int] os ids das entidades destruídas.
+        compacting: bool true para compactar depois de escrever.
+        '''
+        with open(journalName(self.filename), "ab") as outfile:
+            outfile.write(segment(tick, entities, destroyed))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        if compacting:
+            compact(self.filename)
+
+    def wait(self):
+        '''
+        Espera a escrita em andamento, propagando a sua exceção.
+        '''
+        future, self.future = self.future, None
+        if future is not None:
+            future.result()
+
+    def close(self, save = True):
+        '''
+        Termina o salvamento automático.
+        save: bool true para salvar as alterações pendentes antes de terminar.
+        '''
+        self.wait()
+        if save and self.since is not None:
+            self.schedule()
+            self.wait()
+        self.ECS.scene.retained.pop(self, None)
+        self.executor.shutdown()
@@ -0,0 +1,276 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from core import EntityComponentSystem, Entity, Position, Renderable, Scene, loadState, saveState, update
+from render import Framebuffer
+
+SIZES = (1000, 10000, 100000, 1000000)
+MIXES = {
+    "position": (Position.id,),
+    "renderable": (Renderable.id,),
+    "both": (Position.id, Renderable.id),
+}
+OPERATIONS = ("filter", "add-remove", "update", "save", "load")
+
+
+class DictEntity:
+    '''
+    Réplica da entidade anterior ao uso de __slots__, com um __dict__ por instância.
+    '''
+    def __init__(self, id):
+        self.id = id
+        self.signature = 0
+        self.components = dict()
+
+    def add(self, component):
+        self.signature = self.signature | component.signature
+        self.components[component.signature] = component
+        return self
+
+
+class DictPosition:
+    '''
+    Réplica da posição anterior ao uso de __slots__.
+    '''
+    def __init__(self, x, y):
+        self.signature = Position.id
+        self.x = x
+        self.y = y
+
+
+class DictRenderable:
+    '''
+    Réplica do componente de desenho anterior ao uso de __slots__ e da PALETTE.
+    '''
+    def __init__(self, glyph, foreground):
+        self.signature = Renderable.id
+        self.glyph = glyph
+        self.foreground = foreground
+        self.background = (0, 0, 0, 255)
+
+
+def color(i):
+    '''
+    Cria uma nova tupla de cor, como acontece quando a cor é calculada pelo jogo.
+    i: int o número usado para variar a cor entre poucos valores.
+    return: tupla[int,int,int,int] a cor.
+    '''
+    return tuple([255, i % 4, 0, 255])
+
+
+def compact(i):
+    '''
+    Cria uma entidade com Position e Renderable usando as classes atuais.
+    '''
+    return Entity(EntityComponentSystem).add(Position(i % 4096, 0)).add(Renderable("#", color(i)))
+
+
+def legacy(i):
+    '''
+    Cria uma entidade com Position e Renderable usando as réplicas com __dict__.
+    '''
+    return DictEntity(i).add(DictPosition(i % 4096, 0)).add(DictRenderable("#", color(i)))
+
+
+def bytesPerEntity(factory, count = 100000):
+    '''
+    Mede a memória alocada por entidade com tracemalloc.
+    factory: callable[[int], object] função que cria a i-ésima entidade.
+    count: int o número de entidades criadas.
+    return: float o número médio de bytes por entidade.
+    '''
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    entities = [factory(i) for i in range(count)]
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entities
+    return (end - start) / count
+
+
+def populate(ECS, count, mix):
+    '''
+    Cria uma nova cena com entidades espalhadas pela grade.
+    ECS: EntityComponentSystem o sistema que recebe a cena.
+    count: int o número de entidades.
+    mix: tuple[int] as assinaturas dos componentes de cada entidade.
+    '''
+    ECS.scene = Scene()
+    template = []
+    columns = dict()
+    if Position.id in mix:
+        template.append(Position())
+        columns[Position.id] = {"x": [i % 8192 - 4096 for i in range(count)], "y": [i // 8192 % 8192 - 4096 for i in range(count)]}
+    if Renderable.id in mix:
+        template.append(Renderable("#"))
+    ECS.scene.spawn(ECS, count, template, columns)
+
+
+def percentile(samples, fraction):
+    '''
+    Determina o percentil de amostras já ordenadas pelo método do vizinho mais próximo.
+    samples: list[float] as amostras em ordem crescente.
+    fraction: float a fração entre 0 e 1.
+    return: float o valor do percentil.
+    '''
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def measure(operation, rounds, items = 1):
+    '''
+    Executa a operação várias vezes, medindo a duração de cada execução e o pico de memória de uma execução extra.
+    operation: callable[[], None] a operação medida.
+    rounds: int o número de execuções cronometradas.
+    items: int o número de itens processados por execução, usado para a vazão.
+    return: dict com rounds, mean, p50, p90, p99 e max em segundos, throughput em itens por segundo e peak em bytes.
+    '''
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    gc.collect()
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    median = percentile(samples, 0.5)
+    return {
+        "rounds": rounds,
+        "mean": sum(samples) / rounds,
+        "p50": median,
+        "p90": percentile(samples, 0.9),
+        "p99": percentile(samples, 0.99),
+        "max": samples[-1],
+        "throughput": items / median if median > 0 else None,
+        "peak": peak,
+    }
+
+
+def operations(ECS, count, mix, directory):
+    '''
+    Prepara as operações medidas sobre a cena já populada.
+    ECS: EntityComponentSystem o sistema com a cena.
+    count: int o número de entidades da cena.
+    mix: tuple[int] as assinaturas dos componentes de cada entidade.
+    directory: str a pasta dos arquivos salvos.
+    return: dict[str, tuple[callable[[], None], int]] a operação e o número de itens processados por execução.
+    '''
+    scene = ECS.scene
+    signature = 0
+    for sign in mix:
+        signature = signature | sign
+    sample = list(scene.entities)[:min(count, 1000)]
+    removed = mix[-1]
+    filename = os.path.join(directory, "benchmark-%d-%d.ecs" % (count, signature))
+    ECS.framebuffer = Framebuffer(256, 256)
+
+    def toggle():
+        for entity in sample:
+            component = entity.components[removed]
+            entity.remove(removed)
+            entity.add(component)
+
+    saveState(filename, ECS)
+    return {
+        "filter": (lambda: scene.filter(signature), count),
+        "add-remove": (toggle, 2 * len(sample)),
+        "update": (lambda: update(ECS), count),
+        "save": (lambda: saveState(filename, ECS), count),
+        "load": (lambda: loadState(filename, ECS), count),
+    }
+
+
+def run(sizes = SIZES, mixes = tuple(MIXES), selected = OPERATIONS, budget = 2000000, count = 100000):
+    '''
+    Executa o conjunto de benchmarks para cada tamanho e combinação de componentes.
+    O número de execuções de cada operação diminui com o tamanho da cena para limitar a duração total.
+    sizes: iterable[int] os números de entidades.
+    mixes: iterable[str] os nomes das combinações de MIXES.
+    selected: iterable[str] as operações de OPERATIONS medidas.
+    budget: int o número aproximado de itens processados por operação, somando todas as execuções.
+    count: int o número de entidades criadas para medir a memória por entidade.
+    return: dict o ambiente da execução e a lista de resultados, pronto para ser salvo em JSON.
+    '''
+    ECS = EntityComponentSystem
+    scene, framebuffer = ECS.scene, ECS.framebuffer
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size in sizes:
+                for name in mixes:
+                    mix = MIXES[name]
+                    result = measure(lambda: populate(ECS, size, mix), 1, size)
+                    result.update({"operation": "create", "mix": name, "entities": size})
+                    results.append(result)
+                    measured = operations(ECS, size, mix, directory)
+                    for operation in selected:
+                        function, items = measured[operation]
+                        rounds = max(3, min(100, budget // max(items, 1)))
+                        result = measure(function, rounds, items)
+                        result.update({"operation": operation, "mix": name, "entities": size})
+                        results.append(result)
+    finally:
+        ECS.scene, ECS.framebuffer = scene, framebuffer
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "memory": {"legacy": bytesPerEntity(legacy, count), "compact": bytesPerEntity(compact, count)},
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance = 0.25):
+    '''
+    Compara dois relatórios de run, apontando as operações cuja mediana piorou além da tolerância.
+    baseline: dict o relatório de referência.
+    current: dict o relatório novo.
+    tolerance: float o aumento relativo aceito na mediana.
+    return: list[tuple[str, str, int, float, float]] a operação, a combinação, o número de entidades e as medianas
+    antiga e nova de cada regressão.
+    '''
+    previous = {(r["operation"], r["mix"], r["entities"]): r["p50"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = (result["operation"], result["mix"], result["entities"])
+        if key in previous and result["p50"] > previous[key] * (1 + tolerance):
+            regressions.append(key + (previous[key], result["p50"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o desempenho das operações do ECS.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="números de entidades")
+    parser.add_argument("--mixes", nargs="+", default=tuple(MIXES), choices=tuple(MIXES), help="combinações de componentes")
+    parser.add_argument("--operations", nargs="+", default=OPERATIONS, choices=OPERATIONS, help="operações medidas")
+    parser.add_argument("--count", type=int, default=100000, help="entidades usadas para medir a memória por entidade")
+    parser.add_argument("--output", default="benchmark.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--compare", help="arquivo JSON de uma execução anterior usado como referência")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="aumento relativo aceito na mediana")
+    args = parser.parse_args()
+    report = run(args.sizes, args.mixes, args.operations, count=args.count)
+    with open(args.output, "w") as outfile:
+        json.dump(report, outfile, indent=2)
+    for r in report["results"]:
+        print("%-10s %-10s %8d  p50 %10.6fs  p99 %10.6fs  %12.0f/s  pico %10d bytes"
+              % (r["operation"], r["mix"], r["entities"], r["p50"], r["p99"], r["throughput"] or 0, r["peak"]))
+    memory = report["memory"]
+    print("bytes por entidade com __dict__: %.1f" % memory["legacy"])
+    print("bytes por entidade com __slots__: %.1f" % memory["compact"])
+    print("redução: %.1f%%" % (100 * (memory["legacy"] - memory["compact"]) / memory["legacy"]))
+    if args.compare:
+        with open(args.compare) as infile:
+            regressions = compare(json.load(infile), report, args.tolerance)
+        for operation, mix, count, before, after in regressions:
+            print("regressão: %s %s %d de %.6fs para %.6fs" % (operation, mix, count, before, after))
+        sys.exit(1 if regressions else 0)
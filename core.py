@@ -1,36 +1,277 @@
 
 
+import gc
+import heapq
 import pickle
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from itertools import chain, repeat
+from operator import attrgetter, itemgetter, lshift, or_
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 SAVE_DATA_FILE_NAME = "./save.data"
 
+WHITE = (255, 255, 255, 255)
+BLACK = (0, 0, 0, 255)
+PALETTE = {WHITE: WHITE, BLACK: BLACK}
+PALETTE_SIZE = 4096
+SLOTS = dict()
+
+
+def color(value):
+    '''
+    Normaliza uma cor, convertendo listas em tuplas, e troca as cores já vistas pela tupla guardada na PALETTE, de modo
+    que componentes com a mesma cor compartilham a mesma tupla.
+    A PALETTE guarda no máximo PALETTE_SIZE cores, as cores vistas depois disso não são compartilhadas.
+    value: tuple or list[int] a cor (r, g, b, a).
+    return: tuple[int, int, int, int] or object a cor, o próprio valor quando não é uma tupla nem uma lista.
+    '''
+    if isinstance(value, list):
+        value = tuple(value)
+    if not isinstance(value, tuple):
+        return value
+    try:
+        shared = PALETTE.get(value)
+    except TypeError:
+        return value
+    if shared is not None:
+        return shared
+    if len(PALETTE) < PALETTE_SIZE:
+        PALETTE[value] = value
+    return value
+
 
 class Component:
     '''Representação de um componente do sistema'''
+    __slots__ = ("signature", "entity")
+
     def __init__(self, signature):
-        ''' signature: int indica o tipo do componente'''
+        '''
+        signature: int indica o tipo do componente
+        entity: None or Entity a entidade à qual o componente está associado
+        '''
         self.signature = signature
+        self.entity = None
+
+    def __init_subclass__(cls, **kwargs):
+        '''
+        Associa a classe à assinatura reservada no registro em que ela foi obtida, quando a classe declara id.
+        '''
+        super().__init_subclass__(**kwargs)
+        signature = cls.__dict__.get("id")
+        if isinstance(signature, int) and signature in RESERVED:
+            RESERVED[signature].bind(signature, cls)
+
+    def copy(self):
+        '''
+        Cria uma cópia rasa do componente sem chamar __init__, desassociada de qualquer entidade.
+        return: Component a cópia do componente.
+        '''
+        cls = type(self)
+        clone = cls.__new__(cls)
+        for name in slots(cls):
+            setattr(clone, name, getattr(self, name))
+        if hasattr(self, "__dict__"):
+            clone.__dict__.update(self.__dict__)
+        clone.entity = None
+        return clone
+
+    @classmethod
+    def check(cls, field, values):
+        '''
+        Valida os valores de um campo atribuídos em lote, sem passar pelo __init__.
+        Gera ValueError para valores inválidos.
+        field: str o nome do campo.
+        values: sequence os valores atribuídos.
+        '''
+        pass
+
+    def __setstate__(self, state):
+        '''
+        Restaura o estado salvo pelo pickle, inclusive o de versões anteriores que não usavam __slots__.
+        state: dict or tuple[dict, dict] o estado salvo.
+        '''
+        self.entity = None
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+def bits(signature):
+    '''
+    Percorre os bits ligados de uma máscara, do menos para o mais significativo.
+    signature: int a máscara de bits.
+    return: iterator[int] cada bit como uma potência de 2.
+    '''
+    while signature:
+        bit = signature & -signature
+        yield bit
+        signature = signature ^ bit
+
+
+def slots(cls):
+    '''
+    Determina os nomes de todos os __slots__ da classe e das suas bases.
+    cls: type a classe consultada.
+    return: list[str] os nomes dos slots, das bases para a classe.
+    '''
+    names = SLOTS.get(cls)
+    if names is None:
+        names = []
+        for base in reversed(cls.__mro__):
+            for name in base.__dict__.get("__slots__", ()):
+                if name not in ("__dict__", "__weakref__"):
+                    names.append(name)
+        SLOTS[cls] = names
+    return names
+
+
+@contextmanager
+def paused():
+    '''
+    Desliga o coletor de lixo durante o bloco e restaura depois o estado anterior, mesmo em caso de erro.
+    Usado ao construir muitos objetos de uma vez, que não formam ciclos a coletar.
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def assign(objects, name, values):
+    '''
+    Atribui a cada objeto o valor correspondente do campo, com o laço executado em C.
+    objects: iterable[object] os objetos alterados.
+    name: str o nome do campo.
+    values: iterable os valores, um por objeto.
+    '''
+    deque(map(setattr, objects, repeat(name), values), 0)
+
+
+class ComponentRegistry:
+    '''
+    Registro dos tipos de componente de um mundo, com um índice denso por tipo.
+    A assinatura de um tipo é o bit do seu índice e as máscaras ficam limitadas a width bits, de modo que as operações
+    entre máscaras têm custo limitado independentemente de quantos tipos existem em outros mundos.
+    width: int o número máximo de tipos.
+    types: list[None or type] o tipo de cada índice, None enquanto a classe ainda não foi associada.
+    indexes: dict[type, int] o índice de cada tipo associado.
+    '''
+    __slots__ = ("width", "types", "indexes")
+
+    def __init__(self, width = 256):
+        '''
+        width: int o número máximo de tipos.
+        '''
+        self.width = width
+        self.types = []
+        self.indexes = dict()
+
+    def register(self, component = None):
+        '''
+        Reserva o próximo índice.
+        Gera OverflowError quando o registro já tem width tipos.
+        component: None or type o tipo do componente, que pode ser associado depois com bind.
+        return: int a assinatura do tipo.
+        '''
+        index = len(self.types)
+        if index >= self.width:
+            raise OverflowError()
+        self.types.append(None)
+        signature = 1 << index
+        RESERVED[signature] = self
+        if component is not None:
+            self.bind(signature, component)
+        return signature
+
+    def bind(self, signature, component):
+        '''
+        Associa um tipo à assinatura já reservada.
+        signature: int a assinatura reservada.
+        component: type o tipo do componente.
+        '''
+        index = self.index(signature)
+        self.types[index] = component
+        self.indexes[component] = index
+        if RESERVED.get(signature) is self:
+            del RESERVED[signature]
+
+    @staticmethod
+    def index(signature):
+        '''
+        Determina o índice de uma assinatura.
+        signature: int a assinatura de um tipo.
+        return: int o índice do tipo.
+        '''
+        return signature.bit_length() - 1
+
+    def mask(self, *components):
+        '''
+        Constrói a máscara de um conjunto de tipos.
+        components: list[type] os tipos registrados.
+        return: int a máscara de bits.
+        '''
+        signature = 0
+        for component in components:
+            signature = signature | (1 << self.indexes[component])
+        return signature
+
+    def components(self, signature):
+        '''
+        Recupera os tipos de uma máscara.
+        signature: int a máscara de bits.
+        return: list[None or type] os tipos na ordem dos índices.
+        '''
+        return [self.types[self.index(bit)] for bit in bits(signature)]
+
+    def __len__(self):
+        '''
+        Determina o número de tipos registrados.
+        return: int o número de índices reservados.
+        '''
+        return len(self.types)
+
+
+RESERVED = dict()
 
 
 class EntityComponentSystem:
     '''
     Representa o sistema do jogo.
-    signature: int contador das assinaturas dos componentes em potências de 2
+    Um mundo com seus próprios tipos de componente é uma subclasse com outro registry, cujas assinaturas
+    começam novamente do bit 0.
+    registry: ComponentRegistry o registro dos tipos de componente do mundo.
+    signature: int a próxima assinatura do registro, em potência de 2
     id: int contador dos identificadores do sistema
     scene: Scene cena atual do jogo
+    framebuffer: None or render.Framebuffer tela onde update desenha as entidades
+    camera: None or Camera janela do mundo desenhada por update, por padrão todas as entidades são desenhadas
     '''
+    registry = ComponentRegistry()
     signature = 1
     id = 0
     scene = None
+    framebuffer = None
+    camera = None
 
     @classmethod
-    def nextSignature(cls):
+    def nextSignature(cls, component = None):
         '''
-        retorna uma nova assinatura e incrementa o contador para o próximo valor em potência de 2
+        Reserva o próximo índice denso do registro do mundo.
+        component: None or type o tipo do componente, associado automaticamente quando a classe declara id.
         return: int a nova assinatura
         '''
-        current = cls.signature
-        cls.signature = cls.signature << 1
+        current = cls.registry.register(component)
+        cls.signature = current << 1
         return current
 
     @classmethod
@@ -42,19 +283,51 @@ class EntityComponentSystem:
         cls.id += 1
         return cls.id
 
+    @classmethod
+    def nextIds(cls, count):
+        '''
+        retorna um bloco de novos ids consecutivos e avança o contador de uma só vez
+        count: int o número de ids
+        return: range os novos identificadores
+        '''
+        first = cls.id + 1
+        cls.id += count
+        return range(first, cls.id + 1)
+
 
 class Entity:
+    __slots__ = ("id", "signature", "components", "scene", "handle")
+
     def __init__(self, ECS):
         '''
         id: int identificador único da entidade
         signature: int representa os tipos dos componentes associados utilizando máscara de bits
         components: dict[int, Component] representa todos os componentes do sistema associando a assinatura ao componente
+        scene: None or Scene a cena onde a entidade foi criada
+        handle: None or int o handle geracional da entidade na cena, None fora de uma cena
         '''
         self.id = ECS.nextId()
         self.signature = 0
         self.components = dict()
+        self.scene = None
+        self.handle = None
+
+    @classmethod
+    def restore(cls, id, signature = 0):
+        '''
+        Cria uma entidade sem componentes com um id já alocado, sem consumir o contador do sistema.
+        id: int o identificador da entidade.
+        signature: int a assinatura da entidade.
+        return: Entity a nova entidade.
+        '''
+        entity = cls.__new__(cls)
+        entity.id = id
+        entity.signature = signature
+        entity.components = dict()
+        entity.scene = None
+        entity.handle = None
+        return entity
 
-    
     def add(self, component):
         '''
         Adiciona um componente à entidade.
@@ -66,8 +339,12 @@ class Entity:
         '''
         if self.has(component.signature):
             raise ValueError()
+        previous = self.signature
         self.signature = component.signature | self.signature
         self.components[component.signature] = component
+        component.entity = self
+        if self.scene is not None:
+            self.scene.refresh(self, previous)
         return self
 
     
@@ -81,8 +358,11 @@ class Entity:
         '''
         if not self.has(signature):
             raise ValueError()
+        previous = self.signature
         self.signature = self.signature & ~signature
-        self.components.pop(signature)
+        self.components.pop(signature).entity = None
+        if self.scene is not None:
+            self.scene.refresh(self, previous)
 
     def has(self, signature):
         '''
@@ -125,21 +405,486 @@ class Entity:
         '''
         return self.id
 
+    def __getstate__(self):
+        '''
+        Determina o estado salvo pelo pickle.
+        A referência para a cena não é salva, ela é restaurada quando a entidade é criada novamente.
+        return: dict o estado da entidade.
+        '''
+        return {"id": self.id, "signature": self.signature, "components": self.components, "scene": None}
+
+    def __setstate__(self, state):
+        '''
+        Restaura o estado salvo pelo pickle.
+        state: dict o estado da entidade.
+        '''
+        self.scene = None
+        self.handle = None
+        for name, value in state.items():
+            setattr(self, name, value)
+        for component in self.components.values():
+            component.entity = self
+
+
+def clone(template, count, columns = None, ids = None):
+    '''
+    Constrói várias entidades fora de qualquer cena, a partir dos mesmos componentes.
+    Os componentes são copiados sem chamar __init__ e cada campo é atribuído coluna a coluna, com o laço
+    executado em C. Um campo exposto por propriedade é atribuído diretamente no slot de mesmo nome com o prefixo _.
+    Gera ValueError se uma coluna não tem count valores ou tem valores inválidos para o componente.
+    template: list[Component] os componentes copiados para cada entidade.
+    count: int o número de entidades.
+    columns: None or dict[int, dict[str, sequence]] para cada assinatura, os valores de cada campo, um por entidade.
+    ids: None or iterable[int] os ids das entidades, None para deixá-las sem id.
+    return: list[Entity] as novas entidades.
+    '''
+    columns = columns or dict()
+    signatures = [component.signature for component in template]
+    signature = 0
+    for sign in signatures:
+        signature = signature | sign
+    for component in template:
+        for field, values in columns.get(component.signature, dict()).items():
+            if len(values) != count:
+                raise ValueError()
+            type(component).check(field, values)
+    entities = list(map(object.__new__, repeat(Entity, count)))
+    assign(entities, "id", repeat(None, count) if ids is None else ids)
+    assign(entities, "signature", repeat(signature, count))
+    assign(entities, "scene", repeat(None, count))
+    assign(entities, "handle", repeat(None, count))
+    clones = []
+    for component in template:
+        cls = type(component)
+        names = slots(cls)
+        fields = dict()
+        for field, values in columns.get(component.signature, dict()).items():
+            fields["_" + field if "_" + field in names else field] = values
+        copies = list(map(object.__new__, repeat(cls, count)))
+        for name in names:
+            if name != "entity" and name not in fields and hasattr(component, name):
+                assign(copies, name, repeat(getattr(component, name), count))
+        if hasattr(component, "__dict__"):
+            for copy in copies:
+                copy.__dict__.update(component.__dict__)
+        assign(copies, "entity", entities)
+        for field, values in fields.items():
+            assign(copies, field, values)
+        clones.append(copies)
+    assign(entities, "components", map(dict, map(zip, repeat(signatures), zip(*clones))))
+    return entities
+
+
+class Handles:
+    '''
+    Tabela densa das entidades de uma cena endereçadas por handles geracionais.
+    Um handle combina a posição da entidade na tabela com a geração da posição, handle = geração << 32 | posição.
+    As posições liberadas são reutilizadas com a geração incrementada, o que invalida os handles antigos e mantém a
+    tabela do tamanho do maior número de entidades vivas ao mesmo tempo.
+    slots: list[None or Entity] a entidade de cada posição.
+    generations: array[int] a geração atual de cada posição.
+    free: list[int] as posições liberadas.
+    '''
+    __slots__ = ("slots", "generations", "free")
 
-class Scene:
     def __init__(self):
+        self.slots = []
+        self.generations = array("I")
+        self.free = []
+
+    def allocate(self, entity):
+        '''
+        Reserva uma posição para a entidade e define o seu handle.
+        entity: Entity a entidade.
+        '''
+        if self.free:
+            index = self.free.pop()
+            self.slots[index] = entity
+        else:
+            index = len(self.slots)
+            self.slots.append(entity)
+            self.generations.append(0)
+        entity.handle = (self.generations[index] << 32) | index
+
+    def allocateMany(self, entities):
+        '''
+        Reserva posições para várias entidades, reutilizando primeiro as posições liberadas.
+        entities: iterable[Entity] as entidades.
+        '''
+        if not isinstance(entities, list):
+            entities = list(entities)
+        reused = min(len(entities), len(self.free))
+        if reused:
+            indexes = self.free[len(self.free) - reused:]
+            indexes.reverse()
+            del self.free[len(self.free) - reused:]
+            deque(map(self.slots.__setitem__, indexes, entities), 0)
+            generations = map(self.generations.__getitem__, indexes)
+            assign(entities[:reused], "handle", map(or_, map(lshift, generations, repeat(32)), indexes))
+        fresh = entities[reused:] if reused else entities
+        start = len(self.slots)
+        self.slots.extend(fresh)
+        self.generations.frombytes(bytes(self.generations.itemsize * len(fresh)))
+        assign(fresh, "handle", range(start, start + len(fresh)))
+
+    def release(self, entity):
+        '''
+        Libera a posição da entidade, invalidando o seu handle.
+        entity: Entity a entidade.
+        '''
+        index = entity.handle & 0xFFFFFFFF
+        self.slots[index] = None
+        self.generations[index] = (self.generations[index] + 1) & 0xFFFFFFFF
+        self.free.append(index)
+        entity.handle = None
+
+    def resolve(self, handle):
+        '''
+        Recupera a entidade de um handle.
+        handle: int o handle.
+        return: None or Entity a entidade, ou None se o handle não é mais válido.
+        '''
+        index = handle & 0xFFFFFFFF
+        if index < len(self.slots) and self.generations[index] == handle >> 32:
+            return self.slots[index]
+        return None
+
+    def clear(self):
+        '''
+        Libera todas as posições, invalidando todos os handles.
+        '''
+        self.slots = [None] * len(self.slots)
+        self.generations = array("I", [(generation + 1) & 0xFFFFFFFF for generation in self.generations])
+        self.free = list(range(len(self.slots) - 1, -1, -1))
+
+
+class Archetype:
+    '''
+    Tabela que armazena juntas as entidades que possuem a mesma assinatura.
+    signature: int a assinatura comum a todas as entidades da tabela.
+    entities: list[Entity] as entidades da tabela, uma por linha.
+    columns: dict[int, list[Component]] uma coluna por componente da assinatura, alinhada com as entidades.
+    rows: dict[Entity, int] a linha ocupada por cada entidade.
+    '''
+    def __init__(self, signature):
+        '''
+        Cria uma tabela vazia para a assinatura.
+        signature: int a assinatura da tabela.
+        '''
+        self.signature = signature
+        self.entities = []
+        self.columns = dict()
+        self.rows = dict()
+        for bit in bits(signature):
+            self.columns[bit] = []
+
+    def insert(self, entity):
+        '''
+        Insere a entidade no final da tabela copiando as referências dos seus componentes para as colunas.
+        entity: Entity entidade sendo inserida.
+        '''
+        self.rows[entity] = len(self.entities)
+        self.entities.append(entity)
+        for signature, column in self.columns.items():
+            column.append(entity.components[signature])
+
+    def extend(self, entities):
+        '''
+        Insere várias entidades no final da tabela preenchendo cada coluna de uma só vez.
+        entities: list[Entity] entidades com a assinatura da tabela.
+        '''
+        start = len(self.entities)
+        self.rows.update(zip(entities, range(start, start + len(entities))))
+        self.entities.extend(entities)
+        for signature, column in self.columns.items():
+            column.extend([entity.components[signature] for entity in entities])
+
+    def delete(self, entity):
+        '''
+        Remove a entidade da tabela movendo a última linha para a posição liberada.
+        entity: Entity entidade sendo removida.
+        '''
+        row = self.rows.pop(entity)
+        last = self.entities.pop()
+        if last is not entity:
+            self.entities[row] = last
+            self.rows[last] = row
+        for column in self.columns.values():
+            value = column.pop()
+            if last is not entity:
+                column[row] = value
+
+    def __len__(self):
+        '''
+        Determina o número de entidades da tabela.
+        return: int o número de linhas.
+        '''
+        return len(self.entities)
+
+
+class Query:
+    '''
+    Consulta compilada com as máscaras all, none e any e um predicado opcional, guardada pela cena em Scene.compile.
+    O plano da consulta é escolhido a cada execução entre as consultas persistentes da cena que contêm o resultado:
+    a consulta de all, ou a união das consultas de all com cada bit de any. É percorrida a alternativa com menos
+    entidades no momento, e somente essas entidades são testadas contra none, any e o predicado.
+    No armazenamento por arquétipos as tabelas que satisfazem as três máscaras são determinadas uma única vez
+    e mantidas pela cena, de modo que o custo é proporcional ao resultado.
+    all: int os componentes exigidos.
+    none: int os componentes proibidos.
+    any: int os componentes dos quais pelo menos um é exigido, 0 para nenhuma exigência.
+    where: None or callable o predicado aplicado a cada entidade que satisfaz as máscaras.
+    sources: list[tuple[int, ...]] as alternativas de plano, cada uma com as máscaras das consultas persistentes unidas.
+    A última alternativa, quando any é usado, já garante any e dispensa o seu teste.
+    tables: None or list[Archetype] as tabelas que satisfazem as máscaras, no armazenamento por arquétipos.
+    base: None or Query a consulta sem predicado cujo resultado é filtrado por where, criada por filtered.
+    '''
+    __slots__ = ("all", "none", "any", "where", "sources", "tables", "base")
+
+    def __init__(self, all = 0, none = 0, any = 0, where = None):
+        '''
+        all: int os componentes exigidos.
+        none: int os componentes proibidos.
+        any: int os componentes dos quais pelo menos um é exigido, 0 para nenhuma exigência.
+        where: None or callable o predicado aplicado a cada entidade que satisfaz as máscaras.
+        '''
+        self.all = all
+        self.none = none
+        self.any = any & ~none
+        self.where = where
+        self.tables = None
+        self.base = None
+        if all & none or (any and not self.any):
+            self.sources = []
+        elif self.any:
+            self.sources = [(all,), tuple(all | bit for bit in bits(self.any))]
+        else:
+            self.sources = [(all,)]
+
+    def filtered(self, where):
+        '''
+        Cria uma consulta que aplica o predicado ao resultado desta, compartilhando o seu plano e as suas tabelas.
+        where: callable o predicado aplicado a cada entidade que satisfaz as máscaras.
+        return: Query a nova consulta, que não é guardada pela cena.
+        '''
+        query = Query(self.all, self.none, self.any, where)
+        query.base = self
+        return query
+
+    def accepts(self, signature):
+        '''
+        Verifica se uma assinatura satisfaz as três máscaras.
+        signature: int a assinatura de uma entidade ou tabela.
+        return: bool true se a assinatura satisfaz a consulta.
+        '''
+        return ((signature & self.all) == self.all and not signature & self.none
+                and (not self.any or signature & self.any))
+
+    def plan(self, scene):
+        '''
+        Escolhe a alternativa com menos entidades candidatas.
+        scene: Scene a cena consultada.
+        return: tuple[list[set[Entity]], bool] as consultas persistentes cuja união contém o resultado e se any
+        já é garantido por elas.
+        '''
+        best = []
+        cost = None
+        exact = True
+        for i, masks in enumerate(self.sources):
+            candidates = [scene.query(mask) for mask in masks]
+            total = sum(map(len, candidates))
+            if cost is None or total < cost:
+                best = candidates
+                cost = total
+                exact = not self.any or i == len(self.sources) - 1
+        return best, exact
+
+    def run(self, scene):
+        '''
+        Executa a consulta.
+        scene: Scene a cena consultada.
+        return: set[Entity] as entidades que satisfazem as máscaras e o predicado.
+        '''
+        if self.base is not None:
+            result = self.base.run(scene)
+        elif scene.archetypes is not None:
+            if self.tables is None:
+                if scene.pending is not None:
+                    for masks in self.sources[-1:]:
+                        for mask in masks:
+                            scene.pending.load(mask)
+                self.tables = [table for table in scene.archetypes.values() if self.accepts(table.signature)]
+            result = set(chain.from_iterable([table.entities for table in self.tables]))
+        else:
+            sets, exact = self.plan(scene)
+            result = set()
+            for candidates in sets:
+                if exact and not self.none:
+                    result.update(candidates)
+                else:
+                    result.update([entity for entity in candidates if self.accepts(entity.signature)])
+        if self.where is not None:
+            result = set(filter(self.where, result))
+        return result
+
+
+class Scene:
+    def __init__(self, archetypes = False):
         '''
         Cria uma nova cena do jogo.
         entities: set[Entity] representa as entidades presentes no jogo.
+        queries: dict[int, set[Entity]] consultas registradas associando a máscara de bits às entidades que a satisfazem.
+        archetypes: None or dict[int, Archetype] as tabelas por assinatura quando o armazenamento por arquétipos está ativo.
+        tables: dict[int, list[Archetype]] as tabelas que satisfazem cada máscara já consultada.
+        stores: dict[int, ComponentColumns] os componentes armazenados em colunas contíguas, por assinatura.
+        observers: list[object] os objetos registrados por observe, avisados quando uma entidade passa a ter ou deixa
+        de ter todos os componentes da sua assinatura.
+        spatial: None or SpatialIndex o índice espacial das posições, criado pela primeira chamada de spatialIndex.
+        pending: None or snapshot.LazySnapshot as entidades salvas que ainda não foram carregadas para a cena.
+        tick: int o número do quadro atual, avançado por advance.
+        changes: dict[int, dict[Entity, int]] para cada componente rastreado, o último tick em que cada entidade o alterou,
+        em ordem de alteração.
+        destroyed: dict[Entity, int] o tick em que cada entidade foi destruída, mantido por history ticks.
+        history: int por quantos ticks as entidades destruídas são lembradas.
+        retained: dict[object, int] o primeiro tick ainda não consumido por cada leitor das entidades destruídas, que
+        não são esquecidas a partir do menor deles, mesmo depois de history ticks.
+        cleared: None or int o tick da última chamada de clear, que esquece as alterações e destruições anteriores.
+        commands: Commands as alterações estruturais adiadas até o próximo ponto de sincronização.
+        ids: dict[int, Entity] as entidades da cena pelo identificador.
+        handles: Handles a tabela dos handles geracionais das entidades da cena.
+        plans: dict[tuple[int, int, int], Query] as consultas sem predicado compiladas por compile.
         '''
         self.entities = set()
+        self.queries = dict()
+        self.archetypes = dict() if archetypes else None
+        self.tables = dict()
+        self.stores = dict()
+        self.observers = []
+        self.spatial = None
+        self.pending = None
+        self.tick = 0
+        self.changes = dict()
+        self.destroyed = dict()
+        self.history = 256
+        self.retained = dict()
+        self.cleared = None
+        self.commands = Commands(self)
+        self.ids = dict()
+        self.handles = Handles()
+        self.plans = dict()
 
     def create(self, entity):
         '''
         Adiciona uma nova entidade ao jogo.
+        As consultas registradas que a entidade satisfaz passam a incluí-la. Uma entidade que já está na cena é ignorada.
         entity: Entity entidade sendo adicionada
         '''
+        if entity.scene is self:
+            return
         self.entities.add(entity)
+        entity.scene = self
+        self.ids[entity.id] = entity
+        self.handles.allocate(entity)
+        for signature, columns in self.stores.items():
+            if entity.has(signature):
+                columns.insert(entity)
+        if self.archetypes is not None:
+            self.archetype(entity.signature).insert(entity)
+        if self.spatial is not None and entity.has(Position.id):
+            self.spatial.insert(entity)
+        for observer in self.observers:
+            if (entity.signature & observer.signature) == observer.signature:
+                observer.insert(entity)
+        if self.changes:
+            self.record(entity, entity.signature)
+        for signature, matches in self.queries.items():
+            if (entity.signature & signature) == signature:
+                matches.add(entity)
+
+    def createMany(self, entities):
+        '''
+        Adiciona várias entidades ao jogo de uma só vez.
+        As entidades são agrupadas por assinatura e cada consulta registrada é atualizada uma vez por grupo.
+        As entidades que já estão na cena são ignoradas.
+        entities: list[Entity] entidades sendo adicionadas.
+        '''
+        entities = [entity for entity in entities if entity.scene is not self]
+        assign(entities, "scene", repeat(self, len(entities)))
+        signatures = set(map(attrgetter("signature"), entities))
+        if len(signatures) == 1:
+            groups = {signatures.pop(): entities}
+        else:
+            groups = dict()
+            for entity in entities:
+                group = groups.get(entity.signature)
+                if group is None:
+                    group = []
+                    groups[entity.signature] = group
+                group.append(entity)
+        self.entities.update(entities)
+        self.ids.update(zip(map(attrgetter("id"), entities), entities))
+        self.handles.allocateMany(entities)
+        for signature, group in groups.items():
+            for mask, columns in self.stores.items():
+                if signature & mask:
+                    for entity in group:
+                        columns.insert(entity)
+            if self.archetypes is not None:
+                self.archetype(signature).extend(group)
+            if self.spatial is not None and signature & Position.id:
+                for entity in group:
+                    self.spatial.insert(entity)
+            for observer in self.observers:
+                if (signature & observer.signature) == observer.signature:
+                    for entity in group:
+                        observer.insert(entity)
+            if self.changes:
+                for entity in group:
+                    self.record(entity, signature)
+            for mask, matches in self.queries.items():
+                if (signature & mask) == mask:
+                    matches.update(group)
+
+    def spawn(self, ECS, count, template, columns = None):
+        '''
+        Cria várias entidades a partir dos mesmos componentes, com ids alocados em bloco.
+        As entidades são construídas por clone e o coletor de lixo fica desligado durante a construção.
+        ECS: EntityComponentSystem o sistema que fornece os ids.
+        count: int o número de entidades.
+        template: list[Component] os componentes copiados para cada entidade.
+        columns: None or dict[int, dict[str, sequence]] para cada assinatura, os valores de cada campo, um por entidade.
+        return: list[Entity] as novas entidades.
+        '''
+        with paused():
+            entities = clone(template, count, columns, ECS.nextIds(count))
+            self.createMany(entities)
+        return entities
+
+    def destroyMany(self, entities):
+        '''
+        Remove várias entidades do jogo de uma só vez.
+        entities: list[Entity] entidades presentes no jogo.
+        '''
+        entities = list(entities)
+        self.entities.difference_update(entities)
+        for entity in entities:
+            entity.scene = None
+            del self.ids[entity.id]
+            self.handles.release(entity)
+            if self.archetypes is not None:
+                self.archetypes[entity.signature].delete(entity)
+            for columns in self.stores.values():
+                if entity in columns.rows:
+                    columns.delete(entity)
+            if self.spatial is not None and entity in self.spatial.chunks:
+                self.spatial.delete(entity)
+            for observer in self.observers:
+                if (entity.signature & observer.signature) == observer.signature:
+                    observer.delete(entity)
+            if self.changes:
+                self.forget(entity)
+        for matches in self.queries.values():
+            matches.difference_update(entities)
 
     def destroy(self, entity):
         '''
@@ -147,17 +892,843 @@ class Scene:
         entity: Entity entidade sendo removida.
         '''
         self.entities.remove(entity)
+        entity.scene = None
+        del self.ids[entity.id]
+        self.handles.release(entity)
+        if self.archetypes is not None:
+            self.archetypes[entity.signature].delete(entity)
+        for columns in self.stores.values():
+            if entity in columns.rows:
+                columns.delete(entity)
+        if self.spatial is not None and entity in self.spatial.chunks:
+            self.spatial.delete(entity)
+        for observer in self.observers:
+            if (entity.signature & observer.signature) == observer.signature:
+                observer.delete(entity)
+        if self.changes:
+            self.forget(entity)
+        for matches in self.queries.values():
+            matches.discard(entity)
+
+    def clear(self):
+        '''
+        Remove todas as entidades do jogo mantendo as consultas registradas.
+        Os registros de alterações e destruições são esvaziados e o tick atual é guardado em cleared, de modo que
+        quem lê esses registros sabe que precisa copiar a cena inteira.
+        '''
+        for entity in self.entities:
+            entity.scene = None
+            entity.handle = None
+        self.entities = set()
+        self.ids = dict()
+        self.handles.clear()
+        for columns in self.stores.values():
+            for entity in list(columns.entities):
+                columns.delete(entity)
+        if self.spatial is not None:
+            self.spatial = SpatialIndex(self.spatial.size)
+        for observer in self.observers:
+            observer.clear()
+        for matches in self.queries.values():
+            matches.clear()
+        if self.archetypes is not None:
+            self.archetypes = dict()
+            self.tables = dict()
+            self.plans = dict()
+        if self.pending is not None:
+            self.pending.close()
+            self.pending = None
+        for log in self.changes.values():
+            log.clear()
+        self.destroyed = dict()
+        self.cleared = self.tick
+        self.commands.clear()
+
+    def defer(self, pending):
+        '''
+        Associa à cena entidades salvas que serão carregadas sob demanda.
+        Nenhuma entidade é carregada aqui: as consultas e tabelas já registradas são descartadas, de modo que cada
+        máscara carrega as suas entidades somente quando for consultada de novo, ou cada entidade quando for
+        procurada pelo id.
+        pending: snapshot.LazySnapshot as entidades ainda não carregadas.
+        '''
+        self.pending = pending
+        self.queries = dict()
+        self.tables = dict()
+        self.plans = dict()
+
+    def find(self, id):
+        '''
+        Procura a entidade com o identificador especificado, carregando-a se ainda estiver pendente.
+        id: int o identificador da entidade.
+        return: None or Entity a entidade encontrada.
+        '''
+        entity = self.ids.get(id)
+        if entity is None and self.pending is not None:
+            entity = self.pending.entity(id)
+        return entity
+
+    def resolve(self, handle):
+        '''
+        Recupera a entidade de um handle geracional.
+        handle: int o handle obtido de Entity.handle enquanto a entidade estava na cena.
+        return: None or Entity a entidade, ou None se ela foi destruída.
+        '''
+        return self.handles.resolve(handle)
+
+    def refresh(self, entity, previous):
+        '''
+        Atualiza as consultas registradas após uma mudança na assinatura da entidade.
+        Somente as consultas que envolvem os bits alterados são verificadas.
+        No armazenamento por arquétipos a entidade migra para a tabela da nova assinatura.
+        entity: Entity entidade cuja assinatura foi alterada.
+        previous: int a assinatura da entidade antes da alteração.
+        '''
+        changed = previous ^ entity.signature
+        for signature, columns in self.stores.items():
+            if signature & changed:
+                if entity.has(signature):
+                    columns.insert(entity)
+                else:
+                    columns.delete(entity)
+        if self.archetypes is not None:
+            self.archetypes[previous].delete(entity)
+            self.archetype(entity.signature).insert(entity)
+        if self.spatial is not None and Position.id & changed:
+            if entity.has(Position.id):
+                self.spatial.insert(entity)
+            else:
+                self.spatial.delete(entity)
+        for observer in self.observers:
+            if observer.signature & changed:
+                before = (previous & observer.signature) == observer.signature
+                after = (entity.signature & observer.signature) == observer.signature
+                if after and not before:
+                    observer.insert(entity)
+                elif before and not after:
+                    observer.delete(entity)
+        if self.changes:
+            self.record(entity, changed)
+        for signature, matches in self.queries.items():
+            if signature & changed:
+                if (entity.signature & signature) == signature:
+                    matches.add(entity)
+                else:
+                    matches.discard(entity)
+
+    def store(self, columns):
+        '''
+        Passa a armazenar o componente das colunas em arrays contíguos.
+        As entidades da cena que já possuem o componente são copiadas para as colunas e passam a usar views.
+        columns: ComponentColumns as colunas que armazenarão o componente.
+        return: ComponentColumns as colunas registradas.
+        '''
+        self.stores[columns.signature] = columns
+        columns.scene = self
+        for entity in self.entities:
+            if entity.has(columns.signature):
+                columns.insert(entity)
+                if self.archetypes is not None:
+                    table = self.archetypes[entity.signature]
+                    table.columns[columns.signature][table.rows[entity]] = entity.components[columns.signature]
+        return columns
+
+    def observe(self, observer):
+        '''
+        Registra um objeto que acompanha as entidades com todos os componentes da sua assinatura, como os índices
+        mantidos fora da cena.
+        O observador recebe insert(entity) quando uma entidade passa a ter os componentes, seja criada ou alterada,
+        delete(entity) quando deixa de tê-los, seja destruída ou alterada, e clear() quando a cena é esvaziada.
+        As entidades da cena que já possuem os componentes são inseridas aqui.
+        observer: object o observador, com o atributo signature e os métodos insert, delete e clear.
+        return: object o observador registrado.
+        '''
+        self.observers.append(observer)
+        signature = observer.signature
+        for entity in self.entities:
+            if (entity.signature & signature) == signature:
+                observer.insert(entity)
+        return observer
+
+    def unobserve(self, observer):
+        '''
+        Remove um observador registrado por observe, que deixa de ser avisado das alterações da cena.
+        observer: object o observador.
+        '''
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def modified(self, entity, component):
+        '''
+        Notifica a cena de que um campo de um componente da entidade foi alterado.
+        entity: Entity a entidade dona do componente.
+        component: Component o componente alterado.
+        '''
+        if self.spatial is not None and component.signature == Position.id:
+            self.spatial.move(entity)
+        if component.signature in self.changes:
+            self.record(entity, component.signature)
+
+    def modifiedAll(self, columns):
+        '''
+        Notifica a cena de que todas as linhas de colunas contíguas foram alteradas de uma só vez.
+        columns: ComponentColumns as colunas alteradas.
+        '''
+        if self.spatial is not None and columns.signature == Position.id:
+            for entity in columns.entities:
+                self.spatial.move(entity)
+        if columns.signature in self.changes:
+            self.recordMany(columns.entities, columns.signature)
+
+    def track(self, signature):
+        '''
+        Passa a registrar as alterações dos componentes da máscara.
+        São registradas as escritas nos campos dos componentes e a adição ou remoção deles, e todas as entidades
+        que já possuem os componentes são consideradas alteradas no tick atual.
+        signature: int a máscara de bits dos componentes rastreados.
+        '''
+        for bit in bits(signature):
+            if bit not in self.changes:
+                self.changes[bit] = dict.fromkeys([entity for entity in self.entities if entity.has(bit)], self.tick)
+
+    def tracks(self, signature):
+        '''
+        Verifica se todos os componentes da máscara são rastreados.
+        signature: int a máscara de bits.
+        return: bool true se as alterações de todos os componentes são registradas.
+        '''
+        return all(bit in self.changes for bit in bits(signature))
+
+    def record(self, entity, signature):
+        '''
+        Registra que a entidade alterou os componentes rastreados da máscara no tick atual.
+        A entidade é movida para o final do registro, que fica ordenado pelo tick da última alteração.
+        entity: Entity a entidade alterada.
+        signature: int a máscara de bits dos componentes alterados.
+        '''
+        for bit, log in self.changes.items():
+            if signature & bit:
+                log.pop(entity, None)
+                log[entity] = self.tick
+
+    def recordMany(self, entities, signature):
+        '''
+        Registra que todas as entidades alteraram os componentes rastreados da máscara no tick atual.
+        Cada registro é atualizado de uma só vez para a lista inteira, sem uma chamada de record por entidade.
+        Toda entidade da cena com um componente rastreado está no registro dele, de modo que, quando há tantas
+        entidades quanto registros, todo o registro foi alterado e é refeito a partir dele mesmo, sem calcular de novo
+        o hash das entidades. Como todas recebem o mesmo tick, a ordem do registro continua válida.
+        entities: list[Entity] as entidades alteradas, sem repetições, todas na cena e com os componentes alterados.
+        signature: int a máscara de bits dos componentes alterados.
+        '''
+        for bit, log in list(self.changes.items()):
+            if signature & bit:
+                if len(entities) == len(log):
+                    self.changes[bit] = dict.fromkeys(log, self.tick)
+                    continue
+                deque(map(log.pop, entities, repeat(None)), 0)
+                log.update(zip(entities, repeat(self.tick)))
+
+    def forget(self, entity):
+        '''
+        Remove a entidade destruída dos registros de alteração e registra a destruição no tick atual.
+        entity: Entity a entidade destruída.
+        '''
+        for log in self.changes.values():
+            log.pop(entity, None)
+        self.destroyed[entity] = self.tick
+
+    def advance(self):
+        '''
+        Avança para o próximo tick.
+        As entidades destruídas há mais de history ticks são esquecidas, exceto as ainda não consumidas por algum
+        leitor de retained.
+        return: int o novo tick.
+        '''
+        self.tick = self.tick + 1
+        limit = self.tick - self.history
+        if self.retained:
+            limit = min(limit, min(self.retained.values()))
+        while self.destroyed:
+            entity = next(iter(self.destroyed))
+            if self.destroyed[entity] >= limit:
+                break
+            del self.destroyed[entity]
+        return self.tick
+
+    def changedSince(self, since, *signatures):
+        '''
+        Recupera as entidades que alteraram algum dos componentes rastreados no tick since ou depois.
+        Inclui entidades que perderam o componente, mas não as destruídas. O custo é proporcional ao número de alterações.
+        since: None or int o primeiro tick considerado, None para considerar todos.
+        signatures: list[int] uma ou mais assinaturas de componentes rastreados.
+        return: set[Entity] as entidades alteradas.
+        '''
+        signature = 0
+        for sign in signatures:
+            signature = signature | sign
+        result = set()
+        for bit, log in self.changes.items():
+            if signature & bit:
+                if since is None:
+                    result.update(log)
+                    continue
+                for entity, tick in reversed(log.items()):
+                    if tick < since:
+                        break
+                    result.add(entity)
+        return result
+
+    def filterChanged(self, since, *signatures):
+        '''
+        Filtra as entidades que possuem todos os componentes da assinatura e alteraram algum deles no tick since ou depois.
+        since: None or int o primeiro tick considerado, None para considerar todos.
+        signatures: list[int] uma ou mais assinaturas de componentes rastreados.
+        return: set[Entity] as entidades alteradas que satisfazem a assinatura.
+        '''
+        signature = 0
+        for sign in signatures:
+            signature = signature | sign
+        return {entity for entity in self.changedSince(since, signature) if (entity.signature & signature) == signature}
+
+    def destroyedSince(self, since):
+        '''
+        Recupera as entidades destruídas no tick since ou depois, dentro dos últimos history ticks.
+        since: None or int o primeiro tick considerado, None para considerar todos.
+        return: set[Entity] as entidades destruídas.
+        '''
+        if since is None:
+            return set(self.destroyed)
+        result = set()
+        for entity, tick in reversed(self.destroyed.items()):
+            if tick < since:
+                break
+            result.add(entity)
+        return result
+
+    def spatialIndex(self, size = 8):
+        '''
+        Recupera o índice espacial das posições da cena, criando-o na primeira chamada.
+        A partir da criação o índice é mantido pela cena a cada alteração de posição.
+        size: int o lado dos blocos do índice, usado somente na criação.
+        return: SpatialIndex o índice espacial.
+        '''
+        if self.spatial is None:
+            self.spatial = SpatialIndex(size)
+            for entity in self.query(Position.id):
+                self.spatial.insert(entity)
+        return self.spatial
+
+    def archetype(self, signature):
+        '''
+        Recupera a tabela da assinatura especificada, criando-a se necessário.
+        Uma tabela nova é incluída nas máscaras já consultadas que ela satisfaz.
+        signature: int a assinatura exata da tabela.
+        return: Archetype a tabela da assinatura.
+        '''
+        table = self.archetypes.get(signature)
+        if table is None:
+            table = Archetype(signature)
+            self.archetypes[signature] = table
+            for mask, tables in self.tables.items():
+                if (signature & mask) == mask:
+                    tables.append(table)
+            for query in self.plans.values():
+                if query.tables is not None and query.accepts(signature):
+                    query.tables.append(table)
+        return table
+
+    def matching(self, signature):
+        '''
+        Recupera as tabelas cujas entidades possuem todos os componentes da máscara especificada.
+        signature: int a máscara de bits com todos os componentes exigidos.
+        return: list[Archetype] as tabelas que satisfazem a máscara.
+        '''
+        tables = self.tables.get(signature)
+        if tables is None:
+            if self.pending is not None:
+                self.pending.load(signature)
+            tables = [table for table in self.archetypes.values() if (table.signature & signature) == signature]
+            self.tables[signature] = tables
+        return tables
+
+    def query(self, signature):
+        '''
+        Registra uma consulta persistente para a máscara de bits especificada.
+        A consulta é construída uma única vez percorrendo as entidades e depois mantida pela cena.
+        O conjunto retornado é compartilhado e não deve ser alterado.
+        signature: int a máscara de bits com todos os componentes exigidos.
+        return: set[Entity] as entidades que possuem todos os componentes da assinatura especificada.
+        '''
+        matches = self.queries.get(signature)
+        if matches is None:
+            if self.pending is not None:
+                self.pending.load(signature)
+            matches = set(filter(lambda e: (e.signature & signature) == signature, self.entities))
+            self.queries[signature] = matches
+        return matches
 
     def filter(self, *signatures):
         '''
         Filtra as entidades do jogo que possuem os componentes indicados pela assinatura considerando a máscara de bits.
+        A primeira chamada para uma máscara registra a consulta, as seguintes custam apenas o número de entidades encontradas.
+        No armazenamento por arquétipos somente as tabelas que satisfazem a máscara são percorridas.
         signature: list[int] uma ou mais assinaturas de componentes.
         return: set[Entity] um conjunto de todas as entidades que possuem todos os componentes da assinatura especificada.
         '''
         signature = 0
         for sign in signatures:
             signature = signature | sign
-        return set(filter(lambda e: (e.signature & signature) == signature, self.entities))
+        if self.archetypes is not None:
+            matches = set()
+            for table in self.matching(signature):
+                matches.update(table.entities)
+            return matches
+        return set(self.query(signature))
+
+    def iterate(self, *signatures):
+        '''
+        Percorre as entidades que possuem os componentes indicados sem copiar o resultado da consulta.
+        A cena não deve ser alterada estruturalmente durante a iteração, as alterações devem ser registradas em commands
+        e aplicadas depois com Commands.apply.
+        signatures: list[int] uma ou mais assinaturas de componentes.
+        return: iterable[Entity] as entidades que possuem todos os componentes da assinatura especificada.
+        '''
+        signature = 0
+        for sign in signatures:
+            signature = signature | sign
+        if self.archetypes is not None:
+            return chain.from_iterable([table.entities for table in self.matching(signature)])
+        return self.query(signature)
+
+    def compile(self, all = 0, none = 0, any = 0, where = None):
+        '''
+        Recupera a consulta compilada para as máscaras, criando-a na primeira chamada.
+        Somente as consultas sem predicado são guardadas, de modo que predicados criados a cada chamada, como lambdas
+        em um laço, não acumulam consultas na cena. Com where é devolvida uma consulta nova que filtra o resultado da
+        consulta guardada para as máscaras.
+        all: int os componentes exigidos.
+        none: int os componentes proibidos.
+        any: int os componentes dos quais pelo menos um é exigido, 0 para nenhuma exigência.
+        where: None or callable o predicado aplicado a cada entidade que satisfaz as máscaras.
+        return: Query a consulta compilada.
+        '''
+        key = (all, none, any)
+        query = self.plans.get(key)
+        if query is None:
+            query = Query(all, none, any)
+            self.plans[key] = query
+        if where is not None:
+            return query.filtered(where)
+        return query
+
+    def select(self, all = 0, none = 0, any = 0, where = None):
+        '''
+        Filtra as entidades que possuem todos os componentes de all, nenhum de none e pelo menos um de any,
+        e que satisfazem o predicado where.
+        Ao contrário de filter, o resultado é calculado a cada chamada a partir das consultas persistentes
+        escolhidas pelo plano da consulta compilada, veja Query.
+        all: int os componentes exigidos.
+        none: int os componentes proibidos.
+        any: int os componentes dos quais pelo menos um é exigido, 0 para nenhuma exigência.
+        where: None or callable o predicado aplicado a cada entidade que satisfaz as máscaras.
+        return: set[Entity] as entidades que satisfazem a consulta.
+        '''
+        return self.compile(all, none, any, where).run(self)
+
+    def each(self, *signatures):
+        '''
+        Percorre as entidades que possuem todos os componentes especificados junto com esses componentes.
+        No armazenamento por arquétipos as colunas das tabelas são percorridas diretamente, sem consultar os dicionários das entidades.
+        A cena não deve ser alterada durante a iteração.
+        signatures: list[int] as assinaturas de cada componente desejado, uma por componente.
+        return: iterator[tuple[Entity, Component, ...]] a entidade seguida dos componentes na ordem das assinaturas.
+        '''
+        signature = 0
+        for sign in signatures:
+            signature = signature | sign
+        if self.archetypes is not None:
+            for table in self.matching(signature):
+                yield from zip(table.entities, *[table.columns[sign] for sign in signatures])
+        else:
+            matches = self.query(signature)
+            components = list(map(attrgetter("components"), matches))
+            yield from zip(matches, *[map(itemgetter(sign), components) for sign in signatures])
+
+
+class Commands:
+    '''
+    Registra alterações estruturais feitas durante a execução dos sistemas e as aplica de uma só vez em apply.
+    As operações são aplicadas em ordem de id, e as adições e remoções de cada entidade são combinadas, de modo que
+    as consultas e os índices são atualizados no máximo duas vezes por entidade.
+    scene: Scene a cena alterada.
+    creates: dict[Entity, None] as entidades criadas, em ordem de registro.
+    destroys: dict[Entity, None] as entidades destruídas, em ordem de registro.
+    edits: list[tuple[Entity, int, None or Component]] as adições e remoções de componentes, em ordem de registro.
+    '''
+    __slots__ = ("scene", "creates", "destroys", "edits")
+
+    def __init__(self, scene):
+        '''
+        scene: Scene a cena alterada.
+        '''
+        self.scene = scene
+        self.creates = dict()
+        self.destroys = dict()
+        self.edits = []
+
+    def create(self, entity):
+        '''
+        Adia a criação da entidade na cena.
+        entity: Entity a entidade criada.
+        return: Entity a entidade.
+        '''
+        self.creates[entity] = None
+        return entity
+
+    def destroy(self, entity):
+        '''
+        Adia a destruição da entidade.
+        entity: Entity a entidade destruída.
+        '''
+        self.destroys[entity] = None
+
+    def add(self, entity, component):
+        '''
+        Adia a adição de um componente à entidade.
+        entity: Entity a entidade alterada.
+        component: Component o componente adicionado.
+        '''
+        self.edits.append((entity, component.signature, component))
+
+    def remove(self, entity, signature):
+        '''
+        Adia a remoção de um componente da entidade.
+        entity: Entity a entidade alterada.
+        signature: int a assinatura do componente removido.
+        '''
+        self.edits.append((entity, signature, None))
+
+    def clear(self):
+        '''
+        Descarta as operações registradas.
+        '''
+        self.creates = dict()
+        self.destroys = dict()
+        self.edits = []
+
+    def __len__(self):
+        '''
+        Determina o número de operações registradas.
+        return: int o número de operações.
+        '''
+        return len(self.creates) + len(self.destroys) + len(self.edits)
+
+    def apply(self):
+        '''
+        Aplica as operações registradas: primeiro as adições e remoções, depois as criações e por último as destruições.
+        As alterações de entidades destruídas no mesmo lote são descartadas, assim como entidades criadas e destruídas.
+        Gera ValueError, antes de alterar a cena, se uma adição encontra o componente já presente ou uma remoção não
+        encontra o componente, considerando as operações anteriores da mesma entidade.
+        return: int o número de operações aplicadas.
+        '''
+        creates, destroys, edits = self.creates, self.destroys, self.edits
+        count = len(self)
+        self.clear()
+        plans = dict()
+        for entity, signature, component in edits:
+            if entity in destroys:
+                continue
+            plan = plans.get(entity)
+            if plan is None:
+                plan = plans[entity] = dict(entity.components)
+            if component is None:
+                if signature not in plan:
+                    raise ValueError()
+                del plan[signature]
+            else:
+                if signature in plan:
+                    raise ValueError()
+                plan[signature] = component
+        for entity in sorted(plans, key=attrgetter("id")):
+            self.rebuild(entity, plans[entity])
+        born = [entity for entity in creates if entity not in destroys]
+        born.sort(key=attrgetter("id"))
+        self.scene.createMany(born)
+        dead = [entity for entity in destroys if entity.scene is self.scene]
+        dead.sort(key=attrgetter("id"))
+        self.scene.destroyMany(dead)
+        return count
+
+    @staticmethod
+    def rebuild(entity, components):
+        '''
+        Troca os componentes da entidade, removendo os que saíram ou foram substituídos e adicionando os novos.
+        A cena da entidade é atualizada uma vez para as remoções e uma vez para as adições.
+        entity: Entity a entidade alterada.
+        components: dict[int, Component] os componentes finais da entidade.
+        '''
+        scene = entity.scene
+        removed = [sign for sign, component in entity.components.items() if components.get(sign) is not component]
+        added = [sign for sign, component in components.items() if entity.components.get(sign) is not component]
+        if removed:
+            previous = entity.signature
+            for sign in removed:
+                entity.signature = entity.signature & ~sign
+                entity.components.pop(sign).entity = None
+            if scene is not None:
+                scene.refresh(entity, previous)
+        if added:
+            previous = entity.signature
+            for sign in added:
+                entity.signature = entity.signature | sign
+                entity.components[sign] = components[sign]
+                components[sign].entity = entity
+            if scene is not None:
+                scene.refresh(entity, previous)
+
+
+class Prefab:
+    '''
+    Modelo de entidade registrado uma única vez e instanciado copiando os dados dos seus componentes.
+    As instâncias são construídas sem passar pelo __init__ dos componentes nem por Entity.add, a partir dos valores de
+    cada slot guardados no registro, e os valores do modelo, como as tuplas de cor, são compartilhados entre elas.
+    registry: dict[str, Prefab] os modelos registrados pelo nome.
+    name: None or str o nome do modelo.
+    components: list[Component] as cópias dos componentes do modelo, desassociadas de qualquer entidade.
+    signature: int a assinatura das instâncias.
+    layout: list[tuple[int, type, tuple[tuple[str, object]], None or dict]] para cada componente, a assinatura, a
+    classe, os valores de cada slot e o __dict__ copiado.
+    targets: dict[tuple[int, str], tuple[str, None or callable]] o slot e o validador de cada campo já sobrescrito.
+    '''
+    __slots__ = ("name", "components", "signature", "layout", "targets")
+    registry = dict()
+
+    def __init__(self, components, name = None):
+        '''
+        components: iterable[Component] os componentes do modelo, que são copiados.
+        name: None or str o nome do modelo.
+        '''
+        self.name = name
+        self.components = [component.copy() for component in components]
+        self.signature = 0
+        self.layout = []
+        for component in self.components:
+            cls = type(component)
+            state = tuple((name, getattr(component, name)) for name in slots(cls)
+                          if name != "entity" and hasattr(component, name))
+            extra = dict(component.__dict__) if hasattr(component, "__dict__") else None
+            self.signature = self.signature | component.signature
+            self.layout.append((component.signature, cls, state, extra))
+        self.targets = dict()
+
+    @classmethod
+    def register(cls, name, template):
+        '''
+        Registra um modelo a partir de uma entidade ou de uma lista de componentes.
+        name: str o nome do modelo.
+        template: Entity or iterable[Component] a entidade ou os componentes copiados.
+        return: Prefab o modelo registrado.
+        '''
+        components = template.components.values() if isinstance(template, Entity) else template
+        prefab = cls(components, name)
+        cls.registry[name] = prefab
+        return prefab
+
+    @classmethod
+    def get(cls, name):
+        '''
+        Recupera um modelo registrado.
+        name: str o nome do modelo.
+        return: Prefab o modelo.
+        '''
+        return cls.registry[name]
+
+    def target(self, signature, field):
+        '''
+        Determina o slot onde um campo sobrescrito é gravado, o slot com prefixo _ quando o campo é uma propriedade,
+        e o validador do campo. O resultado é guardado por campo, de modo que cada chave é resolvida uma única vez.
+        Gera KeyError se o modelo não possui um componente com a assinatura.
+        signature: int a assinatura do componente.
+        field: str o nome do campo.
+        return: tuple[str, None or callable] o nome do slot e o check da classe do componente, None quando a classe
+        não redefine Component.check.
+        '''
+        key = (signature, field)
+        target = self.targets.get(key)
+        if target is None:
+            classes = [cls for sign, cls, state, extra in self.layout if sign == signature]
+            if not classes:
+                raise KeyError(signature)
+            cls = classes[0]
+            check = cls.check if cls.check.__func__ is not Component.check.__func__ else None
+            target = ("_" + field if "_" + field in slots(cls) else field, check)
+            self.targets[key] = target
+        return target
+
+    def instantiate(self, ECS, scene = None, overrides = None):
+        '''
+        Cria uma entidade a partir do modelo.
+        Gera KeyError se um valor sobrescrito pertence a um componente que o modelo não possui e ValueError se um
+        valor sobrescrito é inválido para o componente.
+        ECS: EntityComponentSystem o sistema que fornece o id.
+        scene: None or Scene a cena onde a entidade é criada.
+        overrides: None or dict[int, dict[str, object]] para cada assinatura, os valores de campos que substituem os do modelo.
+        return: Entity a nova entidade.
+        '''
+        entity = Entity.restore(ECS.nextId(), self.signature)
+        components = entity.components
+        for signature, cls, state, extra in self.layout:
+            component = object.__new__(cls)
+            for name, value in state:
+                setattr(component, name, value)
+            if extra is not None:
+                component.__dict__.update(extra)
+            component.entity = entity
+            components[signature] = component
+        if overrides:
+            targets = self.targets
+            for signature, fields in overrides.items():
+                component = components.get(signature)
+                if component is None:
+                    raise KeyError(signature)
+                for field, value in fields.items():
+                    slot, check = targets.get((signature, field)) or self.target(signature, field)
+                    if check is not None:
+                        check(field, (value,))
+                    setattr(component, slot, value)
+        if scene is not None:
+            scene.create(entity)
+        return entity
+
+    def instantiateMany(self, ECS, scene, count, columns = None):
+        '''
+        Cria várias entidades na cena a partir do modelo, copiando os componentes coluna a coluna com Scene.spawn.
+        ECS: EntityComponentSystem o sistema que fornece os ids.
+        scene: Scene a cena onde as entidades são criadas.
+        count: int o número de entidades.
+        columns: None or dict[int, dict[str, sequence]] para cada assinatura, os valores de cada campo, um por entidade.
+        return: list[Entity] as novas entidades.
+        '''
+        return scene.spawn(ECS, count, self.components, columns)
+
+
+class ComponentColumns:
+    '''
+    Armazena um componente numérico em colunas contíguas de inteiros de 32 bits, uma por campo (struct-of-arrays).
+    Usa numpy quando disponível e array da biblioteca padrão em caso contrário.
+    As linhas ocupadas são mantidas contíguas, de modo que uma operação sobre a coluna inteira alcança todas as entidades.
+    signature: int a assinatura do componente armazenado.
+    fields: tuple[str] os nomes dos campos numéricos do componente.
+    view: type a classe das views, construída com (columns, row) e com um método copy que devolve o componente original.
+    data: dict[str, numpy.ndarray or array] uma coluna por campo.
+    entities: list[Entity] a entidade de cada linha.
+    views: list[Component] a view de cada linha.
+    rows: dict[Entity, int] a linha ocupada por cada entidade.
+    scene: None or Scene a cena notificada pelas operações sobre todas as linhas.
+    version: int contador incrementado a cada inserção ou remoção, para quem guarda índices de linhas.
+    '''
+    def __init__(self, signature, fields, view, capacity = 1024):
+        '''
+        Cria as colunas vazias.
+        capacity: int o número inicial de linhas reservadas.
+        '''
+        self.signature = signature
+        self.fields = fields
+        self.view = view
+        self.capacity = capacity
+        self.data = {field: self.allocate(capacity) for field in fields}
+        self.entities = []
+        self.views = []
+        self.rows = dict()
+        self.scene = None
+        self.version = 0
+
+    @staticmethod
+    def allocate(size):
+        '''
+        Reserva uma coluna de inteiros de 32 bits preenchida com zeros.
+        size: int o número de linhas.
+        return: numpy.ndarray or array a coluna reservada.
+        '''
+        if numpy is not None:
+            return numpy.zeros(size, dtype=numpy.int32)
+        return array("i", bytes(4 * size))
+
+    def grow(self):
+        '''
+        Dobra a capacidade das colunas.
+        As colunas obtidas antes por column deixam de refletir os dados.
+        '''
+        for field, column in self.data.items():
+            extra = self.allocate(self.capacity)
+            if numpy is not None:
+                self.data[field] = numpy.concatenate((column, extra))
+            else:
+                column.extend(extra)
+        self.capacity = self.capacity * 2
+
+    def insert(self, entity):
+        '''
+        Copia o componente da entidade para uma nova linha e o substitui na entidade por uma view.
+        entity: Entity entidade que possui o componente.
+        '''
+        component = entity.components[self.signature]
+        row = len(self.entities)
+        if row == self.capacity:
+            self.grow()
+        for field, column in self.data.items():
+            column[row] = getattr(component, field)
+        view = self.view(self, row)
+        view.entity = entity
+        component.entity = None
+        self.rows[entity] = row
+        self.entities.append(entity)
+        self.views.append(view)
+        entity.components[self.signature] = view
+        self.version = self.version + 1
+
+    def delete(self, entity):
+        '''
+        Libera a linha da entidade movendo a última linha para a posição liberada.
+        Se a entidade ainda possui o componente, a view é substituída por uma cópia independente.
+        entity: Entity entidade sendo removida.
+        '''
+        row = self.rows.pop(entity)
+        view = self.views[row]
+        view.entity = None
+        if entity.components.get(self.signature) is view:
+            copy = view.copy()
+            copy.entity = entity
+            entity.components[self.signature] = copy
+        last = len(self.entities) - 1
+        if row != last:
+            for column in self.data.values():
+                column[row] = column[last]
+            moved = self.entities[last]
+            self.entities[row] = moved
+            self.views[row] = self.views[last]
+            self.views[row].row = row
+            self.rows[moved] = row
+        self.entities.pop()
+        self.views.pop()
+        self.version = self.version + 1
+
+    def column(self, field):
+        '''
+        Recupera a coluna de um campo restrita às linhas ocupadas.
+        Com numpy o resultado é uma view que pode ser alterada diretamente até a próxima inserção, sem numpy é uma cópia.
+        field: str o nome do campo.
+        return: numpy.ndarray or array os valores do campo, um por linha.
+        '''
+        return self.data[field][:len(self.entities)]
+
+    def __len__(self):
+        '''
+        Determina o número de entidades armazenadas.
+        return: int o número de linhas ocupadas.
+        '''
+        return len(self.entities)
 
 
 class Position(Component):
@@ -166,6 +1737,7 @@ class Position(Component):
     id: int identificador do componente usado na máscara de bits da entidade.
     '''
     id = EntityComponentSystem.nextSignature()
+    __slots__ = ("_x", "_y")
 
     def __init__(self, x = 0, y = 0):
         '''
@@ -176,8 +1748,44 @@ class Position(Component):
         super().__init__(Position.id)
         if x < -4096 or x > 4096 or y < -4096 or y > 4096:
             raise ValueError()
-        self.x = x
-        self.y = y
+        self._x = x
+        self._y = y
+
+    @property
+    def x(self):
+        '''
+        return: int a coordenada horizontal.
+        '''
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def y(self):
+        '''
+        return: int a coordenada vertical.
+        '''
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @classmethod
+    def check(cls, field, values):
+        '''
+        Valida em lote que as coordenadas estão entre -4096 e 4096.
+        field: str o nome do campo.
+        values: sequence[int] as coordenadas atribuídas.
+        '''
+        if field in ("x", "y") and len(values) and (min(values) < -4096 or max(values) > 4096):
+            raise ValueError()
 
     def __hash__(self):  # grid (-4096, -4096) x (4096, 4096)
         '''
@@ -196,66 +1804,577 @@ class Position(Component):
 
 
 
+class PositionView(Position):
+    '''
+    Posição cujas coordenadas são lidas e escritas diretamente nas colunas de PositionColumns.
+    columns: PositionColumns as colunas que armazenam as coordenadas.
+    row: int a linha da entidade nas colunas.
+    '''
+    __slots__ = ("columns", "row")
+
+    def __init__(self, columns, row):
+        '''
+        Cria uma view para a linha especificada.
+        '''
+        self.signature = Position.id
+        self.entity = None
+        self.columns = columns
+        self.row = row
+
+    @property
+    def x(self):
+        '''
+        return: int a coordenada horizontal.
+        '''
+        return int(self.columns.data["x"][self.row])
+
+    @x.setter
+    def x(self, value):
+        self.columns.data["x"][self.row] = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def y(self):
+        '''
+        return: int a coordenada vertical.
+        '''
+        return int(self.columns.data["y"][self.row])
+
+    @y.setter
+    def y(self, value):
+        self.columns.data["y"][self.row] = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    def copy(self):
+        '''
+        Cria uma posição independente com as mesmas coordenadas.
+        return: Position a cópia da posição.
+        '''
+        return Position(self.x, self.y)
+
+    def __reduce__(self):
+        '''
+        Salva a view como uma posição comum no pickle.
+        '''
+        return (Position, (self.x, self.y))
+
+
+class PositionColumns(ComponentColumns):
+    '''
+    Armazena as posições das entidades em duas colunas contíguas x e y.
+    '''
+    def __init__(self, capacity = 1024):
+        '''
+        Cria as colunas vazias.
+        capacity: int o número inicial de linhas reservadas.
+        '''
+        super().__init__(Position.id, ("x", "y"), PositionView, capacity)
+
+    def translate(self, dx, dy):
+        '''
+        Desloca todas as posições de uma só vez.
+        dx: int or sequence[int] o deslocamento horizontal, único ou um por linha.
+        dy: int or sequence[int] o deslocamento vertical, único ou um por linha.
+        '''
+        size = len(self.entities)
+        for field, delta in (("x", dx), ("y", dy)):
+            column = self.data[field]
+            if numpy is not None:
+                column[:size] += delta
+            elif isinstance(delta, int):
+                for row in range(size):
+                    column[row] += delta
+            else:
+                for row in range(size):
+                    column[row] += delta[row]
+        if self.scene is not None:
+            self.scene.modifiedAll(self)
+
+    def clamp(self, low = -4096, high = 4096):
+        '''
+        Limita todas as coordenadas ao intervalo especificado de uma só vez.
+        low: int o menor valor permitido.
+        high: int o maior valor permitido.
+        '''
+        size = len(self.entities)
+        for column in self.data.values():
+            if numpy is not None:
+                numpy.clip(column[:size], low, high, out=column[:size])
+            else:
+                for row in range(size):
+                    column[row] = min(max(column[row], low), high)
+        if self.scene is not None:
+            self.scene.modifiedAll(self)
+
+
+class SpatialIndex:
+    '''
+    Índice espacial das entidades com posição, organizado como uma grade uniforme de blocos quadrados.
+    size: int o lado de cada bloco em células da grade.
+    cells: dict[tuple[int, int], set[Entity]] as entidades de cada bloco ocupado.
+    chunks: dict[Entity, tuple[int, int]] o bloco ocupado por cada entidade.
+    '''
+    def __init__(self, size = 8):
+        '''
+        Cria um índice vazio.
+        size: int o lado de cada bloco em células da grade.
+        '''
+        self.size = size
+        self.cells = dict()
+        self.chunks = dict()
+
+    def chunk(self, x, y):
+        '''
+        Determina o bloco que contém a coordenada.
+        return: tuple[int, int] as coordenadas do bloco.
+        '''
+        return ((x + 4096) // self.size, (y + 4096) // self.size)
+
+    def insert(self, entity):
+        '''
+        Insere a entidade no bloco da sua posição.
+        entity: Entity entidade que possui uma posição.
+        '''
+        position = entity.components[Position.id]
+        key = self.chunk(position.x, position.y)
+        self.chunks[entity] = key
+        bucket = self.cells.get(key)
+        if bucket is None:
+            bucket = set()
+            self.cells[key] = bucket
+        bucket.add(entity)
+
+    def delete(self, entity):
+        '''
+        Remove a entidade do índice.
+        entity: Entity entidade presente no índice.
+        '''
+        key = self.chunks.pop(entity)
+        bucket = self.cells[key]
+        bucket.discard(entity)
+        if not bucket:
+            del self.cells[key]
+
+    def move(self, entity):
+        '''
+        Atualiza o bloco da entidade após uma alteração da sua posição.
+        Nada é feito se a entidade continua no mesmo bloco.
+        entity: Entity entidade presente no índice.
+        '''
+        position = entity.components[Position.id]
+        if self.chunks.get(entity) != self.chunk(position.x, position.y):
+            self.delete(entity)
+            self.insert(entity)
+
+    def at(self, x, y):
+        '''
+        Recupera as entidades que estão exatamente na coordenada especificada.
+        return: list[Entity] as entidades na coordenada.
+        '''
+        bucket = self.cells.get(self.chunk(x, y), ())
+        result = []
+        for entity in bucket:
+            position = entity.components[Position.id]
+            if position.x == x and position.y == y:
+                result.append(entity)
+        return result
+
+    def buckets(self, x0, y0, x1, y1):
+        '''
+        Percorre os blocos ocupados que interceptam o retângulo especificado.
+        Quando o retângulo cobre mais blocos do que os ocupados, os blocos ocupados são percorridos diretamente.
+        return: iterator[set[Entity]] as entidades de cada bloco.
+        '''
+        cx0, cy0 = self.chunk(x0, y0)
+        cx1, cy1 = self.chunk(x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            for (cx, cy), bucket in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield bucket
+        else:
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    bucket = self.cells.get((cx, cy))
+                    if bucket is not None:
+                        yield bucket
+
+    def rect(self, x0, y0, x1, y1):
+        '''
+        Recupera as entidades dentro do retângulo especificado, incluindo as bordas.
+        x0, y0: int o canto com as menores coordenadas.
+        x1, y1: int o canto com as maiores coordenadas.
+        return: list[Entity] as entidades dentro do retângulo.
+        '''
+        result = []
+        for bucket in self.buckets(x0, y0, x1, y1):
+            for entity in bucket:
+                position = entity.components[Position.id]
+                if x0 <= position.x <= x1 and y0 <= position.y <= y1:
+                    result.append(entity)
+        return result
+
+    def radius(self, x, y, r):
+        '''
+        Recupera as entidades cuja distância euclidiana até a coordenada é no máximo r.
+        return: list[Entity] as entidades dentro do círculo.
+        '''
+        result = []
+        limit = r * r
+        for bucket in self.buckets(x - r, y - r, x + r, y + r):
+            for entity in bucket:
+                position = entity.components[Position.id]
+                dx = position.x - x
+                dy = position.y - y
+                if dx * dx + dy * dy <= limit:
+                    result.append(entity)
+        return result
+
+    def nearest(self, x, y, k = 1):
+        '''
+        Recupera as k entidades mais próximas da coordenada, ordenadas pela distância.
+        Os blocos são visitados em anéis crescentes até que nenhum bloco restante possa conter uma entidade mais próxima.
+        return: list[Entity] as entidades mais próximas.
+        '''
+        if k <= 0:
+            return []
+        cx, cy = self.chunk(x, y)
+        best = []
+        ring = 0
+        while True:
+            if (2 * ring + 1) * (2 * ring + 1) > len(self.cells):
+                best = []
+                for bucket in self.cells.values():
+                    self.collect(best, bucket, x, y, k)
+                break
+            for bucket in self.ring(cx, cy, ring):
+                self.collect(best, bucket, x, y, k)
+            if len(best) == k and -best[0][0] < (ring * self.size) * (ring * self.size):
+                break
+            ring += 1
+        return [entity for _, _, entity in sorted(best, key=lambda item: (-item[0], -item[1]))]
+
+    def ring(self, cx, cy, ring):
+        '''
+        Percorre os blocos ocupados na borda do quadrado de raio ring centrado no bloco (cx, cy).
+        return: iterator[set[Entity]] as entidades de cada bloco.
+        '''
+        for bx in range(cx - ring, cx + ring + 1):
+            for by in (cy - ring, cy + ring) if ring else (cy,):
+                bucket = self.cells.get((bx, by))
+                if bucket is not None:
+                    yield bucket
+        for by in range(cy - ring + 1, cy + ring):
+            for bx in (cx - ring, cx + ring) if ring else ():
+                bucket = self.cells.get((bx, by))
+                if bucket is not None:
+                    yield bucket
+
+    @staticmethod
+    def collect(best, bucket, x, y, k):
+        '''
+        Mantém em best as k entidades mais próximas entre as já vistas e as do bloco.
+        best: list[tuple[int, int, Entity]] heap com a distância negativa, o id negativo e a entidade.
+        '''
+        for entity in bucket:
+            position = entity.components[Position.id]
+            dx = position.x - x
+            dy = position.y - y
+            item = (-(dx * dx + dy * dy), -entity.id, entity)
+            if len(best) < k:
+                heapq.heappush(best, item)
+            elif item[:2] > best[0][:2]:
+                heapq.heapreplace(best, item)
+
+
 class Renderable(Component):
     '''
     Indica que o componente pode ser desenhado na tela.
     id:int identificador do componente usado na máscara de bits da entidade.
     '''
     id = EntityComponentSystem.nextSignature()
+    __slots__ = ("_glyph", "_foreground", "_background", "_layer")
 
-    def __init__(self, glyph, foreground = (255, 255, 255, 255)):
+    def __init__(self, glyph, foreground = WHITE, layer = 0):
         '''
+        As cores são normalizadas por color, de modo que componentes com a mesma cor usam a mesma tupla.
         glyph: str representação gráfica do componente.
         foreground: tupla[int,int,int,int] a cor utilizada para o desenho
         background: tupla[int,int,int,int] a cor de fundo utilizada para o desenho
+        layer: int a camada do desenho, as camadas maiores são desenhadas por cima na mesma célula
         '''
         super().__init__(Renderable.id)
-        self.glyph = glyph
-        self.foreground = foreground
-        self.background = (0, 0, 0, 255)
+        self._glyph = glyph
+        self._foreground = color(foreground)
+        self._background = BLACK
+        self._layer = layer
+
+    def __setstate__(self, state):
+        '''
+        Restaura o estado salvo pelo pickle, com a camada 0 para componentes salvos antes da existência das camadas.
+        state: dict or tuple[dict, dict] o estado salvo.
+        '''
+        self._layer = 0
+        super().__setstate__(state)
+
+    @property
+    def glyph(self):
+        '''
+        return: str representação gráfica do componente.
+        '''
+        return self._glyph
+
+    @glyph.setter
+    def glyph(self, value):
+        self._glyph = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def foreground(self):
+        '''
+        return: tupla[int,int,int,int] a cor utilizada para o desenho
+        '''
+        return self._foreground
+
+    @foreground.setter
+    def foreground(self, value):
+        self._foreground = color(value)
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def background(self):
+        '''
+        return: tupla[int,int,int,int] a cor de fundo utilizada para o desenho
+        '''
+        return self._background
+
+    @background.setter
+    def background(self, value):
+        self._background = color(value)
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def layer(self):
+        '''
+        return: int a camada do desenho
+        '''
+        return self._layer
+
+    @layer.setter
+    def layer(self, value):
+        self._layer = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
     
-    def draw(self, x, y):
+    def draw(self, x, y, framebuffer = None):
         '''
         Desenha o componente na tela.
         x: int a coordenada horizontal.
         y: int a coordenada vertical.
+        framebuffer: None or render.Framebuffer a tela onde o componente é desenhado.
         '''
-        pass
+        if framebuffer is not None:
+            framebuffer.put(x, y, self.glyph, self.foreground, self.background)
+
+
+
+class Camera:
+    '''
+    Janela da tela sobre o mundo.
+    update desenha somente as entidades dentro da janela, encontradas pelo índice espacial da cena, de modo que o
+    custo do desenho depende do tamanho da tela e não do tamanho do mundo.
+    x, y: int a coordenada do mundo desenhada no canto superior esquerdo da tela.
+    margin: int o número de células em volta da tela incluídas na consulta ao índice espacial.
+    '''
+    __slots__ = ("x", "y", "margin")
+
+    def __init__(self, x = 0, y = 0, margin = 1):
+        '''
+        x, y: int a coordenada do mundo desenhada no canto superior esquerdo da tela.
+        margin: int o número de células em volta da tela incluídas na consulta ao índice espacial.
+        '''
+        self.x = x
+        self.y = y
+        self.margin = margin
+
+    def center(self, x, y, framebuffer):
+        '''
+        Move a janela para que a coordenada fique no centro da tela.
+        x, y: int a coordenada do mundo.
+        framebuffer: render.Framebuffer a tela.
+        '''
+        self.x = x - framebuffer.width // 2
+        self.y = y - framebuffer.height // 2
+
+    def bounds(self, framebuffer):
+        '''
+        Determina o retângulo do mundo coberto pela tela, incluindo a margem.
+        framebuffer: render.Framebuffer a tela.
+        return: tuple[int, int, int, int] os cantos x0, y0, x1, y1, incluindo as bordas.
+        '''
+        return (self.x - self.margin, self.y - self.margin,
+                self.x + framebuffer.width - 1 + self.margin, self.y + framebuffer.height - 1 + self.margin)
+
+    def visible(self, scene, framebuffer):
+        '''
+        Recupera as entidades desenháveis dentro da janela, na ordem das camadas.
+        scene: Scene a cena.
+        framebuffer: render.Framebuffer a tela.
+        return: list[Entity] as entidades com Position e Renderable, da menor para a maior camada.
+        '''
+        entities = [entity for entity in scene.spatialIndex().rect(*self.bounds(framebuffer))
+                    if entity.signature & Renderable.id]
+        entities.sort(key=lambda entity: entity.components[Renderable.id].layer)
+        return entities
 
 
 
 def update(ECS):
     '''
     Atualiza o estado do jogo.
+    Quando o sistema possui uma tela, as entidades são desenhadas no buffer de trás, que é emitido pelo flush da tela.
+    Quando o sistema possui uma câmera, somente as entidades dentro da sua janela são visitadas e desenhadas.
+    As entidades de uma mesma célula são desenhadas na ordem das camadas.
     ECS: EntityComponentSystem sistema.
     '''
-    entities = ECS.scene.filter(Position.id | Renderable.id)
-    for entity in entities:
-        position: Position = entity[Position.id]
-        render: Renderable = entity[Renderable.id]
-        render.draw(position.x, position.y)
+    framebuffer = ECS.framebuffer
+    camera = getattr(ECS, "camera", None)
+    if framebuffer is not None and ECS.scene.tracks(Position.id | Renderable.id):
+        redraw(ECS.scene, framebuffer, camera)
+        return
+    if framebuffer is not None:
+        framebuffer.clear()
+    if framebuffer is not None and camera is not None:
+        for entity in camera.visible(ECS.scene, framebuffer):
+            position = entity.components[Position.id]
+            entity.components[Renderable.id].draw(position.x - camera.x, position.y - camera.y, framebuffer)
+        return
+    items = ECS.scene.each(Position.id, Renderable.id)
+    if framebuffer is not None:
+        items = layered(list(items))
+    for entity, position, render in items:
+        render.draw(position.x, position.y, framebuffer)
+
+
+def layered(items):
+    '''
+    Ordena os itens pela camada do componente de desenho em tempo linear, com um balde por camada.
+    A ordem dentro de cada camada é mantida e, com uma única camada, a lista é devolvida sem alteração.
+    items: list[tuple[Entity, Position, Renderable]] os itens percorridos por Scene.each.
+    return: list[tuple[Entity, Position, Renderable]] os itens da menor para a maior camada.
+    '''
+    layers = list(map(attrgetter("_layer"), map(itemgetter(2), items)))
+    buckets = {layer: [] for layer in sorted(set(layers))}
+    if len(buckets) <= 1:
+        return items
+    for layer, item in zip(layers, items):
+        buckets[layer].append(item)
+    return list(chain.from_iterable(buckets.values()))
+
+
+
+def redraw(scene, framebuffer, camera = None):
+    '''
+    Desenha na tela somente as células afetadas pelas entidades alteradas ou destruídas desde o último desenho.
+    Usado por update quando a cena rastreia Position e Renderable. Cada célula afetada é apagada e recebe
+    novamente todas as entidades que estão nela, na ordem das camadas.
+    Com uma câmera, somente as células dentro da janela são guardadas e desenhadas. Quando a câmera se move a tela
+    é redesenhada com as entidades da nova janela.
+    scene: Scene a cena desenhada.
+    framebuffer: render.Framebuffer a tela, que guarda o tick e as células do último desenho.
+    camera: None or Camera a janela desenhada, por padrão a tela mostra o mundo a partir da origem.
+    '''
+    since = framebuffer.tick
+    framebuffer.tick = scene.tick
+    drawn = framebuffer.drawn
+    cells = framebuffer.cells
+    dirty = set()
+    if camera is not None:
+        ox, oy = camera.x, camera.y
+        x0, y0 = ox, oy
+        x1, y1 = ox + framebuffer.width - 1, oy + framebuffer.height - 1
+    else:
+        ox, oy = 0, 0
+        x0 = y0 = -4096
+        x1 = y1 = 4096
+    if camera is not None and (since is None or framebuffer.origin != (ox, oy)):
+        framebuffer.clear()
+        drawn.clear()
+        cells.clear()
+        changed = camera.visible(scene, framebuffer)
+    else:
+        changed = scene.changedSince(since, Position.id | Renderable.id) | scene.destroyedSince(since)
+    framebuffer.origin = (ox, oy)
+    for entity in changed:
+        cell = drawn.pop(entity, None)
+        if cell is not None:
+            occupants = cells[cell]
+            occupants.discard(entity)
+            if not occupants:
+                del cells[cell]
+            dirty.add(cell)
+        if entity.scene is scene and (entity.signature & (Position.id | Renderable.id)) == Position.id | Renderable.id:
+            position = entity.components[Position.id]
+            cell = (position.x, position.y)
+            if not (x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1):
+                continue
+            drawn[entity] = cell
+            cells.setdefault(cell, set()).add(entity)
+            dirty.add(cell)
+    for x, y in dirty:
+        framebuffer.erase(x - ox, y - oy)
+        occupants = cells.get((x, y), ())
+        if len(occupants) > 1:
+            occupants = sorted(occupants, key=lambda entity: entity.components[Renderable.id].layer)
+        for entity in occupants:
+            entity.components[Renderable.id].draw(x - ox, y - oy, framebuffer)
 
 
 
 def saveState(filename, ECS):
     '''
-    Salva as entidades do jogo em um arquivo.
+    Salva as entidades do jogo em um arquivo no formato binário em colunas do módulo snapshot.
     filename: str o nome do arquivo.
     ECS: EntityComponentSystem o sistema.
     '''
-    data = dict()
-    data["entitities"] = ECS.scene.entities
+    import snapshot
+    if ECS.scene.pending is not None:
+        ECS.scene.pending.loadAll()
     with open(filename, "wb") as outfile:
-        pickle.dump(data, outfile)
+        snapshot.dump(ECS.scene.entities, outfile)
 
 
 
-def loadState(filename, ECS):
+def loadState(filename, ECS, lazy = False):
     '''
     Carrega as entidade de um arquivo para o jogo.
+    Arquivos salvos com pickle por versões anteriores continuam sendo aceitos.
+    O contador de ids do sistema avança para além dos ids carregados.
+    No modo lazy o arquivo binário é mapeado em memória e cada entidade só é construída quando encontrada por uma
+    consulta ou procurada pelo id com Scene.find.
     filename: str o nome do arquivo.
     ECS: EntityComponentSystem o sistema.
+    lazy: bool true para carregar as entidades sob demanda.
     '''
+    import snapshot
     with open(filename, "rb") as infile:
-        data = pickle.load(infile)
-        ECS.scene.entities = data["entitities"]
+        binary = infile.read(len(snapshot.MAGIC)) == snapshot.MAGIC
+        infile.seek(0)
+        if binary and lazy:
+            pending = snapshot.LazySnapshot.open(filename, ECS.scene)
+            ECS.scene.clear()
+            ECS.scene.defer(pending)
+            ECS.id = max(ECS.id, pending.last())
+            return
+        if binary:
+            entities = snapshot.Snapshot(infile.read()).entities()
+        else:
+            entities = pickle.load(infile)["entitities"]
+    ECS.scene.clear()
+    with paused():
+        ECS.scene.createMany(entities)
+    ECS.id = max(ECS.id, max(map(attrgetter("id"), entities), default=0))
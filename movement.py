@@ -0,0 +1,327 @@
+from array import array
+
+from core import Component, ComponentColumns, EntityComponentSystem, Position, PositionColumns
+from scheduler import System
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LOW = -4096
+HIGH = 4096
+WIDTH = HIGH - LOW + 1
+
+
+class Velocity(Component):
+    '''
+    Indica que a entidade se move a cada passo do sistema de movimento.
+    id: int identificador do componente usado na máscara de bits da entidade.
+    '''
+    id = EntityComponentSystem.nextSignature()
+    __slots__ = ("_dx", "_dy")
+
+    def __init__(self, dx = 0, dy = 0):
+        '''
+        Cria uma nova velocidade.
+        dx: int o deslocamento horizontal por passo.
+        dy: int o deslocamento vertical por passo.
+        '''
+        super().__init__(Velocity.id)
+        self._dx = dx
+        self._dy = dy
+
+    @property
+    def dx(self):
+        '''
+        return: int o deslocamento horizontal por passo.
+        '''
+        return self._dx
+
+    @dx.setter
+    def dx(self, value):
+        self._dx = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def dy(self):
+        '''
+        return: int o deslocamento vertical por passo.
+        '''
+        return self._dy
+
+    @dy.setter
+    def dy(self, value):
+        self._dy = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+
+class VelocityView(Velocity):
+    '''
+    Velocidade cujos deslocamentos são lidos e escritos diretamente nas colunas de VelocityColumns.
+    columns: VelocityColumns as colunas que armazenam os deslocamentos.
+    row: int a linha da entidade nas colunas.
+    '''
+    __slots__ = ("columns", "row")
+
+    def __init__(self, columns, row):
+        '''
+        Cria uma view para a linha especificada.
+        '''
+        self.signature = Velocity.id
+        self.entity = None
+        self.columns = columns
+        self.row = row
+
+    @property
+    def dx(self):
+        '''
+        return: int o deslocamento horizontal por passo.
+        '''
+        return int(self.columns.data["dx"][self.row])
+
+    @dx.setter
+    def dx(self, value):
+        self.columns.data["dx"][self.row] = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    @property
+    def dy(self):
+        '''
+        return: int o deslocamento vertical por passo.
+        '''
+        return int(self.columns.data["dy"][self.row])
+
+    @dy.setter
+    def dy(self, value):
+        self.columns.data["dy"][self.row] = value
+        if self.entity is not None and self.entity.scene is not None:
+            self.entity.scene.modified(self.entity, self)
+
+    def copy(self):
+        '''
+        Cria uma velocidade independente com os mesmos deslocamentos.
+        return: Velocity a cópia da velocidade.
+        '''
+        return Velocity(self.dx, self.dy)
+
+    def __reduce__(self):
+        '''
+        Salva a view como uma velocidade comum no pickle.
+        '''
+        return (Velocity, (self.dx, self.dy))
+
+
+class VelocityColumns(ComponentColumns):
+    '''
+    Armazena as velocidades das entidades em duas colunas contíguas dx e dy.
+    '''
+    def __init__(self, capacity = 1024):
+        '''
+        Cria as colunas vazias.
+        capacity: int o número inicial de linhas reservadas.
+        '''
+        super().__init__(Velocity.id, ("dx", "dy"), VelocityView, capacity)
+
+
+def bound(values, wrap):
+    '''
+    Leva as coordenadas de volta à grade [-4096, 4096], no lugar.
+    values: numpy.ndarray as coordenadas.
+    wrap: bool true para dar a volta na grade, false para limitar às bordas.
+    '''
+    if wrap:
+        values -= LOW
+        numpy.remainder(values, WIDTH, out=values)
+        values += LOW
+    else:
+        numpy.clip(values, LOW, HIGH, out=values)
+
+
+def overlaps(positions):
+    '''
+    Encontra as entidades que ocupam a mesma célula.
+    A chave da célula de cada linha é combinada com o número da linha e o resultado é ordenado de uma só vez, de modo
+    que as linhas de uma mesma célula ficam juntas. A chave segue o layout de Position.__hash__ com largura 8193, para
+    que as colunas x = -4096 e x = 4096 não compartilhem chaves.
+    positions: PositionColumns as colunas das posições.
+    return: list[list[Entity]] as entidades de cada célula ocupada por mais de uma entidade.
+    '''
+    size = len(positions)
+    entities = positions.entities
+    if size < 2:
+        return []
+    xs = positions.column("x")
+    ys = positions.column("y")
+    if numpy is None:
+        cells = dict()
+        for row in range(size):
+            cells.setdefault((xs[row], ys[row]), []).append(entities[row])
+        return [group for group in cells.values() if len(group) > 1]
+    keys = ys - LOW
+    keys *= WIDTH
+    keys += xs
+    keys -= LOW
+    packed = keys.astype(numpy.int64)
+    packed <<= 32
+    packed |= numpy.arange(size, dtype=numpy.int64)
+    packed.sort()
+    keys = packed >> 32
+    same = keys[1:] == keys[:-1]
+    if not same.any():
+        return []
+    repeated = numpy.zeros(size, dtype=bool)
+    repeated[1:] = same
+    repeated[:-1] |= same
+    rows = (packed[repeated] & 0xFFFFFFFF).tolist()
+    keys = keys[repeated]
+    bounds = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1], [True]))).tolist()
+    get = entities.__getitem__
+    return [list(map(get, rows[first:last])) for first, last in zip(bounds, bounds[1:])]
+
+
+class Movement(System):
+    '''
+    Sistema que soma a velocidade à posição de todas as entidades que possuem Position e Velocity.
+    Os dois componentes são armazenados em colunas contíguas, registradas na cena na primeira execução, e o passo
+    é feito com operações sobre as colunas inteiras. Quando as linhas das duas colunas coincidem, como acontece
+    quando todas as entidades com posição se movem, as colunas são alteradas no lugar sem cópias.
+    A cena é notificada somente das entidades que se moveram, e o índice espacial somente das que mudaram de bloco.
+    wrap: bool true para dar a volta na grade, false para limitar as posições às bordas.
+    collisions: bool true para detectar as entidades que ocupam a mesma célula depois de cada passo.
+    overlaps: list[list[Entity]] as entidades de cada célula ocupada por mais de uma entidade no último passo.
+    '''
+    def __init__(self, wrap = False, collisions = True):
+        '''
+        wrap: bool true para dar a volta na grade, false para limitar as posições às bordas.
+        collisions: bool true para detectar as entidades que ocupam a mesma célula depois de cada passo.
+        '''
+        super().__init__(reads=Position.id | Velocity.id, writes=Position.id, name="movement")
+        self.wrap = wrap
+        self.collisions = collisions
+        self.overlaps = []
+        self.versions = None
+        self.positions = None
+        self.velocities = None
+        self.aligned = False
+
+    def run(self, ECS):
+        '''
+        Executa um passo na cena do sistema.
+        ECS: EntityComponentSystem o sistema do jogo.
+        '''
+        self.step(ECS.scene)
+
+    def columns(self, scene):
+        '''
+        Recupera as colunas das posições e das velocidades, registrando-as na cena se necessário.
+        scene: Scene a cena.
+        return: tuple[PositionColumns, VelocityColumns] as colunas.
+        '''
+        positions = scene.stores.get(Position.id)
+        if positions is None:
+            positions = scene.store(PositionColumns())
+        velocities = scene.stores.get(Velocity.id)
+        if velocities is None:
+            velocities = scene.store(VelocityColumns())
+        return positions, velocities
+
+    def rows(self, positions, velocities):
+        '''
+        Determina as linhas das posições e das velocidades das entidades que se movem.
+        O resultado é refeito somente quando alguma das colunas recebeu ou perdeu entidades.
+        '''
+        versions = (id(positions), positions.version, id(velocities), velocities.version)
+        if versions == self.versions:
+            return
+        self.versions = versions
+        pairs = [(positions.rows[entity], row) for row, entity in enumerate(velocities.entities)
+                 if entity in positions.rows]
+        self.positions = array("q", [pair[0] for pair in pairs])
+        self.velocities = array("q", [pair[1] for pair in pairs])
+        self.aligned = all(pair[0] == row and pair[1] == row for row, pair in enumerate(pairs))
+        if numpy is not None:
+            self.positions = numpy.array(self.positions, dtype=numpy.int64)
+            self.velocities = numpy.array(self.velocities, dtype=numpy.int64)
+
+    def step(self, scene):
+        '''
+        Move todas as entidades com Position e Velocity e detecta as sobreposições.
+        scene: Scene a cena.
+        return: list[list[Entity]] as entidades de cada célula ocupada por mais de uma entidade.
+        '''
+        positions, velocities = self.columns(scene)
+        self.rows(positions, velocities)
+        if numpy is None:
+            self.slow(scene, positions, velocities)
+        else:
+            self.fast(scene, positions, velocities)
+        self.overlaps = overlaps(positions) if self.collisions else []
+        return self.overlaps
+
+    def fast(self, scene, positions, velocities):
+        '''
+        Faz o passo com operações do numpy sobre as colunas.
+        '''
+        count = len(self.positions)
+        spatial = scene.spatial
+        tracked = Position.id in scene.changes
+        moved = None
+        crossed = None
+        for field, delta in (("x", "dx"), ("y", "dy")):
+            column = positions.data[field]
+            if self.aligned:
+                values = column[:count]
+                deltas = velocities.data[delta][:count]
+            else:
+                values = column[self.positions]
+                deltas = velocities.data[delta][self.velocities]
+            old = values.copy() if spatial is not None or tracked else None
+            values += deltas
+            bound(values, self.wrap)
+            if not self.aligned:
+                column[self.positions] = values
+            if old is not None:
+                changed = old != values
+                moved = changed if moved is None else moved | changed
+            if spatial is not None:
+                chunks = (old + 4096) // spatial.size != (values + 4096) // spatial.size
+                crossed = chunks if crossed is None else crossed | chunks
+        if moved is None:
+            return
+        entities = positions.entities
+        if tracked:
+            if self.aligned and moved.all():
+                scene.recordMany(entities[:count], Position.id)
+            else:
+                scene.recordMany(list(map(entities.__getitem__, self.positions[moved].tolist())), Position.id)
+        if spatial is not None:
+            for row in self.positions[crossed].tolist():
+                spatial.move(entities[row])
+
+    def slow(self, scene, positions, velocities):
+        '''
+        Faz o passo linha a linha quando o numpy não está disponível.
+        '''
+        for prow, vrow in zip(self.positions, self.velocities):
+            dx = velocities.data["dx"][vrow]
+            dy = velocities.data["dy"][vrow]
+            if not dx and not dy:
+                continue
+            view = positions.views[prow]
+            x = view.x + dx
+            y = view.y + dy
+            if self.wrap:
+                x = (x - LOW) % WIDTH + LOW
+                y = (y - LOW) % WIDTH + LOW
+            else:
+                x = min(max(x, LOW), HIGH)
+                y = min(max(y, LOW), HIGH)
+            if x == view.x and y == view.y:
+                continue
+            positions.data["x"][prow] = x
+            positions.data["y"][prow] = y
+            scene.modified(positions.entities[prow], view)
@@ -0,0 +1,279 @@
+from array import array
+from collections import OrderedDict, deque
+
+from core import Component, EntityComponentSystem, Position
+
+LOW = -4096
+HIGH = 4096
+MOVES = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class Blocking(Component):
+    '''
+    Indica que a célula da posição da entidade não pode ser atravessada pelos caminhos.
+    id: int identificador do componente usado na máscara de bits da entidade.
+    '''
+    id = EntityComponentSystem.nextSignature()
+    __slots__ = ()
+
+    def __init__(self):
+        '''
+        Cria o marcador de bloqueio.
+        '''
+        super().__init__(Blocking.id)
+
+
+class FlowField:
+    '''
+    Mapa de distâncias e direções até um objetivo, calculado por uma busca em largura a partir do objetivo dentro do
+    quadrado de lado 2 * radius + 1 centrado nele. Cada agente segue a direção da sua célula, consultada em O(1).
+    Os arrays têm uma borda de células bloqueadas em volta do quadrado, que dispensa os testes de limite na busca.
+    goal: tuple[int, int] a célula do objetivo.
+    radius: int a distância máxima em cada eixo entre o objetivo e as células do mapa.
+    width: int o lado do quadrado com a borda.
+    distances: array[int] o número de passos até o objetivo de cada célula, -1 para as células inalcançáveis.
+    moves: bytearray o índice em MOVES do passo que aproxima cada célula do objetivo, 0 no objetivo e nas inalcançáveis.
+    '''
+    __slots__ = ("goal", "radius", "width", "distances", "moves")
+
+    def __init__(self, goal, radius, blocked):
+        '''
+        Calcula o mapa.
+        goal: tuple[int, int] a célula do objetivo.
+        radius: int a distância máxima em cada eixo entre o objetivo e as células do mapa.
+        blocked: dict[tuple[int, int], int] as células bloqueadas, o objetivo é sempre alcançável.
+        '''
+        self.goal = goal
+        self.radius = radius
+        self.width = 2 * radius + 3
+        self.distances = array("i", [-1]) * (self.width * self.width)
+        self.moves = bytearray(self.width * self.width)
+        self.search(self.passable(blocked))
+
+    def passable(self, blocked):
+        '''
+        Marca as células do quadrado que podem ser atravessadas.
+        As células bloqueadas são percorridas pelo menor entre o dicionário e o quadrado.
+        blocked: dict[tuple[int, int], int] as células bloqueadas.
+        return: bytearray 1 para cada célula atravessável, 0 na borda, fora da grade e nas células bloqueadas.
+        '''
+        width = self.width
+        gx, gy = self.goal
+        left = gx - self.radius - 1
+        top = gy - self.radius - 1
+        x0 = max(gx - self.radius, LOW)
+        x1 = min(gx + self.radius, HIGH)
+        y0 = max(gy - self.radius, LOW)
+        y1 = min(gy + self.radius, HIGH)
+        passable = bytearray(width * width)
+        row = b"\1" * (x1 - x0 + 1)
+        for y in range(y0, y1 + 1):
+            start = (y - top) * width + (x0 - left)
+            passable[start:start + len(row)] = row
+        if len(blocked) < (x1 - x0 + 1) * (y1 - y0 + 1):
+            for x, y in blocked:
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    passable[(y - top) * width + (x - left)] = 0
+        else:
+            for y in range(y0, y1 + 1):
+                for x in range(x0, x1 + 1):
+                    if (x, y) in blocked:
+                        passable[(y - top) * width + (x - left)] = 0
+        return passable
+
+    def search(self, passable):
+        '''
+        Faz a busca em largura a partir do objetivo sobre os índices do quadrado.
+        Um vizinho alcançado a partir da célula pelo deslocamento oposto a MOVES[move] guarda move, que o leva de volta.
+        passable: bytearray as células atravessáveis.
+        '''
+        width = self.width
+        distances = self.distances
+        moves = self.moves
+        offsets = [(move, dx + dy * width) for move, (dx, dy) in enumerate(MOVES) if move]
+        goal = (self.radius + 1) * width + self.radius + 1
+        distances[goal] = 0
+        passable[goal] = 0
+        frontier = deque([goal])
+        pop = frontier.popleft
+        push = frontier.append
+        while frontier:
+            cell = pop()
+            distance = distances[cell] + 1
+            for move, offset in offsets:
+                neighbour = cell - offset
+                if passable[neighbour]:
+                    passable[neighbour] = 0
+                    distances[neighbour] = distance
+                    moves[neighbour] = move
+                    push(neighbour)
+
+    def index(self, x, y):
+        '''
+        Determina a posição da célula nos arrays do mapa.
+        return: None or int o índice, None se a célula está fora do mapa.
+        '''
+        cx = x - self.goal[0] + self.radius
+        cy = y - self.goal[1] + self.radius
+        if 0 <= cx <= 2 * self.radius and 0 <= cy <= 2 * self.radius:
+            return (cy + 1) * self.width + cx + 1
+        return None
+
+    def distance(self, x, y):
+        '''
+        Recupera o número de passos da célula até o objetivo.
+        return: None or int a distância, None se a célula está fora do mapa ou não alcança o objetivo.
+        '''
+        cell = self.index(x, y)
+        if cell is None or self.distances[cell] < 0:
+            return None
+        return self.distances[cell]
+
+    def direction(self, x, y):
+        '''
+        Recupera o passo que aproxima a célula do objetivo.
+        return: None or tuple[int, int] o deslocamento (dx, dy), (0, 0) no objetivo, None se a célula está fora do mapa
+        ou não alcança o objetivo.
+        '''
+        cell = self.index(x, y)
+        if cell is None or self.distances[cell] < 0:
+            return None
+        return MOVES[self.moves[cell]]
+
+    def affected(self, x, y, blocking):
+        '''
+        Determina se o bloqueio ou a liberação de uma célula muda o mapa.
+        Um bloqueio só muda o mapa se a célula era alcançável, uma liberação só se algum vizinho é alcançável.
+        x, y: int a célula alterada.
+        blocking: bool true se a célula passou a ser bloqueada, false se foi liberada.
+        return: bool true se o mapa deve ser recalculado.
+        '''
+        if blocking:
+            return self.distance(x, y) is not None and (x, y) != self.goal
+        if self.distance(x, y) is not None:
+            return False
+        return any(self.distance(x + dx, y + dy) is not None for dx, dy in MOVES[1:])
+
+
+class Pathfinder:
+    '''
+    Calcula e guarda mapas de direções até objetivos compartilhados, de modo que muitos agentes indo para o mesmo
+    objetivo custam um único cálculo do mapa e uma consulta O(1) por agente.
+    As células bloqueadas são as posições das entidades com Blocking. update acompanha as entidades bloqueadoras
+    pelo rastreamento de alterações da cena e descarta somente os mapas afetados pelas células que mudaram,
+    que são recalculados na próxima consulta.
+    scene: Scene a cena.
+    radius: int a distância máxima em cada eixo entre o objetivo e as células de cada mapa.
+    capacity: int o número máximo de mapas guardados, os menos usados são descartados primeiro.
+    fields: OrderedDict[tuple[int, int], FlowField] os mapas guardados pelo objetivo, do uso menos recente para o mais recente.
+    blocked: dict[tuple[int, int], int] o número de entidades bloqueadoras em cada célula.
+    cells: dict[Entity, tuple[int, int]] a célula de cada entidade bloqueadora.
+    since: int o tick da cena da última atualização.
+    '''
+    def __init__(self, scene, radius = 64, capacity = 64):
+        '''
+        Passa a rastrear Position e Blocking na cena e registra as entidades bloqueadoras existentes.
+        scene: Scene a cena.
+        radius: int a distância máxima em cada eixo entre o objetivo e as células de cada mapa.
+        capacity: int o número máximo de mapas guardados.
+        '''
+        self.scene = scene
+        self.radius = radius
+        self.capacity = capacity
+        self.fields = OrderedDict()
+        self.blocked = dict()
+        self.cells = dict()
+        scene.track(Position.id | Blocking.id)
+        for entity in scene.filter(Position.id, Blocking.id):
+            self.block(entity, self.cell(entity))
+        self.since = scene.tick
+
+    def cell(self, entity):
+        '''
+        Determina a célula bloqueada pela entidade.
+        return: None or tuple[int, int] a célula, None se a entidade não está na cena ou não bloqueia.
+        '''
+        if entity.scene is not self.scene or (entity.signature & (Position.id | Blocking.id)) != Position.id | Blocking.id:
+            return None
+        position = entity.components[Position.id]
+        return (position.x, position.y)
+
+    def block(self, entity, cell):
+        '''
+        Registra a célula bloqueada pela entidade.
+        return: bool true se a célula passou a ser bloqueada.
+        '''
+        self.cells[entity] = cell
+        count = self.blocked.get(cell, 0)
+        self.blocked[cell] = count + 1
+        return count == 0
+
+    def unblock(self, entity):
+        '''
+        Remove a célula bloqueada pela entidade.
+        return: None or tuple[int, int] a célula, se ela deixou de ser bloqueada.
+        '''
+        cell = self.cells.pop(entity)
+        count = self.blocked[cell] - 1
+        if count:
+            self.blocked[cell] = count
+            return None
+        del self.blocked[cell]
+        return cell
+
+    def update(self):
+        '''
+        Acompanha as entidades bloqueadoras criadas, destruídas ou movidas desde a última atualização e descarta os
+        mapas afetados. O custo é proporcional ao número de alterações e de mapas guardados.
+        Deve ser chamado uma vez por quadro, antes das consultas.
+        return: int o número de mapas descartados.
+        '''
+        scene = self.scene
+        changed = scene.changedSince(self.since, Position.id | Blocking.id) | scene.destroyedSince(self.since)
+        self.since = scene.tick
+        flips = []
+        for entity in changed:
+            old = self.cells.get(entity)
+            new = self.cell(entity)
+            if old == new:
+                continue
+            if old is not None:
+                freed = self.unblock(entity)
+                if freed is not None:
+                    flips.append((freed, False))
+            if new is not None and self.block(entity, new):
+                flips.append((new, True))
+        if not flips:
+            return 0
+        stale = [goal for goal, field in self.fields.items()
+                 if any(field.affected(x, y, blocking) for (x, y), blocking in flips)]
+        for goal in stale:
+            del self.fields[goal]
+        return len(stale)
+
+    def field(self, goal):
+        '''
+        Recupera o mapa do objetivo, calculando-o se não está guardado.
+        goal: tuple[int, int] a célula do objetivo.
+        return: FlowField o mapa.
+        '''
+        field = self.fields.get(goal)
+        if field is None:
+            field = FlowField(goal, self.radius, self.blocked)
+            self.fields[goal] = field
+            while len(self.fields) > self.capacity:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(goal)
+        return field
+
+    def direction(self, entity, goal):
+        '''
+        Recupera o passo que aproxima a entidade do objetivo.
+        entity: Entity a entidade com posição.
+        goal: tuple[int, int] a célula do objetivo.
+        return: None or tuple[int, int] o deslocamento (dx, dy), None se o objetivo não é alcançável a partir da
+        posição dentro do raio dos mapas.
+        '''
+        position = entity.components[Position.id]
+        return self.field(goal).direction(position.x, position.y)
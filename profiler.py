@@ -0,0 +1,249 @@
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+from core import Entity, Query, Renderable, Scene
+
+TARGETS = (
+    (Scene, "filter"),
+    (Scene, "query"),
+    (Scene, "matching"),
+    (Scene, "select"),
+    (Scene, "each"),
+    (Query, "run"),
+    (Entity, "__getitem__"),
+    (Entity, "get"),
+    (Renderable, "draw"),
+)
+BUCKETS = (1, 2, 4, 8, 16, 33, 50, 100, 250, 1000)
+
+
+class Profiler:
+    '''
+    Instrumentação opcional dos quadros do jogo.
+    Enquanto instalado, os métodos de TARGETS são substituídos por versões que contam as chamadas, o tempo gasto e o
+    número de entidades retornadas. Desinstalado, os métodos originais são restaurados e o custo é nulo.
+    Somente a chamada mais externa de cada thread é contada: um método instrumentado chamado por outro, como
+    Scene.query por Scene.filter ou Entity.get por Entity.__getitem__, já está incluído no tempo de quem o chamou.
+    Nos geradores, como Scene.each, é contado o tempo gasto dentro do gerador em toda a iteração, sem o tempo de quem
+    o percorre, e o número de itens gerados; a chamada é registrada quando a iteração termina.
+    Cada quadro entre begin e end registra o tempo total, o tempo de cada sistema, as chamadas instrumentadas,
+    o número de entidades e a diferença entre o número de blocos de memória alocados no fim e no início do quadro.
+    frames: deque[dict] os registros dos últimos quadros.
+    histogram: dict[int, int] o número de quadros com duração até cada limite de BUCKETS em milissegundos,
+    com None para os quadros mais longos.
+    filename: None or str o arquivo onde o relatório é salvo periodicamente.
+    interval: float o intervalo em segundos entre dois salvamentos do relatório.
+    '''
+    def __init__(self, filename = None, interval = 10.0, capacity = 600):
+        '''
+        filename: None or str o arquivo onde o relatório é salvo periodicamente.
+        interval: float o intervalo em segundos entre dois salvamentos do relatório.
+        capacity: int o número de quadros guardados.
+        '''
+        self.filename = filename
+        self.interval = interval
+        self.frames = deque(maxlen=capacity)
+        self.histogram = dict.fromkeys(BUCKETS + (None,), 0)
+        self.originals = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.calls = dict()
+        self.systems = dict()
+        self.start = None
+        self.blocks = 0
+        self.count = 0
+        self.saved = time.perf_counter()
+
+    def install(self):
+        '''
+        Substitui os métodos de TARGETS pelas versões instrumentadas.
+        return: Profiler o próprio profiler.
+        '''
+        for cls, name in TARGETS:
+            if (cls, name) not in self.originals:
+                original = cls.__dict__[name]
+                self.originals[(cls, name)] = original
+                setattr(cls, name, self.wrap(cls.__name__ + "." + name, original))
+        return self
+
+    def uninstall(self):
+        '''
+        Restaura os métodos originais.
+        '''
+        for (cls, name), original in self.originals.items():
+            setattr(cls, name, original)
+        self.originals = dict()
+
+    def wrap(self, name, function):
+        '''
+        Cria a versão instrumentada de um método.
+        As chamadas feitas enquanto outro método instrumentado executa na mesma thread vão direto ao original.
+        name: str o nome usado no relatório.
+        function: callable o método original.
+        return: callable o método instrumentado.
+        '''
+        local = self.local
+        add = self.add
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator(*args, **kwargs):
+                iterator = function(*args, **kwargs)
+                if getattr(local, "active", False):
+                    return iterator
+                return self.iterate(name, iterator)
+            return generator
+
+        @functools.wraps(function)
+        def instrumented(*args, **kwargs):
+            if getattr(local, "active", False):
+                return function(*args, **kwargs)
+            local.active = True
+            try:
+                start = time.perf_counter()
+                result = function(*args, **kwargs)
+                elapsed = time.perf_counter() - start
+            finally:
+                local.active = False
+            add(name, elapsed, len(result) if isinstance(result, (set, list)) else 0)
+            return result
+        return instrumented
+
+    def iterate(self, name, iterator):
+        '''
+        Percorre um gerador instrumentado, medindo somente o tempo gasto dentro dele.
+        Um passo pedido enquanto outro método instrumentado executa na mesma thread não é medido.
+        name: str o nome usado no relatório.
+        iterator: generator o gerador original.
+        return: generator os mesmos itens do gerador original.
+        '''
+        local = self.local
+        elapsed = 0.0
+        items = 0
+        try:
+            while True:
+                if getattr(local, "active", False):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                else:
+                    local.active = True
+                    start = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - start
+                        local.active = False
+                items += 1
+                yield item
+        finally:
+            self.add(name, elapsed, items)
+
+    def add(self, name, elapsed, items):
+        '''
+        Soma uma chamada às estatísticas do quadro atual.
+        name: str o nome do método.
+        elapsed: float a duração da chamada em segundos.
+        items: int o número de entidades retornadas.
+        '''
+        with self.lock:
+            stats = self.calls.get(name)
+            if stats is None:
+                self.calls[name] = [1, elapsed, items]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += items
+
+    def begin(self):
+        '''
+        Inicia a medição de um quadro.
+        '''
+        self.calls.clear()
+        self.systems = dict()
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+
+    def system(self, name, duration):
+        '''
+        Registra o tempo gasto por um sistema no quadro atual.
+        name: str o nome do sistema.
+        duration: float a duração em segundos.
+        '''
+        self.systems[name] = self.systems.get(name, 0.0) + duration
+
+    def end(self, scene = None):
+        '''
+        Termina a medição do quadro, guarda o seu registro e salva o relatório quando o intervalo passou.
+        scene: None or Scene a cena cujo número de entidades é registrado.
+        return: dict o registro do quadro.
+        '''
+        elapsed = time.perf_counter() - self.start
+        with self.lock:
+            calls = {name: {"calls": stats[0], "time": stats[1], "items": stats[2]} for name, stats in self.calls.items()}
+        record = {
+            "frame": self.count,
+            "time": elapsed,
+            "blocks": sys.getallocatedblocks() - self.blocks,
+            "entities": len(scene.entities) if scene is not None else None,
+            "systems": self.systems,
+            "calls": calls,
+        }
+        self.count = self.count + 1
+        self.frames.append(record)
+        milliseconds = elapsed * 1000
+        self.histogram[next((bucket for bucket in BUCKETS if milliseconds <= bucket), None)] += 1
+        if self.filename is not None and time.perf_counter() - self.saved >= self.interval:
+            self.dump()
+        return record
+
+    def report(self):
+        '''
+        Resume os quadros guardados.
+        return: dict com frames (quadros medidos), mean, p50, p99 e max (duração dos quadros guardados),
+        histogram e os totais de systems e calls dos quadros guardados.
+        '''
+        times = sorted(frame["time"] for frame in self.frames)
+        systems = dict()
+        calls = dict()
+        for frame in self.frames:
+            for name, duration in frame["systems"].items():
+                systems[name] = systems.get(name, 0.0) + duration
+            for name, stats in frame["calls"].items():
+                total = calls.setdefault(name, {"calls": 0, "time": 0.0, "items": 0})
+                for key in total:
+                    total[key] += stats[key]
+        return {
+            "frames": self.count,
+            "mean": sum(times) / len(times) if times else 0.0,
+            "p50": times[len(times) // 2] if times else 0.0,
+            "p99": times[min(len(times) - 1, int(0.99 * len(times)))] if times else 0.0,
+            "max": times[-1] if times else 0.0,
+            "histogram": {("inf" if bucket is None else str(bucket)): count for bucket, count in self.histogram.items()},
+            "systems": systems,
+            "calls": calls,
+        }
+
+    def dump(self, filename = None):
+        '''
+        Salva o relatório e os registros dos quadros guardados em JSON.
+        filename: None or str o arquivo, por padrão o filename do profiler.
+        '''
+        with open(filename or self.filename, "w") as outfile:
+            json.dump({"report": self.report(), "frames": list(self.frames)}, outfile, indent=2)
+        self.saved = time.perf_counter()
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exception):
+        self.uninstall()
+        return False
@@ -0,0 +1,165 @@
+from array import array
+
+BLANK = ord(" ")
+WHITE = 0xFFFFFFFF
+BLACK = 0x000000FF
+
+
+def pack(color):
+    '''
+    Compacta uma cor em um único inteiro de 32 bits.
+    color: tupla[int,int,int,int] a cor no formato (r, g, b, a).
+    return: int a cor no formato 0xRRGGBBAA.
+    '''
+    r, g, b, a = color
+    return (r << 24) | (g << 16) | (b << 8) | a
+
+
+def unpack(color):
+    '''
+    Recupera a cor a partir do inteiro compactado.
+    color: int a cor no formato 0xRRGGBBAA.
+    return: tupla[int,int,int,int] a cor no formato (r, g, b, a).
+    '''
+    return ((color >> 24) & 0xFF, (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF)
+
+
+class Framebuffer:
+    '''
+    Tela de células com buffer duplo.
+    O desenho é feito no buffer de trás e flush emite somente as células que diferem do buffer da frente.
+    width: int o número de colunas.
+    height: int o número de linhas.
+    glyphs, foregrounds, backgrounds: array[int] o buffer de trás com o código do caractere e as cores compactadas de cada célula.
+    front: tuple[array[int], array[int], array[int]] o buffer da frente, com o conteúdo já emitido.
+    tick: None or int o tick da cena no último desenho incremental.
+    drawn: dict[Entity, tuple[int, int]] a célula onde cada entidade foi desenhada pelo desenho incremental.
+    cells: dict[tuple[int, int], set[Entity]] as entidades desenhadas em cada célula pelo desenho incremental.
+    origin: None or tuple[int, int] a coordenada do mundo no canto da tela no último desenho incremental.
+    '''
+    def __init__(self, width, height):
+        '''
+        Cria uma tela vazia.
+        A primeira chamada de flush emite todas as células.
+        width: int o número de colunas.
+        height: int o número de linhas.
+        '''
+        self.width = width
+        self.height = height
+        size = width * height
+        self.blank = (array("I", [BLANK]) * size, array("I", [WHITE]) * size, array("I", [BLACK]) * size)
+        self.glyphs = array("I", self.blank[0])
+        self.foregrounds = array("I", self.blank[1])
+        self.backgrounds = array("I", self.blank[2])
+        self.front = (array("I", [0]) * size, array("I", self.blank[1]), array("I", self.blank[2]))
+        self.tick = None
+        self.drawn = dict()
+        self.cells = dict()
+        self.origin = None
+
+    def clear(self):
+        '''
+        Limpa o buffer de trás.
+        '''
+        self.glyphs[:] = self.blank[0]
+        self.foregrounds[:] = self.blank[1]
+        self.backgrounds[:] = self.blank[2]
+
+    def erase(self, x, y):
+        '''
+        Apaga uma célula do buffer de trás.
+        Coordenadas fora da tela são ignoradas.
+        x: int a coluna.
+        y: int a linha.
+        '''
+        if 0 <= x < self.width and 0 <= y < self.height:
+            cell = y * self.width + x
+            self.glyphs[cell] = BLANK
+            self.foregrounds[cell] = WHITE
+            self.backgrounds[cell] = BLACK
+
+    def invalidate(self):
+        '''
+        Descarta o conteúdo do buffer da frente para que o próximo flush emita todas as células.
+        '''
+        self.front[0][:] = array("I", [0]) * (self.width * self.height)
+
+    def put(self, x, y, glyph, foreground = (255, 255, 255, 255), background = (0, 0, 0, 255)):
+        '''
+        Desenha um caractere no buffer de trás.
+        Coordenadas fora da tela são ignoradas.
+        x: int a coluna.
+        y: int a linha.
+        glyph: str o caractere.
+        foreground: tupla[int,int,int,int] a cor do caractere.
+        background: tupla[int,int,int,int] a cor de fundo.
+        '''
+        if 0 <= x < self.width and 0 <= y < self.height:
+            cell = y * self.width + x
+            self.glyphs[cell] = ord(glyph)
+            self.foregrounds[cell] = pack(foreground)
+            self.backgrounds[cell] = pack(background)
+
+    def get(self, x, y):
+        '''
+        Recupera o conteúdo de uma célula do buffer de trás.
+        return: tupla[str, tupla, tupla] o caractere, a cor do caractere e a cor de fundo.
+        '''
+        cell = y * self.width + x
+        return (chr(self.glyphs[cell]), unpack(self.foregrounds[cell]), unpack(self.backgrounds[cell]))
+
+    def changes(self):
+        '''
+        Percorre as sequências de células alteradas em relação ao buffer da frente.
+        As linhas idênticas são descartadas com uma comparação de fatias dos arrays.
+        return: iterator[tuple[int, int, int]] a linha, a primeira coluna e a coluna seguinte à última de cada sequência.
+        '''
+        glyphs, foregrounds, backgrounds = self.front
+        for y in range(self.height):
+            start = y * self.width
+            end = start + self.width
+            if (self.glyphs[start:end] == glyphs[start:end]
+                    and self.foregrounds[start:end] == foregrounds[start:end]
+                    and self.backgrounds[start:end] == backgrounds[start:end]):
+                continue
+            first = None
+            for cell in range(start, end):
+                if (self.glyphs[cell] != glyphs[cell] or self.foregrounds[cell] != foregrounds[cell]
+                        or self.backgrounds[cell] != backgrounds[cell]):
+                    if first is None:
+                        first = cell
+                elif first is not None:
+                    yield (y, first - start, cell - start)
+                    first = None
+            if first is not None:
+                yield (y, first - start, self.width)
+
+    def flush(self, stream = None):
+        '''
+        Emite as células alteradas como sequências de escape ANSI e copia o buffer de trás para o da frente.
+        As cores só são emitidas quando mudam em relação à célula emitida anteriormente.
+        stream: None or TextIO o destino da saída, por exemplo sys.stdout.
+        return: str a saída emitida, vazia se nada mudou.
+        '''
+        output = []
+        foreground = None
+        background = None
+        for y, x0, x1 in self.changes():
+            output.append("\x1b[%d;%dH" % (y + 1, x0 + 1))
+            start = y * self.width
+            for cell in range(start + x0, start + x1):
+                if self.foregrounds[cell] != foreground:
+                    foreground = self.foregrounds[cell]
+                    output.append("\x1b[38;2;%d;%d;%dm" % unpack(foreground)[:3])
+                if self.backgrounds[cell] != background:
+                    background = self.backgrounds[cell]
+                    output.append("\x1b[48;2;%d;%d;%dm" % unpack(background)[:3])
+                output.append(chr(self.glyphs[cell]))
+        self.front[0][:] = self.glyphs
+        self.front[1][:] = self.foregrounds
+        self.front[2][:] = self.backgrounds
+        text = "".join(output)
+        if stream is not None and text:
+            stream.write(text)
+            stream.flush()
+        return text
@@ -0,0 +1,166 @@
+import sys
+from collections import deque
+from itertools import islice
+
+from autosave import apply, duplicate, parse, segment
+from core import slots
+
+SAMPLE = 1024
+
+
+def footprint(entities):
+    '''
+    Mede a memória ocupada por entidades fora de cena, somando sys.getsizeof de cada objeto alcançável a partir delas:
+    a entidade, o id, o dicionário dos componentes, os componentes e os valores dos seus campos.
+    Um objeto compartilhado, como uma tupla de cor, é contado uma única vez.
+    entities: iterable[Entity] as entidades medidas.
+    return: int o tamanho em bytes.
+    '''
+    seen = set()
+    total = 0
+    pending = list(entities)
+    while pending:
+        value = pending.pop()
+        if value is None or id(value) in seen:
+            continue
+        seen.add(id(value))
+        total = total + sys.getsizeof(value)
+        if isinstance(value, dict):
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (tuple, list)):
+            pending.extend(value)
+        elif not isinstance(value, (int, float, str, bytes)):
+            pending.extend(getattr(value, name, None) for name in slots(type(value)) if name not in ("entity", "scene"))
+            pending.extend(getattr(value, "__dict__", dict()).values())
+    return total
+
+
+class Rewind:
+    '''
+    Buffer circular dos últimos quadros da cena, para voltar no tempo durante a depuração ou um replay.
+    Guarda um quadro-chave com cópias de todas as entidades e, para cada quadro gravado, um delta com as entidades
+    alteradas, criadas ou destruídas, codificado no formato dos segmentos do autosave. Quando o tamanho passa de
+    budget, os deltas mais antigos são aplicados ao quadro-chave, com custo proporcional ao tamanho dos deltas.
+    A gravação usa o rastreamento de alterações da cena e custa proporcionalmente ao número de entidades alteradas.
+    ECS: EntityComponentSystem o sistema gravado.
+    budget: int o tamanho máximo aproximado em bytes do quadro-chave somado aos deltas.
+    keyframe: dict[int, Entity] cópias das entidades no tick do quadro-chave, fora de qualquer cena.
+    tick: None or int o tick do quadro-chave.
+    deltas: deque[tuple[int, bytes]] o tick e o delta de cada quadro gravado depois do quadro-chave.
+    unit: float a memória média ocupada por uma entidade do quadro-chave, medida por start em uma amostra de até SAMPLE
+    entidades.
+    '''
+    def __init__(self, ECS, budget = 64 * 1024 * 1024):
+        '''
+        ECS: EntityComponentSystem o sistema gravado.
+        budget: int o tamanho máximo aproximado em bytes do quadro-chave somado aos deltas.
+        '''
+        self.ECS = ECS
+        self.budget = budget
+        self.keyframe = dict()
+        self.tick = None
+        self.deltas = deque()
+        self.bytes = 0
+        self.unit = 0.0
+        self.since = None
+
+    def start(self):
+        '''
+        Passa a rastrear todos os componentes registrados e grava o quadro-chave com o estado atual da cena.
+        O tick da cena é avançado.
+        '''
+        scene = self.ECS.scene
+        scene.track((1 << len(self.ECS.registry)) - 1)
+        self.tick = scene.tick
+        self.keyframe = {entity.id: duplicate(entity) for entity in scene.entities}
+        sample = list(islice(self.keyframe.values(), SAMPLE))
+        self.unit = footprint(sample) / max(1, len(sample))
+        self.deltas = deque()
+        self.bytes = 0
+        self.since = scene.advance()
+
+    @property
+    def size(self):
+        '''
+        return: int o tamanho aproximado em bytes do quadro-chave, guardado como objetos, somado aos deltas.
+        '''
+        return int(self.unit * len(self.keyframe)) + sys.getsizeof(self.keyframe) + self.bytes
+
+    def record(self):
+        '''
+        Grava o delta do quadro atual e avança o tick da cena.
+        Deve ser chamado no fim de cada quadro.
+        return: int o tick do quadro gravado.
+        '''
+        scene = self.ECS.scene
+        tick = scene.tick
+        changed = scene.changedSince(self.since, (1 << len(self.ECS.registry)) - 1)
+        entities = [entity for entity in changed if entity.scene is scene]
+        destroyed = [entity.id for entity in scene.destroyedSince(self.since) if entity.id not in scene.ids]
+        data = segment(tick, entities, destroyed)
+        self.deltas.append((tick, data))
+        self.bytes = self.bytes + len(data)
+        self.since = scene.advance()
+        while len(self.deltas) > 1 and self.size > self.budget:
+            self.fold()
+        return tick
+
+    def fold(self):
+        '''
+        Aplica o delta mais antigo ao quadro-chave.
+        '''
+        tick, data = self.deltas.popleft()
+        for _, entities, destroyed in parse(data):
+            apply(self.keyframe, entities, destroyed)
+        self.bytes = self.bytes - len(data)
+        self.tick = tick
+
+    def ticks(self):
+        '''
+        Determina os ticks que podem ser restaurados.
+        return: list[int] os ticks em ordem crescente, começando pelo quadro-chave.
+        '''
+        return [self.tick] + [tick for tick, _ in self.deltas]
+
+    def state(self, tick):
+        '''
+        Reconstrói o estado da cena em um tick gravado.
+        tick: int o tick desejado.
+        return: dict[int, Entity] cópias novas das entidades pelo id, fora de qualquer cena.
+        '''
+        state = dict(self.keyframe)
+        for delta, data in self.deltas:
+            if delta > tick:
+                break
+            for _, entities, destroyed in parse(data):
+                apply(state, entities, destroyed)
+        return {id: duplicate(entity) for id, entity in state.items()}
+
+    def restore(self, tick):
+        '''
+        Substitui as entidades da cena pelo estado de um tick gravado e descarta os quadros posteriores.
+        Gera ValueError se o tick não está no buffer.
+        tick: int o tick desejado, um dos valores de ticks.
+        '''
+        if tick not in self.ticks():
+            raise ValueError()
+        entities = list(self.state(tick).values())
+        while self.deltas and self.deltas[-1][0] > tick:
+            self.bytes = self.bytes - len(self.deltas.pop()[1])
+        scene = self.ECS.scene
+        scene.clear()
+        scene.createMany(entities)
+        self.ECS.id = max([self.ECS.id] + [entity.id for entity in entities])
+        self.since = scene.advance()
+
+    def back(self, frames = 1):
+        '''
+        Volta a cena alguns quadros gravados.
+        frames: int o número de quadros, limitado ao quadro-chave.
+        return: int o tick restaurado.
+        '''
+        ticks = self.ticks()
+        tick = ticks[max(0, len(ticks) - 1 - frames)]
+        self.restore(tick)
+        return tick
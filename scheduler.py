@@ -0,0 +1,168 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core import Position, Renderable, update
+
+
+class System:
+    '''
+    Representa um sistema do jogo que lê e escreve componentes.
+    Dois sistemas entram em conflito quando um escreve componentes que o outro lê ou escreve.
+    reads: int máscara de bits dos componentes lidos.
+    writes: int máscara de bits dos componentes escritos.
+    name: str o nome usado nos relatórios.
+    '''
+    def __init__(self, reads = 0, writes = 0, run = None, name = None):
+        '''
+        reads: int máscara de bits dos componentes lidos.
+        writes: int máscara de bits dos componentes escritos.
+        run: None or callable[[EntityComponentSystem], None] a função executada, quando run não é sobrescrito.
+        name: None or str o nome do sistema, por padrão o nome da função ou da classe.
+        '''
+        self.reads = reads
+        self.writes = writes
+        self.function = run
+        if name is None:
+            name = run.__name__ if run is not None else type(self).__name__
+        self.name = name
+
+    def run(self, ECS):
+        '''
+        Executa o sistema.
+        Sistemas executados em paralelo não devem criar ou destruir entidades nem adicionar ou remover componentes
+        diretamente, essas operações devem ser registradas em ECS.scene.commands e são aplicadas ao fim do quadro.
+        ECS: EntityComponentSystem o sistema do jogo.
+        '''
+        if self.function is not None:
+            self.function(ECS)
+
+    def conflicts(self, other):
+        '''
+        Determina se os dois sistemas não podem ser executados ao mesmo tempo.
+        other: System o outro sistema.
+        return: bool true se um dos sistemas escreve componentes usados pelo outro.
+        '''
+        return bool(self.writes & (other.reads | other.writes) or other.writes & self.reads)
+
+
+class RenderSystem(System):
+    '''
+    Sistema que desenha as entidades com Position e Renderable usando update.
+    '''
+    def __init__(self):
+        super().__init__(reads=Position.id | Renderable.id, run=update, name="render")
+
+
+class Scheduler:
+    '''
+    Executa os sistemas de cada quadro em paralelo respeitando os conflitos entre eles.
+    Entre dois sistemas em conflito vale a ordem de registro, os demais são executados ao mesmo tempo.
+    systems: list[System] os sistemas na ordem de registro.
+    executor: concurrent.futures.Executor o executor dos sistemas.
+    last: None or dict o relatório do último quadro executado.
+    profiler: None or profiler.Profiler o profiler que recebe a medição de cada quadro.
+    '''
+    def __init__(self, systems = (), workers = None, executor = None, profiler = None):
+        '''
+        systems: iterable[System] os sistemas iniciais.
+        workers: None or int o número de threads do executor padrão.
+        executor: None or concurrent.futures.Executor o executor, por padrão um ThreadPoolExecutor.
+        profiler: None or profiler.Profiler o profiler que recebe a medição de cada quadro.
+        '''
+        self.systems = list(systems)
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=workers)
+        self.last = None
+        self.profiler = profiler
+
+    def add(self, system):
+        '''
+        Registra um sistema depois dos já registrados.
+        system: System o sistema.
+        return: System o sistema registrado.
+        '''
+        self.systems.append(system)
+        return system
+
+    def graph(self):
+        '''
+        Constrói o grafo de dependências entre os sistemas.
+        return: list[list[int]] para cada sistema, os índices dos sistemas anteriores com os quais ele conflita.
+        '''
+        return [[i for i in range(j) if self.systems[i].conflicts(self.systems[j])] for j in range(len(self.systems))]
+
+    @staticmethod
+    def execute(system, ECS):
+        '''
+        Executa um sistema medindo o tempo gasto.
+        return: float a duração em segundos.
+        '''
+        start = time.perf_counter()
+        system.run(ECS)
+        return time.perf_counter() - start
+
+    def run(self, ECS):
+        '''
+        Executa um quadro, iniciando cada sistema assim que os sistemas dos quais ele depende terminam.
+        Ao fim do quadro as alterações estruturais registradas em ECS.scene.commands são aplicadas.
+        Uma exceção de um sistema é propagada depois que os sistemas em execução terminam.
+        ECS: EntityComponentSystem o sistema do jogo.
+        return: dict o relatório do quadro com elapsed (duração total), work (soma das durações),
+        critical (duração do caminho crítico) e durations (duração de cada sistema pelo nome).
+        '''
+        systems = list(self.systems)
+        predecessors = self.graph()
+        successors = [[] for _ in systems]
+        for j, before in enumerate(predecessors):
+            for i in before:
+                successors[i].append(j)
+        remaining = [len(before) for before in predecessors]
+        durations = [0.0] * len(systems)
+        running = dict()
+        if self.profiler is not None:
+            self.profiler.begin()
+        start = time.perf_counter()
+        for i, count in enumerate(remaining):
+            if count == 0:
+                running[self.executor.submit(self.execute, systems[i], ECS)] = i
+        error = None
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                try:
+                    durations[i] = future.result()
+                except Exception as exception:
+                    error = error or exception
+                    continue
+                if error is not None:
+                    continue
+                for j in successors[i]:
+                    remaining[j] -= 1
+                    if remaining[j] == 0:
+                        running[self.executor.submit(self.execute, systems[j], ECS)] = j
+        scene = getattr(ECS, "scene", None)
+        if error is None and scene is not None:
+            scene.commands.apply()
+        elapsed = time.perf_counter() - start
+        if error is not None:
+            raise error
+        longest = [0.0] * len(systems)
+        for j, before in enumerate(predecessors):
+            longest[j] = durations[j] + max((longest[i] for i in before), default=0.0)
+        self.last = {
+            "elapsed": elapsed,
+            "work": sum(durations),
+            "critical": max(longest, default=0.0),
+            "durations": {system.name: duration for system, duration in zip(systems, durations)},
+        }
+        if self.profiler is not None:
+            for system, duration in zip(systems, durations):
+                self.profiler.system(system.name, duration)
+            self.profiler.end(scene)
+        return self.last
+
+    def close(self):
+        '''
+        Encerra o executor esperando os sistemas em execução.
+        '''
+        self.executor.shutdown()
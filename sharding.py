@@ -0,0 +1,335 @@
+import bisect
+import multiprocessing
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from core import Position, assign
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TYPECODES = {"x": "i", "y": "i"}
+
+
+def views(buffer, fields, capacity, count):
+    '''
+    Cria as colunas de um bloco de memória compartilhada, na ordem dos campos.
+    Com numpy as colunas são arrays, sem numpy são memoryviews, ambos sem cópia.
+    buffer: memoryview o conteúdo do bloco.
+    fields: tuple[str] os campos do bloco.
+    capacity: int o número de linhas reservadas por coluna.
+    count: int o número de linhas ocupadas expostas em cada coluna.
+    return: dict[str, numpy.ndarray or memoryview] as colunas de cada campo.
+    '''
+    columns = dict()
+    offset = 0
+    for field in fields:
+        typecode = TYPECODES.get(field, "i")
+        size = array(typecode).itemsize * capacity
+        data = buffer[offset:offset + size]
+        if numpy is not None:
+            columns[field] = numpy.frombuffer(data, dtype=numpy.dtype(typecode))[:count]
+        else:
+            columns[field] = data.cast(typecode)[:count]
+        offset = offset + size
+    return columns
+
+
+def blockSize(fields, capacity):
+    '''
+    Determina o tamanho em bytes de um bloco com as colunas dos campos.
+    return: int o tamanho do bloco.
+    '''
+    return sum(array(TYPECODES.get(field, "i")).itemsize * capacity for field in fields)
+
+
+def work(connection, kernel, fields):
+    '''
+    Laço de um processo de shard.
+    Recebe comandos pela conexão: ("attach", nome, capacidade) para usar outro bloco de memória,
+    ("tick", linhas, argumentos) para executar o kernel e ("stop",) para terminar.
+    connection: multiprocessing.connection.Connection o canal com o processo principal.
+    kernel: callable[[dict[str, sequence[int]], ...], None] a função que altera as colunas do shard.
+    fields: tuple[str] os campos das colunas.
+    '''
+    block = None
+    capacity = 0
+    while True:
+        command = connection.recv()
+        if command[0] == "stop":
+            break
+        if command[0] == "attach":
+            if block is not None:
+                block.close()
+            block = shared_memory.SharedMemory(name=command[1])
+            capacity = command[2]
+            connection.send(("attached",))
+        elif command[0] == "tick":
+            start = time.perf_counter()
+            try:
+                columns = views(block.buf, fields, capacity, command[1])
+                kernel(columns, *command[2])
+                del columns
+                connection.send(("done", time.perf_counter() - start))
+            except Exception as exception:
+                connection.send(("error", exception))
+    if block is not None:
+        block.close()
+    connection.close()
+
+
+class Shard:
+    '''
+    Faixa vertical do mundo com as colunas das suas entidades em memória compartilhada.
+    low: int a menor coordenada x da faixa.
+    high: int a coordenada x seguinte à última da faixa.
+    entities: list[Entity] a entidade de cada linha.
+    rows: dict[Entity, int] a linha ocupada por cada entidade.
+    block: shared_memory.SharedMemory o bloco com as colunas.
+    capacity: int o número de linhas reservadas.
+    process: multiprocessing.Process o processo do shard.
+    connection: multiprocessing.connection.Connection o canal com o processo.
+    '''
+    def __init__(self, low, high, fields, capacity):
+        self.low = low
+        self.high = high
+        self.fields = fields
+        self.entities = []
+        self.rows = dict()
+        self.capacity = capacity
+        self.block = shared_memory.SharedMemory(create=True, size=blockSize(fields, capacity))
+        self.process = None
+        self.connection = None
+
+    def columns(self):
+        '''
+        Recupera as colunas das linhas ocupadas para leitura e escrita pelo processo principal.
+        Só deve ser usado enquanto o processo do shard está parado entre dois ticks.
+        return: dict[str, numpy.ndarray or memoryview] as colunas de cada campo.
+        '''
+        return views(self.block.buf, self.fields, self.capacity, len(self.entities))
+
+    def grow(self, capacity):
+        '''
+        Troca o bloco de memória por outro com a capacidade especificada, copiando as linhas ocupadas.
+        capacity: int a nova capacidade.
+        '''
+        block = shared_memory.SharedMemory(create=True, size=blockSize(self.fields, capacity))
+        count = len(self.entities)
+        old = views(self.block.buf, self.fields, self.capacity, count)
+        new = views(block.buf, self.fields, capacity, count)
+        for field in self.fields:
+            new[field][:] = old[field]
+        del old, new
+        if self.connection is not None:
+            self.connection.send(("attach", block.name, capacity))
+            self.connection.recv()
+        self.block.close()
+        self.block.unlink()
+        self.block = block
+        self.capacity = capacity
+
+    def append(self, entity, values):
+        '''
+        Insere a entidade em uma nova linha.
+        entity: Entity a entidade.
+        values: dict[str, int] o valor de cada campo.
+        '''
+        if len(self.entities) == self.capacity:
+            self.grow(self.capacity * 2)
+        self.rows[entity] = len(self.entities)
+        self.entities.append(entity)
+        columns = self.columns()
+        row = len(self.entities) - 1
+        for field in self.fields:
+            columns[field][row] = values[field]
+
+    def pop(self, row):
+        '''
+        Remove a linha movendo a última linha para a posição liberada.
+        row: int a linha removida.
+        return: tuple[Entity, dict[str, int]] a entidade e os valores dos seus campos.
+        '''
+        columns = self.columns()
+        last = len(self.entities) - 1
+        values = {field: int(columns[field][row]) for field in self.fields}
+        entity = self.entities[row]
+        for field in self.fields:
+            columns[field][row] = columns[field][last]
+        del columns
+        moved = self.entities[last]
+        self.entities[row] = moved
+        self.rows[moved] = row
+        self.entities.pop()
+        del self.rows[entity]
+        return entity, values
+
+
+class ShardedWorld:
+    '''
+    Divide as entidades com posição em faixas verticais, cada uma simulada por um processo com as colunas em
+    memória compartilhada.
+    A cada step os processos executam o kernel ao mesmo tempo, e na sincronização as entidades que saíram da
+    faixa são entregues ao shard vizinho. Entre dois steps o processo principal tem uma visão consistente das colunas.
+    O mundo é registrado na cena por Scene.observe, de modo que as entidades com posição criadas ou destruídas depois
+    entram e saem dos shards sem chamadas explícitas a insert e delete.
+    scene: Scene a cena de onde vêm as entidades.
+    signature: int a assinatura das entidades simuladas, a de Position.
+    fields: tuple[str] os campos das colunas, sempre começando por x e y.
+    shards: list[Shard] as faixas do mundo.
+    slots: dict[Entity, Shard] o shard de cada entidade simulada.
+    '''
+    signature = Position.id
+
+    def __init__(self, scene, kernel, shards = None, fields = (), initial = None, capacity = 1024):
+        '''
+        scene: Scene a cena de onde vêm as entidades com posição.
+        kernel: callable[[dict[str, sequence[int]], ...], None] função de nível de módulo executada por cada
+        processo sobre as colunas do seu shard.
+        shards: None or int o número de faixas, por padrão o número de processadores.
+        fields: tuple[str] os campos adicionais, inteiros de 32 bits.
+        initial: None or dict[str, callable[[Entity], int]] o valor inicial de cada campo adicional, por padrão zero.
+        capacity: int o número inicial de linhas reservadas por shard.
+        '''
+        count = shards or multiprocessing.cpu_count()
+        self.scene = scene
+        self.kernel = kernel
+        self.fields = ("x", "y") + tuple(fields)
+        self.initial = initial or dict()
+        self.shards = []
+        for i in range(count):
+            low = -4096 + 8193 * i // count
+            high = -4096 + 8193 * (i + 1) // count
+            self.shards.append(Shard(low, high, self.fields, capacity))
+        self.lows = [shard.low for shard in self.shards]
+        self.durations = []
+        self.slots = dict()
+        scene.observe(self)
+
+    def locate(self, x):
+        '''
+        Determina o shard responsável pela coordenada horizontal, pelas mesmas faixas usadas por handoff.
+        Coordenadas fora da grade pertencem ao shard da borda mais próxima.
+        return: int o índice do shard.
+        '''
+        return max(bisect.bisect_right(self.lows, x) - 1, 0)
+
+    def insert(self, entity):
+        '''
+        Passa a simular a entidade no shard da sua posição. Uma entidade já simulada é ignorada.
+        entity: Entity a entidade com posição.
+        '''
+        if entity in self.slots:
+            return
+        position = entity[Position.id]
+        values = {"x": position.x, "y": position.y}
+        for field in self.fields[2:]:
+            function = self.initial.get(field)
+            values[field] = function(entity) if function is not None else 0
+        shard = self.shards[self.locate(position.x)]
+        shard.append(entity, values)
+        self.slots[entity] = shard
+
+    def delete(self, entity):
+        '''
+        Deixa de simular a entidade.
+        entity: Entity a entidade simulada.
+        '''
+        shard = self.slots.pop(entity, None)
+        if shard is not None:
+            shard.pop(shard.rows[entity])
+
+    def clear(self):
+        '''
+        Deixa de simular todas as entidades, mantendo os shards e os seus processos.
+        '''
+        for shard in self.shards:
+            shard.entities = []
+            shard.rows = dict()
+        self.slots = dict()
+
+    def start(self):
+        '''
+        Inicia um processo por shard.
+        '''
+        for shard in self.shards:
+            parent, child = multiprocessing.Pipe()
+            shard.connection = parent
+            shard.process = multiprocessing.Process(target=work, args=(child, self.kernel, self.fields), daemon=True)
+            shard.process.start()
+            child.close()
+            parent.send(("attach", shard.block.name, shard.capacity))
+            parent.recv()
+
+    def step(self, *args):
+        '''
+        Executa o kernel em todos os shards ao mesmo tempo e entrega as entidades que mudaram de faixa.
+        args: os argumentos adicionais passados ao kernel.
+        return: list[float] a duração do kernel em cada shard.
+        '''
+        for shard in self.shards:
+            shard.connection.send(("tick", len(shard.entities), args))
+        self.durations = []
+        error = None
+        for shard in self.shards:
+            reply = shard.connection.recv()
+            if reply[0] == "error":
+                error = error or reply[1]
+            else:
+                self.durations.append(reply[1])
+        if error is not None:
+            raise error
+        self.handoff()
+        return self.durations
+
+    def handoff(self):
+        '''
+        Move para o shard correto cada entidade cuja coordenada x saiu da faixa do seu shard.
+        Os shards das bordas também recebem as coordenadas fora da grade, como em locate.
+        '''
+        moving = []
+        last = len(self.shards) - 1
+        for i, shard in enumerate(self.shards):
+            low = shard.low if i > 0 else -2 ** 31
+            high = shard.high if i < last else 2 ** 31
+            xs = shard.columns()["x"]
+            if numpy is not None:
+                rows = numpy.flatnonzero((xs < low) | (xs >= high)).tolist()
+            else:
+                rows = [row for row in range(len(xs)) if not low <= xs[row] < high]
+            del xs
+            for row in reversed(rows):
+                moving.append(shard.pop(row))
+        for entity, values in moving:
+            shard = self.shards[self.locate(values["x"])]
+            shard.append(entity, values)
+            self.slots[entity] = shard
+
+    def sync(self):
+        '''
+        Copia as coordenadas das colunas para os componentes Position das entidades.
+        Deve ser chamado entre dois steps, por exemplo antes de salvar ou desenhar.
+        '''
+        for shard in self.shards:
+            columns = shard.columns()
+            positions = [entity[Position.id] for entity in shard.entities]
+            assign(positions, "x", map(int, columns["x"]))
+            assign(positions, "y", map(int, columns["y"]))
+            del columns
+
+    def close(self):
+        '''
+        Termina os processos, libera a memória compartilhada e retira o mundo dos observadores da cena.
+        '''
+        self.scene.unobserve(self)
+        for shard in self.shards:
+            if shard.connection is not None:
+                shard.connection.send(("stop",))
+                shard.process.join()
+                shard.connection.close()
+                shard.connection = None
+            shard.block.close()
+            shard.block.unlink()
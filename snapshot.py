@@ -0,0 +1,536 @@
+import bisect
+import mmap
+import pickle
+import struct
+import sys
+from array import array
+from collections import deque
+from itertools import compress, count, repeat
+from operator import and_, attrgetter, is_not
+
+from core import Entity, Position, PositionView, Renderable, assign, paused
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b"ECSB"
+VERSION = 1
+HEADER = "<4sHHQ"
+POSITIONS = "<QB7x"
+RENDERABLES = "<QQQ"
+EXTRA = "<Q"
+
+
+def align(offset):
+    '''
+    Arredonda o deslocamento para o próximo múltiplo de 8 bytes.
+    offset: int o deslocamento em bytes.
+    return: int o deslocamento alinhado.
+    '''
+    return (offset + 7) & ~7
+
+
+class Writer:
+    '''
+    Escreve as seções do formato binário mantendo cada uma alinhada em 8 bytes.
+    outfile: BinaryIO o arquivo de destino.
+    offset: int o número de bytes escritos.
+    '''
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.offset = 0
+
+    def write(self, data):
+        '''
+        Escreve os bytes e completa com zeros até o próximo alinhamento.
+        data: bytes os dados escritos.
+        '''
+        self.outfile.write(data)
+        padding = align(self.offset + len(data)) - self.offset - len(data)
+        if padding:
+            self.outfile.write(b"\0" * padding)
+        self.offset = self.offset + len(data) + padding
+
+    def pack(self, format, *values):
+        '''
+        Escreve valores no formato do módulo struct.
+        '''
+        self.write(struct.pack(format, *values))
+
+    def column(self, values):
+        '''
+        Escreve uma coluna de valores em little-endian.
+        values: array a coluna.
+        '''
+        if sys.byteorder != "little":
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.write(values.tobytes())
+
+
+class Snapshot:
+    '''
+    Leitura do formato binário a partir de qualquer objeto que exponha um buffer, como bytes ou mmap.
+    As colunas são views sobre o buffer, sem cópia, em máquinas little-endian.
+    count: int o número de entidades.
+    ids, signatures: sequence[int] o identificador e a assinatura de cada entidade.
+    positions: tuple[sequence[int], sequence[int], sequence[int]] a linha da entidade, x e y de cada posição.
+    renderables: tuple[sequence[int], sequence[int], sequence[int], sequence[int]] a linha da entidade e os índices do caractere, da cor e da cor de fundo.
+    glyphs: list[str] a tabela de caracteres.
+    colors: list[tupla[int,int,int,int]] a tabela de cores.
+    extra: list[tuple[int, Component]] os demais componentes com a linha da entidade.
+    '''
+    def __init__(self, buffer):
+        '''
+        Interpreta o cabeçalho e localiza as colunas.
+        Um buffer com outro formato ou versão gera ValueError.
+        buffer: bytes or mmap o conteúdo do arquivo.
+        '''
+        self.buffer = memoryview(buffer)
+        self.offset = 0
+        magic, version, width, count = self.unpack(HEADER)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError()
+        self.count = count
+        self.ids = self.column("q", count)
+        if width <= 8:
+            self.signatures = self.column("Q", count)
+        else:
+            data = self.bytes(width * count)
+            self.signatures = [int.from_bytes(data[i:i + width], "little") for i in range(0, width * count, width)]
+        total, itemsize = self.unpack(POSITIONS)
+        typecode = "h" if itemsize == 2 else "i"
+        self.positions = (self.column("I", total), self.column(typecode, total), self.column(typecode, total))
+        total, glyphs, colors = self.unpack(RENDERABLES)
+        self.renderables = tuple(self.column("I", total) for _ in range(4))
+        lengths = self.column("I", glyphs)
+        (size,) = self.unpack(EXTRA)
+        text = str(self.bytes(size), "utf-8")
+        self.glyphs = []
+        start = 0
+        for length in lengths:
+            self.glyphs.append(text[start:start + length])
+            start = start + length
+        self.colors = [((c >> 24) & 0xFF, (c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF) for c in self.column("I", colors)]
+        (size,) = self.unpack(EXTRA)
+        self.extra = pickle.loads(self.bytes(size)) if size else []
+
+    def unpack(self, format):
+        '''
+        Lê valores no formato do módulo struct.
+        return: tuple os valores lidos.
+        '''
+        values = struct.unpack_from(format, self.buffer, self.offset)
+        self.offset = align(self.offset + struct.calcsize(format))
+        return values
+
+    def bytes(self, size):
+        '''
+        Lê uma sequência de bytes sem copiá-la.
+        return: memoryview os bytes lidos.
+        '''
+        data = self.buffer[self.offset:self.offset + size]
+        self.offset = align(self.offset + size)
+        return data
+
+    def column(self, typecode, count):
+        '''
+        Lê uma coluna de valores em little-endian.
+        return: memoryview or array a coluna.
+        '''
+        data = self.bytes(array(typecode).itemsize * count)
+        if sys.byteorder == "little":
+            return data.cast(typecode)
+        values = array(typecode)
+        values.frombytes(data)
+        values.byteswap()
+        return values
+
+    def entities(self, rows = None):
+        '''
+        Constrói as entidades do arquivo com os seus componentes.
+        O coletor de lixo fica desligado durante a construção, que só cria objetos e não gera ciclos a coletar.
+        rows: None or list[int] as linhas construídas, em ordem crescente, None para todas.
+        return: list[Entity] as entidades na ordem das linhas.
+        '''
+        with paused():
+            return self.build(rows)
+
+    def build(self, rows = None):
+        '''
+        Constrói as entidades sem controlar o coletor de lixo.
+        Os objetos são criados sem chamar __init__ e cada campo é atribuído coluna a coluna, com o laço executado em C.
+        rows: None or list[int] as linhas construídas, em ordem crescente, None para todas.
+        return: list[Entity] as entidades na ordem das linhas.
+        '''
+        if rows is None:
+            total = self.count
+            ids, signatures = self.ids, self.signatures
+        else:
+            total = len(rows)
+            ids = map(self.ids.__getitem__, rows)
+            signatures = map(self.signatures.__getitem__, rows)
+        entities = list(map(object.__new__, repeat(Entity, total)))
+        components = list(map(dict, repeat((), total)))
+        assign(entities, "id", ids)
+        assign(entities, "signature", signatures)
+        assign(entities, "components", components)
+        assign(entities, "scene", repeat(None, total))
+        assign(entities, "handle", repeat(None, total))
+        picked, owners = self.select(self.positions[0], rows)
+        positions = self.create(Position, entities, components, owners)
+        for field, column in (("_x", self.positions[1]), ("_y", self.positions[2])):
+            assign(positions, field, column if picked is None else map(column.__getitem__, picked))
+        picked, owners = self.select(self.renderables[0], rows)
+        renders = self.create(Renderable, entities, components, owners)
+        for field, column, table in (("_glyph", self.renderables[1], self.glyphs),
+                                     ("_foreground", self.renderables[2], self.colors),
+                                     ("_background", self.renderables[3], self.colors)):
+            values = column if picked is None else map(column.__getitem__, picked)
+            assign(renders, field, map(table.__getitem__, values))
+        assign(renders, "_layer", repeat(0, len(owners)))
+        slots = None if rows is None or not self.extra else dict(zip(rows, count()))
+        for row, component in self.extra:
+            if slots is not None:
+                row = slots.get(row)
+                if row is None:
+                    continue
+            component.entity = entities[row]
+            entities[row].components[component.signature] = component
+        return entities
+
+    def select(self, column, rows):
+        '''
+        Determina quais componentes de uma coluna pertencem às linhas construídas.
+        Com numpy a busca é feita de uma só vez por searchsorted sobre as linhas ordenadas.
+        column: sequence[int] a linha da entidade de cada componente.
+        rows: None or list[int] as linhas construídas, em ordem crescente, None para todas.
+        return: tuple[None or list[int], sequence[int]] os índices dos componentes escolhidos, None para todos,
+        e a posição da entidade de cada um entre as linhas construídas.
+        '''
+        if rows is None:
+            return None, column
+        if not rows or not len(column):
+            return [], []
+        if numpy is not None:
+            owners = numpy.asarray(column, dtype=numpy.int64)
+            wanted = numpy.asarray(rows, dtype=numpy.int64)
+            slots = numpy.minimum(numpy.searchsorted(wanted, owners), len(wanted) - 1)
+            picked = numpy.flatnonzero(wanted[slots] == owners)
+            return picked.tolist(), slots[picked].tolist()
+        slots = dict(zip(rows, count()))
+        picked = [i for i, row in enumerate(column) if row in slots]
+        return picked, [slots[column[i]] for i in picked]
+
+    def create(self, cls, entities, components, rows):
+        '''
+        Cria os componentes de uma coluna sem chamar __init__ e os associa às entidades das linhas.
+        cls: type a classe dos componentes.
+        entities: list[Entity] as entidades em construção.
+        components: list[dict[int, Component]] os componentes de cada entidade.
+        rows: sequence[int] a linha da entidade de cada componente.
+        return: list[Component] os componentes, com os demais campos ainda por atribuir.
+        '''
+        created = list(map(object.__new__, repeat(cls, len(rows))))
+        assign(created, "signature", repeat(cls.id, len(rows)))
+        assign(created, "entity", map(entities.__getitem__, rows))
+        deque(map(dict.__setitem__, map(components.__getitem__, rows), repeat(cls.id), created), 0)
+        return created
+
+    def entity(self, row):
+        '''
+        Constrói uma única entidade com os seus componentes.
+        Os componentes são localizados por busca binária, já que as colunas seguem a ordem das linhas.
+        row: int a linha da entidade.
+        return: Entity a entidade construída.
+        '''
+        entity = Entity.restore(self.ids[row], self.signatures[row])
+        rows = self.positions[0]
+        i = bisect.bisect_left(rows, row)
+        if i < len(rows) and rows[i] == row:
+            self.position(entity, i)
+        rows = self.renderables[0]
+        i = bisect.bisect_left(rows, row)
+        if i < len(rows) and rows[i] == row:
+            self.renderable(entity, i)
+        i = bisect.bisect_left(self.extra, (row,), key=lambda item: item[:1])
+        while i < len(self.extra) and self.extra[i][0] == row:
+            component = self.extra[i][1]
+            component.entity = entity
+            entity.components[component.signature] = component
+            i = i + 1
+        return entity
+
+    def position(self, entity, i):
+        '''
+        Constrói a i-ésima posição do arquivo e a associa à entidade.
+        '''
+        position = Position.__new__(Position)
+        position.signature = Position.id
+        position.entity = entity
+        position._x = self.positions[1][i]
+        position._y = self.positions[2][i]
+        entity.components[Position.id] = position
+
+    def renderable(self, entity, i):
+        '''
+        Constrói o i-ésimo componente de desenho do arquivo e o associa à entidade.
+        '''
+        render = Renderable.__new__(Renderable)
+        render.signature = Renderable.id
+        render.entity = entity
+        render._glyph = self.glyphs[self.renderables[1][i]]
+        render._foreground = self.colors[self.renderables[2][i]]
+        render._background = self.colors[self.renderables[3][i]]
+        render._layer = 0
+        entity.components[Renderable.id] = render
+
+    def release(self):
+        '''
+        Libera as views sobre o buffer, permitindo fechar um mmap.
+        '''
+        for name in ("ids", "signatures"):
+            if isinstance(getattr(self, name), memoryview):
+                getattr(self, name).release()
+        for columns in (self.positions, self.renderables):
+            for column in columns:
+                if isinstance(column, memoryview):
+                    column.release()
+        self.buffer.release()
+
+
+class LazySnapshot:
+    '''
+    Entidades de um arquivo mapeado em memória que são construídas sob demanda para uma cena.
+    Somente as linhas já carregadas ocupam memória além das páginas do arquivo efetivamente lidas.
+    snapshot: Snapshot o conteúdo do arquivo.
+    scene: Scene a cena que recebe as entidades carregadas.
+    loaded: dict[int, Entity] as entidades já construídas por linha.
+    '''
+    def __init__(self, snapshot, scene, infile = None, buffer = None):
+        '''
+        infile: None or BinaryIO o arquivo aberto, fechado por close.
+        buffer: None or mmap o mapeamento do arquivo, fechado por close.
+        '''
+        self.snapshot = snapshot
+        self.scene = scene
+        self.loaded = dict()
+        self.infile = infile
+        self.buffer = buffer
+
+    @classmethod
+    def open(cls, filename, scene):
+        '''
+        Mapeia o arquivo em memória sem construir nenhuma entidade.
+        filename: str o nome do arquivo salvo por dump.
+        scene: Scene a cena que recebe as entidades carregadas.
+        return: LazySnapshot as entidades pendentes do arquivo.
+        '''
+        infile = open(filename, "rb")
+        buffer = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(Snapshot(buffer), scene, infile, buffer)
+
+    def last(self):
+        '''
+        Determina o maior id do arquivo.
+        return: int o maior id, ou zero para um arquivo vazio.
+        '''
+        return self.snapshot.ids[-1] if self.snapshot.count else 0
+
+    def materialize(self, row):
+        '''
+        Constrói a entidade da linha, se ainda não foi construída, e a cria na cena.
+        row: int a linha da entidade.
+        return: Entity a entidade da linha.
+        '''
+        entity = self.loaded.get(row)
+        if entity is None:
+            entity = self.snapshot.entity(row)
+            self.loaded[row] = entity
+            self.scene.create(entity)
+        return entity
+
+    def entity(self, id):
+        '''
+        Carrega a entidade com o identificador especificado por busca binária nos ids ordenados.
+        id: int o identificador da entidade.
+        return: None or Entity a entidade, ou None se ela não está no arquivo ou já foi destruída.
+        '''
+        ids = self.snapshot.ids
+        row = bisect.bisect_left(ids, id)
+        if row == len(ids) or ids[row] != id:
+            return None
+        entity = self.materialize(row)
+        return entity if entity.scene is self.scene else None
+
+    def rows(self, signature):
+        '''
+        Percorre as linhas cujas assinaturas possuem todos os bits da máscara.
+        Com numpy a coluna de assinaturas é comparada de uma só vez.
+        signature: int a máscara de bits com todos os componentes exigidos.
+        return: iterable[int] as linhas encontradas.
+        '''
+        signatures = self.snapshot.signatures
+        if numpy is not None and isinstance(signatures, memoryview) and signature < (1 << 64):
+            column = numpy.frombuffer(signatures, dtype=numpy.uint64)
+            mask = numpy.uint64(signature)
+            return numpy.flatnonzero((column & mask) == mask).tolist()
+        return [row for row in range(self.snapshot.count) if (signatures[row] & signature) == signature]
+
+    def load(self, signature):
+        '''
+        Carrega todas as entidades pendentes que satisfazem a máscara.
+        As linhas escolhidas são construídas de uma só vez, coluna a coluna, por Snapshot.entities.
+        signature: int a máscara de bits com todos os componentes exigidos.
+        '''
+        loaded = self.loaded
+        rows = [row for row in self.rows(signature) if row not in loaded]
+        entities = self.snapshot.entities(rows)
+        loaded.update(zip(rows, entities))
+        self.scene.createMany(entities)
+
+    def loadAll(self):
+        '''
+        Carrega todas as entidades pendentes.
+        '''
+        self.load(0)
+
+    def close(self):
+        '''
+        Libera o mapeamento e fecha o arquivo.
+        As entidades já carregadas continuam válidas.
+        '''
+        self.snapshot.release()
+        if self.buffer is not None:
+            self.buffer.close()
+        if self.infile is not None:
+            self.infile.close()
+
+
+def coordinates(positions):
+    '''
+    Lê as coordenadas de uma lista de posições coluna a coluna.
+    As views de uma mesma PositionColumns são lidas diretamente das colunas, as posições comuns pelos slots.
+    positions: list[Position] as posições.
+    return: tuple[array, array] as colunas x e y.
+    '''
+    kinds = set(map(type, positions))
+    if kinds <= {Position}:
+        return array("i", map(attrgetter("_x"), positions)), array("i", map(attrgetter("_y"), positions))
+    stores = set(map(attrgetter("columns"), positions)) if kinds == {PositionView} else ()
+    if len(stores) == 1:
+        data = stores.pop().data
+        rows = array("q", map(attrgetter("row"), positions))
+        if numpy is not None and isinstance(data["x"], numpy.ndarray):
+            rows = numpy.frombuffer(rows, dtype=numpy.int64)
+            return tuple(array("i", data[field][rows].astype(numpy.int32).tobytes()) for field in ("x", "y"))
+        return tuple(array("i", map(data[field].__getitem__, rows)) for field in ("x", "y"))
+    return array("i", map(attrgetter("x"), positions)), array("i", map(attrgetter("y"), positions))
+
+
+def indexes(values, table):
+    '''
+    Substitui os valores pelos seus índices na tabela, incluindo nela os valores novos.
+    values: list os valores.
+    table: dict[object, int] o índice de cada valor já incluído.
+    return: array[int] o índice de cada valor.
+    '''
+    for value in dict.fromkeys(values):
+        table.setdefault(value, len(table))
+    return array("I", map(table.__getitem__, values))
+
+
+def positional(component):
+    '''
+    Determina se o componente é salvo nas colunas das posições.
+    return: bool true para as posições.
+    '''
+    return isinstance(component, Position)
+
+
+def compact(component):
+    '''
+    Determina se o componente é salvo nas colunas dos componentes de desenho.
+    return: bool true para os Renderable da camada 0.
+    '''
+    return type(component) is Renderable and component._layer == 0
+
+
+def split(components, signature, accepts):
+    '''
+    Separa os componentes de uma assinatura salvos em colunas dos que vão para a seção em pickle.
+    components: list[dict[int, Component]] os componentes de cada linha.
+    signature: int a assinatura procurada.
+    accepts: callable o teste dos componentes salvos em colunas.
+    return: tuple[list[int], list[Component], list[int]] as linhas e os componentes salvos em colunas e as linhas
+    cujo componente vai para o pickle.
+    '''
+    found = list(map(dict.get, components, repeat(signature)))
+    rows = list(compress(count(), map(is_not, found, repeat(None))))
+    found = list(map(found.__getitem__, rows))
+    accepted = list(map(accepts, found))
+    if all(accepted):
+        return rows, found, []
+    rejected = [row for row, ok in zip(rows, accepted) if not ok]
+    return list(compress(rows, accepted)), list(compress(found, accepted)), rejected
+
+
+def dump(entities, outfile):
+    '''
+    Salva as entidades no formato binário em colunas.
+    Position e Renderable são salvos em colunas compactas, os demais componentes são salvos com pickle, assim como
+    os Renderable de camadas diferentes de 0.
+    As entidades são salvas em ordem crescente de id, o que permite localizá-las por busca binária.
+    As colunas são montadas campo a campo com map e attrgetter, sem um laço em Python por componente.
+    entities: iterable[Entity] as entidades salvas.
+    outfile: BinaryIO o arquivo de destino aberto em modo binário.
+    '''
+    ordered = sorted(entities, key=attrgetter("id"))
+    ids = array("q", map(attrgetter("id"), ordered))
+    signatures = list(map(attrgetter("signature"), ordered))
+    components = list(map(attrgetter("components"), ordered))
+    rows, found, skipped = split(components, Position.id, positional)
+    positions = (array("I", rows),) + coordinates(found)
+    rows, found, rejected = split(components, Renderable.id, compact)
+    skipped.extend(rejected)
+    glyphs = dict()
+    colors = dict()
+    renderables = (array("I", rows),
+                   indexes(list(map(attrgetter("_glyph"), found)), glyphs),
+                   indexes(list(map(attrgetter("_foreground"), found)), colors),
+                   indexes(list(map(attrgetter("_background"), found)), colors))
+    skipped.extend(compress(count(), map(and_, signatures, repeat(~(Position.id | Renderable.id)))))
+    extra = [(row, component) for row in sorted(set(skipped)) for signature, component in components[row].items()
+             if not (signature == Position.id and positional(component)) and not compact(component)]
+    width = max(8, (max(signatures, default=0).bit_length() + 7) // 8)
+    writer = Writer(outfile)
+    writer.pack(HEADER, MAGIC, VERSION, width, len(ids))
+    writer.column(ids)
+    if width == 8:
+        writer.column(array("Q", signatures))
+    else:
+        writer.write(b"".join(signature.to_bytes(width, "little") for signature in signatures))
+    xs, ys = positions[1], positions[2]
+    small = not xs or (min(min(xs), min(ys)) >= -32768 and max(max(xs), max(ys)) <= 32767)
+    writer.pack(POSITIONS, len(positions[0]), 2 if small else 4)
+    writer.column(positions[0])
+    writer.column(array("h", xs) if small else xs)
+    writer.column(array("h", ys) if small else ys)
+    writer.pack(RENDERABLES, len(renderables[0]), len(glyphs), len(colors))
+    for column in renderables:
+        writer.column(column)
+    writer.column(array("I", [len(glyph) for glyph in glyphs]))
+    text = "".join(glyphs).encode("utf-8")
+    writer.pack(EXTRA, len(text))
+    writer.write(text)
+    writer.column(array("I", [(r << 24) | (g << 16) | (b << 8) | a for r, g, b, a in colors]))
+    owners = [component.entity for _, component in extra]
+    for _, component in extra:
+        component.entity = None
+    data = pickle.dumps(extra) if extra else b""
+    for (_, component), owner in zip(extra, owners):
+        component.entity = owner
+    writer.pack(EXTRA, len(data))
+    writer.write(data)
@@ -0,0 +1,212 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import snapshot
+
+
+def read(filename):
+    '''
+    Lê e constrói as entidades de um arquivo de bloco, na thread de carregamento.
+    filename: str o nome do arquivo.
+    return: list[Entity] as entidades, vazia se o arquivo não existe.
+    '''
+    if not os.path.exists(filename):
+        return []
+    with open(filename, "rb") as infile:
+        return snapshot.Snapshot(infile.read()).entities()
+
+
+class World:
+    '''
+    Divide a grade de posições em blocos de size x size células que são salvos, descarregados e carregados
+    separadamente, cada um em um arquivo no formato do módulo snapshot.
+    Os blocos próximos dos pontos de vista seguidos são mantidos carregados, os demais são descarregados na ordem
+    do uso menos recente quando o número de blocos carregados passa de capacity. Os arquivos são lidos em segundo
+    plano e as entidades lidas entram na cena em update, na thread do jogo.
+    Um bloco que recebe uma entidade vinda de um bloco vizinho passa a ser carregado, para que o seu arquivo
+    seja incorporado antes de ser salvo novamente. Entidades sem posição não pertencem a nenhum bloco e ficam
+    sempre na cena.
+    ECS: EntityComponentSystem o sistema cuja cena é dividida.
+    directory: str a pasta dos arquivos dos blocos.
+    size: int o lado dos blocos, múltiplo do lado dos blocos do índice espacial da cena.
+    radius: int o número de blocos carregados em volta do bloco de cada ponto de vista.
+    capacity: int o número máximo de blocos carregados, excedido somente pelos blocos em uso.
+    resident: OrderedDict[tuple[int, int], None] os blocos carregados, do uso menos recente para o mais recente.
+    loading: dict[tuple[int, int], concurrent.futures.Future] as leituras em andamento.
+    viewpoints: list[tuple[int, int]] as coordenadas seguidas.
+    '''
+    def __init__(self, ECS, directory, size = 256, radius = 1, capacity = 64, executor = None):
+        '''
+        ECS: EntityComponentSystem o sistema cuja cena é dividida.
+        directory: str a pasta dos arquivos dos blocos, criada se necessário.
+        size: int o lado dos blocos, múltiplo do lado dos blocos do índice espacial, senão gera ValueError.
+        radius: int o número de blocos carregados em volta do bloco de cada ponto de vista.
+        capacity: int o número máximo de blocos carregados.
+        executor: None or concurrent.futures.Executor o executor das leituras, por padrão uma thread própria.
+        '''
+        spatial = ECS.scene.spatialIndex()
+        if size % spatial.size:
+            raise ValueError()
+        os.makedirs(directory, exist_ok=True)
+        self.ECS = ECS
+        self.directory = directory
+        self.size = size
+        self.ratio = size // spatial.size
+        self.radius = radius
+        self.capacity = capacity
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.resident = OrderedDict()
+        self.loading = dict()
+        self.viewpoints = []
+
+    def filename(self, key):
+        '''
+        Determina o arquivo de um bloco.
+        key: tuple[int, int] o bloco.
+        return: str o nome do arquivo.
+        '''
+        return os.path.join(self.directory, "chunk_%d_%d.ecs" % key)
+
+    def chunk(self, x, y):
+        '''
+        Determina o bloco que contém a coordenada.
+        return: tuple[int, int] as coordenadas do bloco.
+        '''
+        return ((x + 4096) // self.size, (y + 4096) // self.size)
+
+    def occupied(self):
+        '''
+        Determina os blocos que têm entidades na cena.
+        return: set[tuple[int, int]] os blocos ocupados.
+        '''
+        ratio = self.ratio
+        return {(cx // ratio, cy // ratio) for cx, cy in self.ECS.scene.spatial.cells}
+
+    def entities(self, key):
+        '''
+        Recupera as entidades da cena que estão no bloco.
+        key: tuple[int, int] o bloco.
+        return: list[Entity] as entidades do bloco.
+        '''
+        cells = self.ECS.scene.spatial.cells
+        ratio = self.ratio
+        result = []
+        for cx in range(key[0] * ratio, key[0] * ratio + ratio):
+            for cy in range(key[1] * ratio, key[1] * ratio + ratio):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    result.extend(bucket)
+        return result
+
+    def adopt(self):
+        '''
+        Considera carregados os blocos de todas as entidades já presentes na cena, por exemplo depois de loadState.
+        A cena passa a ser a versão válida desses blocos e os seus arquivos são substituídos no próximo salvamento.
+        '''
+        for key in self.occupied():
+            self.resident[key] = None
+
+    def follow(self, *viewpoints):
+        '''
+        Define as coordenadas cujos blocos vizinhos devem ficar carregados.
+        viewpoints: list[tuple[int, int]] as coordenadas, por exemplo a posição do jogador e da câmera.
+        '''
+        self.viewpoints = list(viewpoints)
+
+    def wanted(self):
+        '''
+        Determina os blocos em volta dos pontos de vista.
+        return: set[tuple[int, int]] os blocos desejados.
+        '''
+        keys = set()
+        for x, y in self.viewpoints:
+            cx, cy = self.chunk(x, y)
+            for dx in range(-self.radius, self.radius + 1):
+                for dy in range(-self.radius, self.radius + 1):
+                    keys.add((cx + dx, cy + dy))
+        return keys
+
+    def request(self, key):
+        '''
+        Agenda a leitura de um bloco que ainda não está carregado.
+        key: tuple[int, int] o bloco.
+        '''
+        if key not in self.resident and key not in self.loading:
+            self.loading[key] = self.executor.submit(read, self.filename(key))
+
+    def update(self):
+        '''
+        Deve ser chamado uma vez por quadro.
+        Insere na cena os blocos cuja leitura terminou, agenda a leitura dos blocos desejados e dos blocos ocupados
+        por entidades vindas de blocos vizinhos e descarrega os blocos menos usados além de capacity.
+        return: list[tuple[int, int]] os blocos inseridos na cena.
+        '''
+        wanted = self.wanted()
+        for key in wanted:
+            if key in self.resident:
+                self.resident.move_to_end(key)
+            else:
+                self.request(key)
+        for key in self.occupied():
+            if key not in self.resident:
+                self.request(key)
+        loaded = [key for key, future in self.loading.items() if future.done()]
+        for key in loaded:
+            entities = self.loading.pop(key).result()
+            self.ECS.scene.createMany(entities)
+            self.ECS.id = max([self.ECS.id] + [entity.id for entity in entities])
+            self.resident[key] = None
+        busy = wanted | self.occupied().difference(self.resident)
+        for key in list(self.resident):
+            if len(self.resident) <= self.capacity:
+                break
+            if key not in busy:
+                self.evict(key)
+        return loaded
+
+    def save(self, key):
+        '''
+        Salva as entidades do bloco no seu arquivo, substituindo o conteúdo anterior de forma atômica.
+        key: tuple[int, int] um bloco carregado.
+        return: list[Entity] as entidades salvas.
+        '''
+        entities = self.entities(key)
+        filename = self.filename(key)
+        if not entities:
+            if os.path.exists(filename):
+                os.remove(filename)
+            return entities
+        with open(filename + ".tmp", "wb") as outfile:
+            snapshot.dump(entities, outfile)
+        os.replace(filename + ".tmp", filename)
+        return entities
+
+    def evict(self, key):
+        '''
+        Salva o bloco e remove as suas entidades da cena.
+        key: tuple[int, int] um bloco carregado.
+        '''
+        entities = self.save(key)
+        self.ECS.scene.destroyMany(entities)
+        del self.resident[key]
+
+    def saveAll(self):
+        '''
+        Salva todos os blocos carregados sem removê-los da cena, esperando as leituras em andamento.
+        '''
+        while self.loading:
+            for future in list(self.loading.values()):
+                future.result()
+            self.update()
+        for key in self.resident:
+            self.save(key)
+
+    def close(self):
+        '''
+        Salva e descarrega todos os blocos e termina a thread de leitura.
+        '''
+        self.saveAll()
+        for key in list(self.resident):
+            self.evict(key)
+        self.executor.shutdown()
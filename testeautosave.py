@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from autosave import Autosave, journalName, replay, restore, segments
+from core import EntityComponentSystem, Entity, Scene, Position, Renderable
+
+
+class TestAutosave(unittest.TestCase):
+    # Testes para o salvamento automático incremental
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+        self.ECS = ECS
+        self.moving = Entity(ECS).add(Position(1, 1)).add(Renderable("@"))
+        self.wall = Entity(ECS).add(Position(2, 2))
+        ECS.scene.createMany([self.moving, self.wall])
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "save.data")
+        self.autosave = Autosave(ECS, self.filename, every=2, compaction=3)
+        self.autosave.start()
+        self.autosave.wait()
+
+    def test_segment(self):
+        # Teste para verificar se somente as entidades alteradas são escritas no diário
+        self.moving[Position.id].x = 5
+        self.assertFalse(self.autosave.frame())
+        self.assertTrue(self.autosave.frame())
+        self.autosave.wait()
+        written = list(segments(journalName(self.filename)))
+        self.assertEqual(len(written), 1)
+        self.assertEqual([entity.id for entity in written[0][1]], [self.moving.id])
+        self.assertEqual(replay(self.filename)[self.moving.id][Position.id], Position(5, 1))
+
+    def test_destroy(self):
+        # Teste para verificar se as entidades destruídas são removidas do estado salvo
+        self.ECS.scene.destroy(self.wall)
+        self.autosave.close()
+        self.assertEqual(set(replay(self.filename)), {self.moving.id})
+
+    def test_destroy_retained(self):
+        # Teste para verificar se uma destruição antiga é salva mesmo depois de history ticks sem cópia
+        self.ECS.scene.history = 1
+        self.ECS.scene.destroy(self.wall)
+        for _ in range(5):
+            self.ECS.scene.advance()
+        self.autosave.close()
+        self.assertEqual(set(replay(self.filename)), {self.moving.id})
+
+    def test_clear(self):
+        # Teste para verificar se a cena esvaziada por clear é gravada inteira, sem as entidades removidas
+        self.ECS.scene.clear()
+        loaded = Entity(self.ECS).add(Position(3, 3))
+        self.ECS.scene.create(loaded)
+        self.autosave.close()
+        self.assertEqual(set(replay(self.filename)), {loaded.id})
+        self.assertEqual(os.path.getsize(journalName(self.filename)), 0)
+
+    def test_compaction(self):
+        # Teste para verificar se o diário é incorporado ao arquivo base
+        for x in range(3):
+            self.moving[Position.id].x = x
+            self.autosave.frame()
+            self.autosave.frame()
+            self.autosave.wait()
+        self.assertEqual(os.path.getsize(journalName(self.filename)), 0)
+        self.assertEqual(replay(self.filename)[self.moving.id][Position.id], Position(2, 1))
+
+    def test_restore(self):
+        # Teste para verificar se o estado é carregado com o diário aplicado
+        self.moving[Renderable.id].glyph = "#"
+        self.autosave.close()
+        restore(self.filename, self.ECS)
+        loaded = self.ECS.scene.find(self.moving.id)
+        self.assertIsNot(loaded, self.moving)
+        self.assertEqual(loaded[Renderable.id].glyph, "#")
+        self.assertEqual(len(self.ECS.scene.entities), 2)
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.autosave.close(save=False)
+        self.directory.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
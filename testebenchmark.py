@@ -0,0 +1,34 @@
+import unittest
+from benchmark import compare, percentile, run
+
+
+class TestBenchmark(unittest.TestCase):
+    # Testes para o conjunto de benchmarks
+    def test_percentile(self):
+        # Teste para verificar se o percentil usa o vizinho mais próximo
+        samples = [float(i) for i in range(100)]
+        self.assertEqual(percentile(samples, 0.5), 50.0)
+        self.assertEqual(percentile(samples, 0.99), 99.0)
+        self.assertEqual(percentile(samples, 1.0), 99.0)
+
+    def test_run(self):
+        # Teste para verificar se cada operação gera um resultado com as métricas
+        report = run(sizes=(50,), mixes=("both",), selected=("filter", "save", "load"), count=500)
+        self.assertEqual([r["operation"] for r in report["results"]], ["create", "filter", "save", "load"])
+        for result in report["results"]:
+            self.assertEqual(result["entities"], 50)
+            self.assertLessEqual(result["p50"], result["max"])
+            self.assertGreaterEqual(result["peak"], 0)
+        self.assertGreater(report["memory"]["legacy"], report["memory"]["compact"])
+
+    def test_compare(self):
+        # Teste para verificar se somente as medianas que pioraram além da tolerância são apontadas
+        baseline = {"results": [{"operation": "filter", "mix": "both", "entities": 10, "p50": 1.0},
+                                {"operation": "load", "mix": "both", "entities": 10, "p50": 1.0}]}
+        current = {"results": [{"operation": "filter", "mix": "both", "entities": 10, "p50": 1.05},
+                               {"operation": "load", "mix": "both", "entities": 10, "p50": 2.0}]}
+        self.assertEqual(compare(baseline, current), [("load", "both", 10, 1.0, 2.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
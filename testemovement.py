@@ -0,0 +1,102 @@
+import unittest
+from core import EntityComponentSystem, Entity, Scene, Position, Renderable
+from movement import Movement, Velocity, VelocityView
+
+
+class TestMovement(unittest.TestCase):
+    # Testes para o sistema de movimento em lote
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+        self.ECS = ECS
+        self.walker = Entity(ECS).add(Position(0, 0)).add(Velocity(1, -1))
+        self.runner = Entity(ECS).add(Position(4095, 0)).add(Velocity(3, 0))
+        self.wall = Entity(ECS).add(Position(2, -2))
+        ECS.scene.createMany([self.walker, self.runner, self.wall])
+        self.movement = Movement()
+
+    def test_step(self):
+        # Teste para verificar se as posições recebem as velocidades e ficam na grade
+        self.movement.run(self.ECS)
+        self.assertEqual(self.walker[Position.id], Position(1, -1))
+        self.assertEqual(self.runner[Position.id], Position(4096, 0))
+        self.assertEqual(self.wall[Position.id], Position(2, -2))
+        self.assertIsInstance(self.walker[Velocity.id], VelocityView)
+
+    def test_wrap(self):
+        # Teste para verificar se as posições dão a volta na grade
+        self.movement.wrap = True
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(self.runner[Position.id], Position(-4095, 0))
+
+    def test_overlaps(self):
+        # Teste para verificar se as entidades na mesma célula são detectadas
+        self.assertEqual(self.movement.step(self.ECS.scene), [])
+        self.assertEqual([set(group) for group in self.movement.step(self.ECS.scene)], [{self.walker, self.wall}])
+
+    def test_edges(self):
+        # Teste para verificar se as bordas opostas da grade não são confundidas
+        left = Entity(self.ECS).add(Position(-4096, 5))
+        right = Entity(self.ECS).add(Position(4096, 3))
+        self.ECS.scene.createMany([left, right])
+        self.assertEqual(hash(left[Position.id]), hash(right[Position.id]))
+        self.assertEqual(self.movement.step(self.ECS.scene), [])
+
+    def test_membership(self):
+        # Teste para verificar se entidades criadas e destruídas entram e saem do passo
+        self.movement.step(self.ECS.scene)
+        late = Entity(self.ECS).add(Position(10, 10)).add(Velocity(0, 2))
+        self.ECS.scene.create(late)
+        self.ECS.scene.destroy(self.walker)
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(late[Position.id], Position(10, 12))
+        self.assertEqual(self.runner[Position.id], Position(4096, 0))
+
+    def test_notify(self):
+        # Teste para verificar se o índice espacial e o rastreamento acompanham o passo
+        spatial = self.ECS.scene.spatialIndex(2)
+        self.ECS.scene.track(Position.id)
+        since = self.ECS.scene.advance()
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(self.ECS.scene.changedSince(since, Position.id), {self.walker, self.runner})
+        self.assertEqual(spatial.at(1, -1), [self.walker])
+        self.assertEqual(spatial.at(4096, 0), [self.runner])
+
+    def test_record_many(self):
+        # Teste para verificar se somente as entidades que se moveram vão para o fim do registro
+        self.ECS.scene.track(Position.id)
+        since = self.ECS.scene.advance()
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(list(self.ECS.scene.changes[Position.id])[-2:], [self.walker, self.runner])
+        self.assertEqual(self.ECS.scene.changes[Position.id][self.wall], since - 1)
+        self.assertEqual(self.ECS.scene.changedSince(since, Position.id), {self.walker, self.runner})
+
+    def test_record_clamped(self):
+        # Teste para verificar se uma entidade parada na borda da grade não é registrada como alterada
+        self.movement.step(self.ECS.scene)
+        self.ECS.scene.track(Position.id)
+        since = self.ECS.scene.advance()
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(self.runner[Position.id], Position(4096, 0))
+        self.assertEqual(self.ECS.scene.changedSince(since, Position.id), {self.walker})
+
+    def test_record_all(self):
+        # Teste para verificar se o registro é refeito quando todas as entidades rastreadas se movem
+        self.ECS.scene.destroy(self.wall)
+        self.ECS.scene.track(Position.id)
+        since = self.ECS.scene.advance()
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(self.ECS.scene.changes[Position.id], {self.walker: since, self.runner: since})
+        self.assertEqual(self.ECS.scene.changedSince(since, Position.id), {self.walker, self.runner})
+
+    def test_render(self):
+        # Teste para verificar se entidades desenháveis continuam funcionando com as colunas
+        self.walker.add(Renderable("@"))
+        self.movement.step(self.ECS.scene)
+        self.assertEqual(self.ECS.scene.filter(Position.id, Renderable.id), {self.walker})
+        self.assertEqual(self.walker[Position.id].x, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from core import EntityComponentSystem, Entity, Scene, Position
+from pathfinding import Blocking, FlowField, Pathfinder
+
+
+class TestFlowField(unittest.TestCase):
+    # Testes para o mapa de direções até um objetivo
+    def test_open(self):
+        # Teste para verificar as distâncias e direções sem bloqueios
+        field = FlowField((0, 0), 4, dict())
+        self.assertEqual(field.distance(3, -2), 5)
+        self.assertEqual(field.direction(0, 0), (0, 0))
+        self.assertIn(field.direction(3, -2), [(-1, 0), (0, 1)])
+        self.assertIsNone(field.distance(5, 0))
+
+    def test_wall(self):
+        # Teste para verificar se o caminho contorna as células bloqueadas
+        wall = {(1, y): 1 for y in range(-4, 4)}
+        field = FlowField((0, 0), 4, wall)
+        self.assertEqual(field.distance(2, 0), 10)
+        self.assertIsNone(field.direction(1, 0))
+        x, y = 2, 0
+        for _ in range(10):
+            dx, dy = field.direction(x, y)
+            x, y = x + dx, y + dy
+            self.assertNotIn((x, y), wall)
+        self.assertEqual((x, y), (0, 0))
+
+    def test_edge(self):
+        # Teste para verificar se o mapa não sai da grade
+        field = FlowField((4096, 4096), 2, dict())
+        self.assertEqual(field.distance(4094, 4094), 4)
+        self.assertIsNone(field.distance(4097, 4096))
+
+
+class TestPathfinder(unittest.TestCase):
+    # Testes para os mapas compartilhados e a sua invalidação
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+        self.ECS = ECS
+        self.wall = Entity(ECS).add(Position(1, 0)).add(Blocking())
+        self.agents = [Entity(ECS).add(Position(2, 0)) for _ in range(3)]
+        ECS.scene.createMany([self.wall] + self.agents)
+        self.pathfinder = Pathfinder(ECS.scene, radius=8)
+
+    def test_shared(self):
+        # Teste para verificar se os agentes com o mesmo objetivo usam o mesmo mapa
+        directions = [self.pathfinder.direction(agent, (0, 0)) for agent in self.agents]
+        self.assertEqual(len(self.pathfinder.fields), 1)
+        self.assertIn(directions[0], [(0, 1), (0, -1)])
+        self.assertEqual(self.pathfinder.field((0, 0)).distance(2, 0), 4)
+
+    def test_move(self):
+        # Teste para verificar se somente os mapas afetados são descartados
+        near = self.pathfinder.field((0, 0))
+        far = self.pathfinder.field((100, 100))
+        self.ECS.scene.advance()
+        self.wall[Position.id].y = 5
+        self.assertEqual(self.pathfinder.update(), 1)
+        self.assertIs(self.pathfinder.field((100, 100)), far)
+        self.assertIsNot(self.pathfinder.field((0, 0)), near)
+        self.assertEqual(self.pathfinder.field((0, 0)).distance(2, 0), 2)
+
+    def test_destroy(self):
+        # Teste para verificar se bloqueios criados e destruídos são acompanhados
+        self.ECS.scene.advance()
+        self.ECS.scene.destroy(self.wall)
+        other = Entity(self.ECS).add(Position(-1, 0)).add(Blocking())
+        self.ECS.scene.create(other)
+        self.pathfinder.update()
+        self.assertEqual(self.pathfinder.blocked, {(-1, 0): 1})
+        self.assertEqual(self.pathfinder.field((0, 0)).distance(2, 0), 2)
+
+    def test_capacity(self):
+        # Teste para verificar se os mapas menos usados são descartados
+        self.pathfinder.capacity = 2
+        for goal in [(0, 0), (5, 5), (0, 0), (6, 6)]:
+            self.pathfinder.field(goal)
+        self.assertEqual(list(self.pathfinder.fields), [(0, 0), (6, 6)])
+
+
+if __name__ == '__main__':
+    unittest.main()
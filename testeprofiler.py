@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+from core import EntityComponentSystem, Entity, Query, Scene, Position
+from profiler import Profiler
+from scheduler import Scheduler, System
+
+
+class FakeECS:
+    # Sistema falso com uma cena própria
+    scene = None
+    framebuffer = None
+
+
+class TestProfiler(unittest.TestCase):
+    # Testes para a classe Profiler
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.entities = [Entity(EntityComponentSystem).add(Position(i, 0)) for i in range(3)]
+        self.scene.createMany(self.entities)
+        self.profiler = Profiler()
+
+    def test_install(self):
+        # Teste para verificar se os métodos são restaurados ao desinstalar
+        original = Scene.filter
+        with self.profiler:
+            self.assertIsNot(Scene.filter, original)
+        self.assertIs(Scene.filter, original)
+
+    def test_frame(self):
+        # Teste para verificar se as chamadas e os sistemas do quadro são registrados
+        with self.profiler:
+            self.profiler.begin()
+            self.assertEqual(len(self.scene.filter(Position.id)), 3)
+            self.entities[0][Position.id]
+            self.profiler.system("move", 0.5)
+            record = self.profiler.end(self.scene)
+        self.assertEqual(record["entities"], 3)
+        self.assertEqual(record["systems"], {"move": 0.5})
+        self.assertEqual(record["calls"]["Scene.filter"]["calls"], 1)
+        self.assertEqual(record["calls"]["Scene.filter"]["items"], 3)
+        self.assertEqual(record["calls"]["Entity.__getitem__"]["calls"], 1)
+        self.assertEqual(sum(self.profiler.histogram.values()), 1)
+
+    def test_nested(self):
+        # Teste para verificar se as chamadas internas de um método instrumentado não são contadas de novo
+        with self.profiler:
+            self.profiler.begin()
+            self.scene.filter(Position.id)
+            self.entities[0][Position.id]
+            self.scene.query(Position.id)
+            record = self.profiler.end(self.scene)
+        self.assertEqual(record["calls"]["Scene.filter"]["calls"], 1)
+        self.assertEqual(record["calls"]["Scene.query"]["calls"], 1)
+        self.assertNotIn("Entity.get", record["calls"])
+
+    def test_each(self):
+        # Teste para verificar se os itens de Scene.each e as consultas de Query.run são contados
+        with self.profiler:
+            self.profiler.begin()
+            items = [entity for entity, position in self.scene.each(Position.id) if entity[Position.id] is position]
+            Query(all=Position.id).run(self.scene)
+            record = self.profiler.end(self.scene)
+        self.assertEqual(len(items), 3)
+        self.assertEqual(record["calls"]["Scene.each"]["calls"], 1)
+        self.assertEqual(record["calls"]["Scene.each"]["items"], 3)
+        self.assertEqual(record["calls"]["Entity.__getitem__"]["calls"], 3)
+        self.assertEqual(record["calls"]["Query.run"]["items"], 3)
+        self.assertNotIn("Scene.query", record["calls"])
+        self.assertIn("blocks", record)
+
+    def test_scheduler(self):
+        # Teste para verificar se o scheduler entrega a medição de cada quadro
+        ECS = FakeECS()
+        ECS.scene = self.scene
+        scheduler = Scheduler([System(reads=Position.id, run=lambda ECS: ECS.scene.filter(Position.id), name="a")],
+                              workers=2, profiler=self.profiler)
+        with self.profiler:
+            scheduler.run(ECS)
+            scheduler.run(ECS)
+        scheduler.close()
+        report = self.profiler.report()
+        self.assertEqual(report["frames"], 2)
+        self.assertIn("a", report["systems"])
+        self.assertEqual(report["calls"]["Scene.filter"]["calls"], 2)
+
+    def test_dump(self):
+        # Teste para verificar se o relatório é salvo periodicamente
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "profile.json")
+            profiler = Profiler(filename, interval=0)
+            profiler.begin()
+            profiler.end()
+            with open(filename) as infile:
+                data = json.load(infile)
+        self.assertEqual(data["report"]["frames"], 1)
+        self.assertEqual(len(data["frames"]), 1)
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.profiler.uninstall()
+        self.scene = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from render import Framebuffer, pack, unpack
+
+
+class TestFramebuffer(unittest.TestCase):
+    # Testes para a classe Framebuffer
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.framebuffer = Framebuffer(4, 3)
+        self.framebuffer.flush()
+
+    def test_pack(self):
+        # Teste para verificar se a cor compactada é recuperada corretamente
+        self.assertEqual(unpack(pack((1, 2, 3, 4))), (1, 2, 3, 4))
+
+    def test_put(self):
+        # Teste para verificar se o caractere é desenhado no buffer de trás
+        self.framebuffer.put(1, 2, "@", (255, 0, 0, 255))
+        self.assertEqual(self.framebuffer.get(1, 2), ("@", (255, 0, 0, 255), (0, 0, 0, 255)))
+        self.framebuffer.put(9, 9, "@")  # fora da tela, deve ser ignorado
+
+    def test_flush_static(self):
+        # Teste para verificar se uma tela sem alterações não emite nada
+        self.framebuffer.clear()
+        self.assertEqual(self.framebuffer.flush(), "")
+
+    def test_flush_changes(self):
+        # Teste para verificar se somente as células alteradas são emitidas
+        self.framebuffer.put(1, 0, "a")
+        self.framebuffer.put(2, 0, "b")
+        self.framebuffer.put(3, 2, "c")
+        self.assertEqual(list(self.framebuffer.changes()), [(0, 1, 3), (2, 3, 4)])
+        output = self.framebuffer.flush()
+        self.assertIn("\x1b[1;2H", output)
+        self.assertIn("ab", output)
+        self.assertIn("\x1b[3;4H", output)
+        self.assertEqual(self.framebuffer.flush(), "")
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.framebuffer = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import unittest
+from core import EntityComponentSystem, Entity, Scene, Position, Renderable
+from rewind import Rewind, footprint
+
+
+class TestRewind(unittest.TestCase):
+    # Testes para o buffer de quadros anteriores
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+        self.ECS = ECS
+        self.moving = Entity(ECS).add(Position(0, 0)).add(Renderable("@"))
+        ECS.scene.create(self.moving)
+        self.rewind = Rewind(ECS)
+        self.rewind.start()
+
+    def step(self, x):
+        # Move a entidade e grava o quadro
+        self.ECS.scene.find(self.moving.id)[Position.id].x = x
+        return self.rewind.record()
+
+    def test_back(self):
+        # Teste para verificar se a cena volta ao estado de quadros anteriores
+        for x in range(1, 5):
+            self.step(x)
+        self.assertEqual(len(self.rewind.ticks()), 5)
+        self.rewind.back(2)
+        self.assertEqual(self.ECS.scene.find(self.moving.id)[Position.id], Position(2, 0))
+        self.assertEqual(len(self.rewind.ticks()), 3)
+        self.rewind.back(10)
+        self.assertEqual(self.ECS.scene.find(self.moving.id)[Position.id], Position(0, 0))
+
+    def test_create_destroy(self):
+        # Teste para verificar se entidades criadas e destruídas são desfeitas
+        tick = self.step(1)
+        wall = Entity(self.ECS).add(Position(3, 3))
+        self.ECS.scene.create(wall)
+        self.step(2)
+        self.ECS.scene.destroy(self.ECS.scene.find(self.moving.id))
+        self.rewind.record()
+        self.assertIsNone(self.ECS.scene.find(self.moving.id))
+        self.rewind.restore(tick)
+        self.assertEqual({e.id for e in self.ECS.scene.entities}, {self.moving.id})
+        self.assertEqual(self.ECS.scene.find(self.moving.id)[Renderable.id].glyph, "@")
+
+    def test_budget(self):
+        # Teste para verificar se os deltas antigos são incorporados ao quadro-chave
+        self.rewind.budget = self.rewind.size + 1000
+        for x in range(100):
+            self.step(x)
+        self.assertLessEqual(self.rewind.size, self.rewind.budget)
+        ticks = self.rewind.ticks()
+        self.assertLess(len(ticks), 101)
+        self.rewind.restore(ticks[0])
+        self.assertEqual(self.ECS.scene.find(self.moving.id)[Position.id].x, 100 - len(ticks))
+
+    def test_size(self):
+        # Teste para verificar se o quadro-chave é medido pela memória dos objetos e não pela codificação
+        keyframe = footprint(self.rewind.keyframe.values())
+        self.assertGreater(keyframe, footprint([self.rewind.keyframe[self.moving.id].components]))
+        self.assertEqual(self.rewind.size, keyframe + sys.getsizeof(self.rewind.keyframe))
+        self.step(1)
+        self.assertEqual(self.rewind.size, keyframe + sys.getsizeof(self.rewind.keyframe) + len(self.rewind.deltas[0][1]))
+
+    def test_invalid(self):
+        # Teste para verificar se um tick fora do buffer é rejeitado
+        with self.assertRaises(ValueError):
+            self.rewind.restore(-1)
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.rewind = None
+
+
+if __name__ == "__main__":
+    unittest.main()
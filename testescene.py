@@ -0,0 +1,672 @@
+import gc
+import pickle
+import unittest
+import core
+from core import Component, ComponentRegistry, EntityComponentSystem, Entity, Scene, Position, Renderable, PositionColumns, PositionView, Prefab, Camera, layered, update
+from render import Framebuffer
+
+
+class TestSceneQuery(unittest.TestCase):
+    # Testes para as consultas registradas da classe Scene
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.entity = Entity(EntityComponentSystem)
+        self.entity.add(Position(1, 2))
+        self.scene.create(self.entity)
+
+    def test_query_registered(self):
+        # Teste para verificar se a consulta é registrada na primeira chamada
+        self.assertEqual(self.scene.filter(Position.id), {self.entity})
+        self.assertIn(Position.id, self.scene.queries)
+
+    def test_query_add_remove(self):
+        # Teste para verificar se a consulta acompanha add e remove da entidade
+        mask = Position.id | Renderable.id
+        self.assertEqual(self.scene.filter(mask), set())
+        self.entity.add(Renderable("a"))
+        self.assertEqual(self.scene.filter(mask), {self.entity})
+        self.entity.remove(Position.id)
+        self.assertEqual(self.scene.filter(mask), set())
+
+    def test_query_create_destroy(self):
+        # Teste para verificar se a consulta acompanha create e destroy da cena
+        self.scene.filter(Position.id)
+        other = Entity(EntityComponentSystem).add(Position(3, 4))
+        self.scene.create(other)
+        self.assertEqual(self.scene.filter(Position.id), {self.entity, other})
+        self.scene.destroy(self.entity)
+        self.assertEqual(self.scene.filter(Position.id), {other})
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+        self.entity = None
+
+class TestSceneArchetype(unittest.TestCase):
+    # Testes para o armazenamento por arquétipos da classe Scene
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene(archetypes=True)
+        self.position = Position(1, 2)
+        self.renderable = Renderable("a")
+        self.entity = Entity(EntityComponentSystem).add(self.position)
+        self.scene.create(self.entity)
+
+    def test_create(self):
+        # Teste para verificar se a entidade é inserida na tabela da sua assinatura
+        table = self.scene.archetypes[Position.id]
+        self.assertEqual(table.entities, [self.entity])
+        self.assertEqual(table.columns[Position.id], [self.position])
+
+    def test_create_twice(self):
+        # Teste para verificar se criar a mesma entidade de novo não duplica a sua linha
+        self.scene.create(self.entity)
+        self.scene.createMany([self.entity])
+        self.assertEqual(self.scene.archetypes[Position.id].entities, [self.entity])
+        self.scene.destroy(self.entity)
+        self.assertEqual(self.scene.filter(Position.id), set())
+
+    def test_migrate(self):
+        # Teste para verificar se a entidade migra de tabela quando a assinatura muda
+        self.entity.add(self.renderable)
+        self.assertEqual(len(self.scene.archetypes[Position.id]), 0)
+        table = self.scene.archetypes[Position.id | Renderable.id]
+        self.assertEqual(table.columns[Renderable.id], [self.renderable])
+        self.entity.remove(Renderable.id)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(self.scene.archetypes[Position.id].entities, [self.entity])
+
+    def test_delete_swap(self):
+        # Teste para verificar se a remoção move a última linha para a posição liberada
+        other = Entity(EntityComponentSystem).add(Position(3, 4))
+        self.scene.create(other)
+        self.scene.destroy(self.entity)
+        table = self.scene.archetypes[Position.id]
+        self.assertEqual(table.entities, [other])
+        self.assertEqual(table.rows, {other: 0})
+
+    def test_each(self):
+        # Teste para verificar se each percorre somente as tabelas que satisfazem a máscara
+        self.assertEqual(list(self.scene.each(Position.id, Renderable.id)), [])
+        self.entity.add(self.renderable)
+        self.assertEqual(list(self.scene.each(Position.id, Renderable.id)), [(self.entity, self.position, self.renderable)])
+        self.assertEqual(self.scene.filter(Position.id), {self.entity})
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+        self.entity = None
+
+class TestPositionColumns(unittest.TestCase):
+    # Testes para o armazenamento de posições em colunas
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.columns = self.scene.store(PositionColumns(capacity=2))
+        self.entities = [Entity(EntityComponentSystem).add(Position(i, -i)) for i in range(3)]
+        for entity in self.entities:
+            self.scene.create(entity)
+
+    def test_view(self):
+        # Teste para verificar se a entidade passa a retornar uma view das colunas
+        position = self.entities[1][Position.id]
+        self.assertIsInstance(position, PositionView)
+        self.assertEqual((position.x, position.y), (1, -1))
+        position.x = 7
+        self.assertEqual(self.columns.data["x"][position.row], 7)
+
+    def test_translate_clamp(self):
+        # Teste para verificar se o deslocamento e o limite alcançam todas as posições
+        self.columns.translate(4095, 0)
+        self.columns.clamp()
+        self.assertEqual([e[Position.id].x for e in self.entities], [4095, 4096, 4096])
+
+    def test_destroy(self):
+        # Teste para verificar se a entidade destruída volta a ter uma posição independente
+        self.scene.destroy(self.entities[0])
+        self.assertNotIsInstance(self.entities[0][Position.id], PositionView)
+        self.assertEqual(self.entities[0][Position.id], Position(0, 0))
+        self.assertEqual(len(self.columns), 2)
+        self.assertEqual(self.entities[2][Position.id].row, 0)
+        self.assertEqual(self.entities[2][Position.id].x, 2)
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+        self.columns = None
+        self.entities = None
+
+class TestSpatialIndex(unittest.TestCase):
+    # Testes para o índice espacial da classe Scene
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.index = self.scene.spatialIndex(4)
+        self.a = Entity(EntityComponentSystem).add(Position(0, 0))
+        self.b = Entity(EntityComponentSystem).add(Position(3, 4))
+        self.c = Entity(EntityComponentSystem).add(Position(100, -100))
+        for entity in (self.a, self.b, self.c):
+            self.scene.create(entity)
+
+    def test_at(self):
+        # Teste para verificar a consulta por coordenada exata
+        self.assertEqual(self.index.at(3, 4), [self.b])
+        self.assertEqual(self.index.at(3, 3), [])
+
+    def test_rect_radius(self):
+        # Teste para verificar as consultas por retângulo e por raio
+        self.assertEqual(set(self.index.rect(-10, -10, 10, 10)), {self.a, self.b})
+        self.assertEqual(set(self.index.radius(0, 0, 5)), {self.a, self.b})
+        self.assertEqual(set(self.index.radius(0, 0, 4)), {self.a})
+
+    def test_nearest(self):
+        # Teste para verificar a consulta das entidades mais próximas
+        self.assertEqual(self.index.nearest(90, -90, 2), [self.c, self.a])
+
+    def test_move(self):
+        # Teste para verificar se o índice acompanha a alteração da posição
+        self.c[Position.id].x = 1
+        self.c[Position.id].y = 1
+        self.assertEqual(self.index.nearest(1, 1, 1), [self.c])
+        self.c.remove(Position.id)
+        self.assertEqual(self.index.at(1, 1), [])
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+        self.index = None
+
+class TestCompact(unittest.TestCase):
+    # Testes para a representação compacta das entidades e componentes
+    def test_slots(self):
+        # Teste para verificar se as instâncias não possuem __dict__
+        entity = Entity(EntityComponentSystem).add(Position(1, 2)).add(Renderable("a"))
+        for value in (entity, entity[Position.id], entity[Renderable.id]):
+            self.assertFalse(hasattr(value, "__dict__"))
+
+    def test_shared_colors(self):
+        # Teste para verificar se cores iguais compartilham a mesma tupla
+        first = Renderable("a", tuple([1, 2, 3, 255]))
+        second = Renderable("b", tuple([1, 2, 3, 255]))
+        self.assertIs(first.foreground, second.foreground)
+        self.assertIs(first.background, second.background)
+
+    def test_color_input(self):
+        # Teste para verificar se cores em listas são aceitas e se os setters também compartilham as tuplas
+        first = Renderable("a", [4, 5, 6, 255])
+        self.assertEqual(first.foreground, (4, 5, 6, 255))
+        second = Renderable("b")
+        second.foreground = [4, 5, 6, 255]
+        second.background = tuple([0, 0, 0, 255])
+        self.assertIs(second.foreground, first.foreground)
+        self.assertIs(second.background, first.background)
+
+    def test_palette_bound(self):
+        # Teste para verificar se a paleta não cresce além do limite
+        size = core.PALETTE_SIZE
+        core.PALETTE_SIZE = len(core.PALETTE)
+        try:
+            Renderable("a", (7, 7, 7, 255))
+            self.assertNotIn((7, 7, 7, 255), core.PALETTE)
+        finally:
+            core.PALETTE_SIZE = size
+
+    def test_pickle(self):
+        # Teste para verificar se a entidade compacta é salva e restaurada pelo pickle
+        entity = Entity(EntityComponentSystem).add(Position(1, 2))
+        Scene().create(entity)
+        restored = pickle.loads(pickle.dumps(entity))
+        self.assertEqual(restored, entity)
+        self.assertIsNone(restored.scene)
+        self.assertEqual(restored[Position.id], Position(1, 2))
+        self.assertIs(restored[Position.id].entity, restored)
+
+class TestSceneBatch(unittest.TestCase):
+    # Testes para a criação e remoção de entidades em lote
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene(archetypes=True)
+        self.scene.filter(Position.id)
+
+    def test_nextIds(self):
+        # Teste para verificar se os ids são alocados em bloco
+        first = EntityComponentSystem.id + 1
+        self.assertEqual(EntityComponentSystem.nextIds(3), range(first, first + 3))
+        self.assertEqual(EntityComponentSystem.id, first + 2)
+
+    def test_spawn(self):
+        # Teste para verificar se as entidades são criadas com os valores de cada coluna
+        entities = self.scene.spawn(EntityComponentSystem, 3, [Position(), Renderable("#")], {Position.id: {"x": [1, 2, 3], "y": [4, 5, 6]}})
+        self.assertEqual([e[Position.id] for e in entities], [Position(1, 4), Position(2, 5), Position(3, 6)])
+        self.assertEqual(self.scene.filter(Position.id | Renderable.id), set(entities))
+        self.assertIsNot(entities[0][Renderable.id], entities[1][Renderable.id])
+        self.assertIs(entities[0][Renderable.id].entity, entities[0])
+        self.assertEqual(len(self.scene.archetypes[Position.id | Renderable.id]), 3)
+
+    def test_spawn_invalid(self):
+        # Teste para verificar se coordenadas fora do limite são rejeitadas
+        with self.assertRaises(ValueError):
+            self.scene.spawn(EntityComponentSystem, 1, [Position()], {Position.id: {"x": [4097]}})
+
+    def test_spawn_collector(self):
+        # Teste para verificar se o coletor de lixo volta ao estado anterior depois de um lote, mesmo com erro
+        self.scene.spawn(EntityComponentSystem, 2, [Position()])
+        self.assertTrue(gc.isenabled())
+        gc.disable()
+        try:
+            self.scene.spawn(EntityComponentSystem, 2, [Position()])
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+        with self.assertRaises(ValueError):
+            self.scene.spawn(EntityComponentSystem, 1, [Position()], {Position.id: {"x": [4097]}})
+        self.assertTrue(gc.isenabled())
+
+    def test_create_destroy_many(self):
+        # Teste para verificar se create e destroy em lote mantêm as consultas
+        entities = [Entity(EntityComponentSystem).add(Position(i, i)) for i in range(4)]
+        entities.append(Entity(EntityComponentSystem).add(Renderable("a")))
+        self.scene.createMany(entities)
+        self.assertEqual(self.scene.filter(Position.id), set(entities[:4]))
+        self.scene.destroyMany(entities[1:3])
+        self.assertEqual(self.scene.filter(Position.id), {entities[0], entities[3]})
+        self.assertEqual(self.scene.entities, {entities[0], entities[3], entities[4]})
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+
+
+class TestSceneTracking(unittest.TestCase):
+    # Testes para o rastreamento de alterações dos componentes
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.a = Entity(EntityComponentSystem).add(Position(1, 1)).add(Renderable("a"))
+        self.b = Entity(EntityComponentSystem).add(Position(2, 2))
+        self.scene.createMany([self.a, self.b])
+        self.scene.track(Position.id | Renderable.id)
+
+    def test_track(self):
+        # Teste para verificar se as entidades existentes são consideradas alteradas
+        self.assertTrue(self.scene.tracks(Position.id | Renderable.id))
+        self.assertEqual(self.scene.changedSince(0, Position.id), {self.a, self.b})
+        self.assertEqual(self.scene.filterChanged(None, Renderable.id), {self.a})
+
+    def test_changedSince(self):
+        # Teste para verificar se somente as entidades alteradas depois do tick são retornadas
+        tick = self.scene.advance()
+        self.assertEqual(self.scene.changedSince(tick, Position.id), set())
+        self.b[Position.id].x = 5
+        self.a[Renderable.id].glyph = "b"
+        self.assertEqual(self.scene.changedSince(tick, Position.id), {self.b})
+        self.assertEqual(self.scene.changedSince(tick, Renderable.id), {self.a})
+        self.assertEqual(self.scene.filterChanged(tick, Position.id | Renderable.id), {self.a})
+
+    def test_add_remove(self):
+        # Teste para verificar se adicionar e remover componentes é registrado
+        tick = self.scene.advance()
+        self.b.add(Renderable("b"))
+        self.a.remove(Position.id)
+        self.assertEqual(self.scene.changedSince(tick, Renderable.id), {self.b})
+        self.assertEqual(self.scene.changedSince(tick, Position.id), {self.a})
+        self.assertEqual(self.scene.filterChanged(tick, Position.id), set())
+
+    def test_destroyed(self):
+        # Teste para verificar se as entidades destruídas são lembradas por history ticks
+        self.scene.history = 2
+        tick = self.scene.advance()
+        self.scene.destroy(self.b)
+        self.assertEqual(self.scene.changedSince(None, Position.id), {self.a})
+        self.assertEqual(self.scene.destroyedSince(tick), {self.b})
+        self.scene.advance()
+        self.scene.advance()
+        self.assertEqual(self.scene.destroyedSince(tick), {self.b})
+        self.scene.advance()
+        self.assertEqual(self.scene.destroyedSince(None), set())
+
+    def test_update(self):
+        # Teste para verificar se update redesenha somente as células alteradas
+        class ECS(EntityComponentSystem):
+            scene = self.scene
+            framebuffer = Framebuffer(8, 8)
+        update(ECS)
+        self.assertEqual(ECS.framebuffer.get(1, 1)[0], "a")
+        self.scene.advance()
+        self.a[Position.id].x = 3
+        update(ECS)
+        self.assertEqual(ECS.framebuffer.get(1, 1)[0], " ")
+        self.assertEqual(ECS.framebuffer.get(3, 1)[0], "a")
+        self.scene.advance()
+        self.scene.destroy(self.a)
+        update(ECS)
+        self.assertEqual(ECS.framebuffer.get(3, 1)[0], " ")
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+
+
+class TestCommands(unittest.TestCase):
+    # Testes para as alterações estruturais adiadas
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene(archetypes=True)
+        self.entities = [Entity(EntityComponentSystem).add(Position(i, i)) for i in range(4)]
+        self.scene.createMany(self.entities)
+
+    def test_iterate(self):
+        # Teste para verificar se as alterações durante a iteração só são aplicadas no apply
+        for entity in self.scene.iterate(Position.id):
+            if entity.id % 2:
+                self.scene.commands.destroy(entity)
+            else:
+                self.scene.commands.add(entity, Renderable("a"))
+        self.scene.commands.create(Entity(EntityComponentSystem).add(Renderable("b")))
+        self.assertEqual(len(self.scene.commands), 5)
+        self.assertEqual(len(self.scene.entities), 4)
+        self.assertEqual(self.scene.commands.apply(), 5)
+        self.assertEqual(len(self.scene.commands), 0)
+        self.assertEqual(self.scene.filter(Position.id | Renderable.id), {e for e in self.entities if e.id % 2 == 0})
+        self.assertEqual(len(self.scene.filter(Renderable.id)), 3)
+        self.assertEqual(len(self.scene.entities), 3)
+
+    def test_replace(self):
+        # Teste para verificar se remover e adicionar o mesmo componente substitui o componente nas tabelas
+        entity = self.entities[0]
+        position = Position(9, 9)
+        self.scene.commands.remove(entity, Position.id)
+        self.scene.commands.add(entity, position)
+        self.scene.commands.apply()
+        self.assertIs(entity[Position.id], position)
+        self.assertIn(entity, self.scene.filter(Position.id))
+        self.assertEqual([p for e, p in self.scene.each(Position.id) if e is entity], [position])
+
+    def test_invalid(self):
+        # Teste para verificar se uma operação inválida não altera a cena
+        self.scene.commands.add(self.entities[0], Renderable("a"))
+        self.scene.commands.remove(self.entities[1], Renderable.id)
+        with self.assertRaises(ValueError):
+            self.scene.commands.apply()
+        self.assertFalse(self.entities[0].has(Renderable.id))
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+
+
+class TestComponentRegistry(unittest.TestCase):
+    # Testes para o registro denso de tipos de componente
+    def test_register(self):
+        # Teste para verificar se cada mundo tem os seus próprios índices densos
+        class World(EntityComponentSystem):
+            registry = ComponentRegistry(width=2)
+
+        class Health(Component):
+            id = World.nextSignature()
+
+        class Armor(Component):
+            id = World.nextSignature()
+
+        self.assertEqual((Health.id, Armor.id), (1, 2))
+        self.assertEqual(World.registry.mask(Health, Armor), 3)
+        self.assertEqual(World.registry.components(2), [Armor])
+        self.assertEqual(EntityComponentSystem.registry.components(Position.id | Renderable.id), [Position, Renderable])
+        with self.assertRaises(OverflowError):
+            World.nextSignature()
+
+
+class TestHandles(unittest.TestCase):
+    # Testes para os handles geracionais e a busca pelo id
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.entities = [Entity(EntityComponentSystem).add(Position(i, i)) for i in range(3)]
+        self.scene.createMany(self.entities)
+
+    def test_find(self):
+        # Teste para verificar se a entidade é encontrada pelo id
+        self.assertIs(self.scene.find(self.entities[1].id), self.entities[1])
+        self.scene.destroy(self.entities[1])
+        self.assertIsNone(self.scene.find(self.entities[1].id))
+
+    def test_resolve(self):
+        # Teste para verificar se o handle de uma entidade destruída deixa de ser válido
+        handle = self.entities[0].handle
+        self.assertIs(self.scene.resolve(handle), self.entities[0])
+        self.scene.destroy(self.entities[0])
+        self.assertIsNone(self.entities[0].handle)
+        self.assertIsNone(self.scene.resolve(handle))
+
+    def test_resolve_created_twice(self):
+        # Teste para verificar se criar a entidade de novo não reserva outra posição nem mantém o handle após destruir
+        entity = self.entities[0]
+        handle = entity.handle
+        self.scene.create(entity)
+        self.scene.createMany([entity, self.entities[1]])
+        self.assertEqual(entity.handle, handle)
+        self.assertEqual(len(self.scene.handles.slots), 3)
+        self.scene.destroy(entity)
+        self.assertIsNone(self.scene.resolve(handle))
+        self.assertNotIn(entity, self.scene.handles.slots)
+        self.assertEqual(self.scene.handles.free, [handle & 0xFFFFFFFF])
+
+    def test_reuse(self):
+        # Teste para verificar se as posições liberadas são reutilizadas com nova geração
+        handle = self.entities[2].handle
+        self.scene.destroyMany(self.entities[1:])
+        entity = Entity(EntityComponentSystem)
+        self.scene.create(entity)
+        self.assertEqual(entity.handle & 0xFFFFFFFF, handle & 0xFFFFFFFF)
+        self.assertNotEqual(entity.handle, handle)
+        self.assertEqual(len(self.scene.handles.slots), 3)
+        first = self.entities[0].handle
+        self.scene.clear()
+        self.assertIsNone(self.scene.resolve(first))
+
+    def test_reuse_many(self):
+        # Teste para verificar se um lote reutiliza as posições liberadas antes de crescer a tabela
+        self.scene.destroyMany(self.entities[:2])
+        entities = [Entity(EntityComponentSystem) for _ in range(3)]
+        self.scene.createMany(entities)
+        self.assertEqual(len(self.scene.handles.slots), 4)
+        self.assertEqual(sorted(entity.handle & 0xFFFFFFFF for entity in entities), [0, 1, 3])
+        for entity in entities:
+            self.assertIs(self.scene.resolve(entity.handle), entity)
+        self.assertEqual([entity.handle >> 32 for entity in entities], [1, 1, 0])
+        self.assertEqual(self.scene.handles.free, [])
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scene = None
+
+
+class TestPrefab(unittest.TestCase):
+    # Testes para os modelos de entidade
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        template = Entity(EntityComponentSystem).add(Position(1, 2)).add(Renderable("#", (255, 0, 0, 255)))
+        self.prefab = Prefab.register("wall", template)
+
+    def test_instantiate(self):
+        # Teste para verificar se as instâncias são cópias independentes do modelo
+        first = Prefab.get("wall").instantiate(EntityComponentSystem, self.scene)
+        second = self.prefab.instantiate(EntityComponentSystem, self.scene, {Position.id: {"x": 7}})
+        third = self.prefab.instantiate(EntityComponentSystem)
+        self.assertEqual(len({first.id, second.id, third.id}), 3)
+        self.assertEqual(first[Position.id], Position(1, 2))
+        self.assertEqual(second[Position.id], Position(7, 2))
+        self.assertIs(second[Position.id].entity, second)
+        self.assertIsNot(first[Renderable.id], second[Renderable.id])
+        self.assertIs(first[Renderable.id].foreground, second[Renderable.id].foreground)
+        self.assertEqual(self.scene.filter(Position.id | Renderable.id), {first, second})
+        self.assertIsNone(third.scene)
+
+    def test_instantiate_invalid(self):
+        # Teste para verificar se um valor sobrescrito inválido é rejeitado
+        with self.assertRaises(ValueError):
+            self.prefab.instantiate(EntityComponentSystem, self.scene, {Position.id: {"y": 5000}})
+        self.assertEqual(self.scene.entities, set())
+
+    def test_instantiate_unknown(self):
+        # Teste para verificar se um valor sobrescrito de um componente ausente do modelo é rejeitado
+        with self.assertRaises(KeyError):
+            self.prefab.instantiate(EntityComponentSystem, self.scene, {1 << 40: {"x": 1}})
+        self.assertEqual(self.scene.entities, set())
+
+    def test_target(self):
+        # Teste para verificar se o slot e o validador de cada campo são resolvidos uma única vez
+        self.assertEqual(self.prefab.target(Position.id, "x"), ("_x", Position.check))
+        self.assertIsNone(self.prefab.target(Renderable.id, "glyph")[1])
+        self.assertIs(self.prefab.target(Position.id, "x"), self.prefab.target(Position.id, "x"))
+        entity = self.prefab.instantiate(EntityComponentSystem, self.scene, {Renderable.id: {"glyph": "@"}})
+        self.assertEqual(entity[Renderable.id].glyph, "@")
+
+    def test_instantiateMany(self):
+        # Teste para verificar se as instâncias em lote recebem os valores de cada coluna
+        entities = self.prefab.instantiateMany(EntityComponentSystem, self.scene, 3, {Position.id: {"x": [4, 5, 6]}})
+        self.assertEqual([e[Position.id] for e in entities], [Position(4, 2), Position(5, 2), Position(6, 2)])
+        self.assertEqual(self.scene.filter(Renderable.id), set(entities))
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        Prefab.registry.pop("wall", None)
+        self.scene = None
+    
+    
+        
+class TestCamera(unittest.TestCase):
+    # Testes para o desenho limitado à janela da câmera
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+            framebuffer = Framebuffer(8, 8)
+            camera = Camera(98, 98)
+        self.ECS = ECS
+        self.near = Entity(ECS).add(Position(2, 2)).add(Renderable("n"))
+        self.far = Entity(ECS).add(Position(100, 100)).add(Renderable("f"))
+        ECS.scene.createMany([self.near, self.far])
+
+    def test_layered(self):
+        # Teste para verificar se uma única camada mantém a lista e várias camadas são ordenadas de forma estável
+        items = list(self.ECS.scene.each(Position.id, Renderable.id))
+        self.assertIs(layered(items), items)
+        self.near[Renderable.id].layer = 3
+        top = Entity(self.ECS).add(Position(5, 5)).add(Renderable("t", layer=3))
+        self.ECS.scene.create(top)
+        items = list(self.ECS.scene.each(Position.id, Renderable.id))
+        ordered = layered(items)
+        self.assertEqual(ordered[0][0], self.far)
+        self.assertEqual([item[0] for item in ordered[1:]], [item[0] for item in items if item[2].layer == 3])
+
+    def test_visible(self):
+        # Teste para verificar se somente as entidades dentro da janela são visitadas
+        self.assertEqual(self.ECS.camera.visible(self.ECS.scene, self.ECS.framebuffer), [self.far])
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], "f")
+
+    def test_layer(self):
+        # Teste para verificar se a maior camada é desenhada por cima
+        top = Entity(self.ECS).add(Position(100, 100)).add(Renderable("t", layer=1))
+        self.ECS.scene.create(top)
+        self.far[Renderable.id].layer = 2
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], "f")
+        self.ECS.scene.track(Position.id | Renderable.id)
+        self.ECS.scene.advance()
+        self.far[Renderable.id].layer = 0
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], "t")
+
+    def test_layer_without_camera(self):
+        # Teste para verificar se a tela inteira também respeita as camadas
+        self.ECS.camera = None
+        bottom = Entity(self.ECS).add(Position(2, 2)).add(Renderable("b", layer=-1))
+        self.ECS.scene.create(bottom)
+        self.near[Renderable.id].layer = 1
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], "n")
+        self.near[Renderable.id].layer = -2
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], "b")
+
+    def test_redraw(self):
+        # Teste para verificar se o desenho incremental acompanha a câmera
+        self.ECS.scene.track(Position.id | Renderable.id)
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], "f")
+        self.ECS.scene.advance()
+        self.ECS.camera.center(2, 2, self.ECS.framebuffer)
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(4, 4)[0], "n")
+        self.assertEqual(self.ECS.framebuffer.get(2, 2)[0], " ")
+        self.ECS.scene.advance()
+        self.far[Position.id].x = 3
+        self.far[Position.id].y = 3
+        update(self.ECS)
+        self.assertEqual(self.ECS.framebuffer.get(5, 5)[0], "f")
+
+
+class TestQuery(unittest.TestCase):
+    # Testes para as consultas com exclusão, alternativas e predicados
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.extra = Component(1 << 70)
+        self.scenes = [Scene(), Scene(archetypes=True)]
+        self.entities = [
+            Entity(EntityComponentSystem).add(Position(1, 1)).add(Renderable("a")),
+            Entity(EntityComponentSystem).add(Position(2, 2)),
+            Entity(EntityComponentSystem).add(Renderable("c")),
+            Entity(EntityComponentSystem).add(Position(4, 4)).add(Component(self.extra.signature)),
+        ]
+
+    def test_select(self):
+        # Teste para verificar as máscaras all, none e any nos dois armazenamentos
+        for scene in self.scenes:
+            for entity in self.entities:
+                entity.scene = None
+            scene.createMany(self.entities)
+            a, b, c, d = self.entities
+            self.assertEqual(scene.select(all=Position.id, none=Renderable.id), {b, d})
+            self.assertEqual(scene.select(any=Renderable.id | self.extra.signature), {a, c, d})
+            self.assertEqual(scene.select(all=Position.id, any=Renderable.id | self.extra.signature), {a, d})
+            self.assertEqual(scene.select(all=Position.id, none=Position.id), set())
+            self.assertEqual(scene.select(none=Position.id), {c})
+            scene.destroyMany(self.entities)
+
+    def test_where(self):
+        # Teste para verificar se o predicado é aplicado ao resultado das máscaras
+        scene = self.scenes[0]
+        scene.createMany(self.entities)
+        far = lambda entity: entity[Position.id].x > 1
+        self.assertEqual(scene.select(all=Position.id, where=far), set(self.entities[1:2] + self.entities[3:]))
+        self.assertIs(scene.compile(all=Position.id, where=far).base, scene.compile(all=Position.id))
+        positions = [entity for entity in self.entities if entity.has(Position.id)]
+        for x in range(5):
+            expected = {entity for entity in positions if entity[Position.id].x > x}
+            self.assertEqual(scene.select(all=Position.id, where=lambda entity: entity[Position.id].x > x), expected)
+        self.assertEqual(len(scene.plans), 1)
+
+    def test_plan(self):
+        # Teste para verificar se o plano percorre a alternativa com menos entidades
+        scene = self.scenes[0]
+        scene.createMany(self.entities)
+        query = scene.compile(any=Renderable.id | self.extra.signature)
+        sets, exact = query.plan(scene)
+        self.assertTrue(exact)
+        self.assertEqual(sum(map(len, sets)), 3)
+
+    def test_new_archetype(self):
+        # Teste para verificar se uma tabela criada depois da compilação entra na consulta
+        scene = self.scenes[1]
+        scene.createMany(self.entities[:2])
+        self.assertEqual(scene.select(all=Position.id, none=Renderable.id), {self.entities[1]})
+        scene.create(self.entities[3])
+        self.assertEqual(scene.select(all=Position.id, none=Renderable.id), {self.entities[1], self.entities[3]})
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import threading
+import time
+import unittest
+from core import Position, Renderable
+from scheduler import Scheduler, System
+
+
+class TestSystem(unittest.TestCase):
+    # Testes para a classe System
+    def test_conflicts(self):
+        # Teste para verificar os conflitos entre leituras e escritas
+        reader = System(reads=Position.id)
+        writer = System(writes=Position.id)
+        other = System(reads=Renderable.id, writes=Renderable.id)
+        self.assertTrue(reader.conflicts(writer))
+        self.assertTrue(writer.conflicts(reader))
+        self.assertFalse(reader.conflicts(System(reads=Position.id)))
+        self.assertFalse(writer.conflicts(other))
+
+
+class TestScheduler(unittest.TestCase):
+    # Testes para a classe Scheduler
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scheduler = Scheduler(workers=4)
+        self.order = []
+
+    def record(self, name, delay = 0.0):
+        # Cria uma função que registra a execução
+        def run(ECS):
+            time.sleep(delay)
+            self.order.append(name)
+        run.__name__ = name
+        return run
+
+    def test_order(self):
+        # Teste para verificar se sistemas em conflito respeitam a ordem de registro
+        self.scheduler.add(System(writes=Position.id, run=self.record("move", 0.05)))
+        self.scheduler.add(System(reads=Position.id, run=self.record("draw")))
+        self.scheduler.run(None)
+        self.assertEqual(self.order, ["move", "draw"])
+
+    def test_parallel(self):
+        # Teste para verificar se sistemas sem conflito são executados ao mesmo tempo
+        barrier = threading.Barrier(2, timeout=1)
+        self.scheduler.add(System(reads=Position.id, run=lambda ECS: barrier.wait()))
+        self.scheduler.add(System(reads=Position.id, run=lambda ECS: barrier.wait()))
+        self.scheduler.run(None)
+
+    def test_report(self):
+        # Teste para verificar o caminho crítico do relatório
+        self.scheduler.add(System(writes=Position.id, run=self.record("a", 0.02)))
+        self.scheduler.add(System(writes=Position.id, run=self.record("b", 0.02)))
+        self.scheduler.add(System(writes=Renderable.id, run=self.record("c", 0.01)))
+        report = self.scheduler.run(None)
+        self.assertEqual(set(report["durations"]), {"a", "b", "c"})
+        self.assertAlmostEqual(report["critical"], report["durations"]["a"] + report["durations"]["b"])
+        self.assertGreaterEqual(report["work"], report["critical"])
+
+    def test_error(self):
+        # Teste para verificar se a exceção de um sistema é propagada
+        def fail(ECS):
+            raise KeyError()
+        self.scheduler.add(System(run=fail))
+        with self.assertRaises(KeyError):
+            self.scheduler.run(None)
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.scheduler.close()
+        self.scheduler = None
+
+
+if __name__ == "__main__":
+    unittest.main()
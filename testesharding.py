@@ -0,0 +1,80 @@
+import unittest
+from core import EntityComponentSystem, Entity, Scene, Position
+from sharding import ShardedWorld
+
+
+def shift(columns, dx):
+    # Kernel de teste que desloca todas as entidades do shard
+    xs = columns["x"]
+    for row in range(len(xs)):
+        xs[row] = xs[row] + dx + columns["speed"][row]
+
+
+class TestShardedWorld(unittest.TestCase):
+    # Testes para a classe ShardedWorld
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.scene = Scene()
+        self.entities = [Entity(EntityComponentSystem).add(Position(x, 0)) for x in (-4000, -10, 10, 4000)]
+        for entity in self.entities:
+            self.scene.create(entity)
+        self.world = ShardedWorld(self.scene, shift, shards=2, fields=("speed",), initial={"speed": lambda e: 1}, capacity=1)
+
+    def test_partition(self):
+        # Teste para verificar se as entidades são divididas pela coordenada x
+        self.assertEqual(set(self.world.shards[0].entities), set(self.entities[:2]))
+        self.assertEqual(set(self.world.shards[1].entities), set(self.entities[2:]))
+
+    def test_step_handoff(self):
+        # Teste para verificar se as entidades que cruzam a borda mudam de shard
+        self.world.start()
+        self.world.step(19)
+        self.assertEqual(set(self.world.shards[0].entities), {self.entities[0]})
+        self.assertEqual(set(self.world.shards[1].entities), set(self.entities[1:]))
+        self.world.sync()
+        self.assertEqual([e[Position.id].x for e in self.entities], [-3980, 10, 30, 4020])
+
+    def test_edges(self):
+        # Teste para verificar se as entidades nas bordas das faixas ficam no shard que as contém
+        for count in (2, 3, 4, 8, 16):
+            world = ShardedWorld(Scene(), shift, shards=count, capacity=1)
+            for i, shard in enumerate(world.shards):
+                for x in (shard.low, shard.high - 1):
+                    self.assertEqual(world.locate(x), i)
+            world.close()
+        edge = Entity(EntityComponentSystem).add(Position(0, 0))
+        self.scene.create(edge)
+        shard = self.world.shards[self.world.locate(0)]
+        self.assertTrue(shard.low <= 0 < shard.high)
+        self.world.handoff()
+        self.assertIn(edge, shard.entities)
+        self.assertEqual(sum(len(shard.entities) for shard in self.world.shards), 5)
+
+    def test_observe(self):
+        # Teste para verificar se as entidades criadas, alteradas e destruídas na cena entram e saem dos shards
+        late = Entity(EntityComponentSystem).add(Position(-20, 0))
+        self.scene.create(late)
+        self.assertIs(self.world.slots[late], self.world.shards[0])
+        self.scene.destroy(self.entities[0])
+        self.assertNotIn(self.entities[0], self.world.slots)
+        self.assertEqual(set(self.world.shards[0].entities), {self.entities[1], late})
+        self.assertEqual(self.world.shards[0].rows, {entity: row for row, entity in enumerate(self.world.shards[0].entities)})
+        self.entities[3].remove(Position.id)
+        self.assertEqual(self.world.shards[1].entities, [self.entities[2]])
+        self.assertEqual(list(self.world.shards[0].columns()["x"]), [e[Position.id].x for e in self.world.shards[0].entities])
+        self.scene.clear()
+        self.assertEqual(self.world.slots, dict())
+        scene = Scene()
+        world = ShardedWorld(scene, shift, shards=2, capacity=1)
+        world.close()
+        self.assertEqual(scene.observers, [])
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.world.close()
+        self.world = None
+        self.scene = None
+
+
+if __name__ == "__main__":
+    unittest.main()
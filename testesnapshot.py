@@ -0,0 +1,141 @@
+import io
+import os
+import tempfile
+import unittest
+from core import Component, EntityComponentSystem, Entity, Scene, Position, PositionColumns, Renderable, saveState, loadState
+from snapshot import MAGIC, Snapshot, dump
+
+
+class TestSnapshot(unittest.TestCase):
+    # Testes para o formato binário em colunas
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        self.entities = [
+            Entity(EntityComponentSystem).add(Position(1, -2)).add(Renderable("@", (255, 0, 0, 255))),
+            Entity(EntityComponentSystem).add(Position(-4096, 4096)),
+            Entity(EntityComponentSystem).add(Renderable("é")).add(Component(1 << 70)),
+        ]
+        self.outfile = io.BytesIO()
+        dump(self.entities, self.outfile)
+
+    def test_magic(self):
+        # Teste para verificar se o arquivo começa com a assinatura do formato
+        self.assertEqual(self.outfile.getvalue()[:4], MAGIC)
+
+    def test_round_trip(self):
+        # Teste para verificar se as entidades carregadas são iguais às salvas
+        loaded = Snapshot(self.outfile.getvalue()).entities()
+        self.assertEqual(loaded, self.entities)
+        for original, entity in zip(self.entities, loaded):
+            self.assertEqual(entity.signature, original.signature)
+            self.assertEqual(set(entity.components), set(original.components))
+        self.assertEqual(loaded[0][Position.id], Position(1, -2))
+        self.assertEqual(loaded[0][Renderable.id].foreground, (255, 0, 0, 255))
+        self.assertEqual(loaded[2][Renderable.id].glyph, "é")
+        self.assertIs(loaded[2][1 << 70].entity, loaded[2])
+
+    def test_layer(self):
+        # Teste para verificar se a camada do desenho é preservada
+        entity = Entity(EntityComponentSystem).add(Renderable("#", layer=3))
+        outfile = io.BytesIO()
+        dump(self.entities + [entity], outfile)
+        loaded = Snapshot(outfile.getvalue()).entities()
+        self.assertEqual(loaded[-1][Renderable.id].layer, 3)
+        self.assertEqual(loaded[-1][Renderable.id].glyph, "#")
+        self.assertEqual(loaded[0][Renderable.id].layer, 0)
+
+    def test_columns(self):
+        # Teste para verificar se as posições armazenadas em colunas são salvas a partir das colunas
+        scene = Scene()
+        scene.createMany(self.entities)
+        scene.store(PositionColumns())
+        outfile = io.BytesIO()
+        dump(self.entities, outfile)
+        loaded = Snapshot(outfile.getvalue()).entities()
+        self.assertEqual(loaded[0][Position.id], Position(1, -2))
+        self.assertEqual(loaded[1][Position.id], Position(-4096, 4096))
+        self.assertEqual(type(loaded[1][Position.id]), Position)
+        self.assertIs(loaded[1][Position.id].entity, loaded[1])
+
+    def test_rows(self):
+        # Teste para verificar se somente as linhas pedidas são construídas, com os seus componentes
+        snapshot = Snapshot(self.outfile.getvalue())
+        loaded = snapshot.entities([0, 2])
+        self.assertEqual(loaded, [self.entities[0], self.entities[2]])
+        self.assertEqual(loaded[0][Position.id], Position(1, -2))
+        self.assertEqual(loaded[1][Renderable.id].glyph, "é")
+        self.assertIs(loaded[1][1 << 70].entity, loaded[1])
+        self.assertNotIn(Position.id, loaded[1].components)
+        self.assertEqual(snapshot.entities([]), [])
+
+    def test_invalid(self):
+        # Teste para verificar se um arquivo de outro formato é rejeitado
+        with self.assertRaises(ValueError):
+            Snapshot(b"\0" * 64)
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.entities = None
+        self.outfile = None
+
+
+class TestLazyLoad(unittest.TestCase):
+    # Testes para o carregamento sob demanda de um arquivo mapeado em memória
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+        self.ECS = ECS
+        self.moving = Entity(ECS).add(Position(1, 1)).add(Renderable("@"))
+        self.wall = Entity(ECS).add(Position(2, 2))
+        ECS.scene.create(self.moving)
+        ECS.scene.create(self.wall)
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+        saveState(self.filename, ECS)
+        ECS.scene = Scene()
+        loadState(self.filename, ECS, lazy=True)
+
+    def test_nothing_loaded(self):
+        # Teste para verificar se nenhuma entidade é construída ao abrir o arquivo
+        self.assertEqual(self.ECS.scene.entities, set())
+
+    def test_filter_loads_matches(self):
+        # Teste para verificar se a consulta carrega somente as entidades encontradas
+        self.assertEqual(self.ECS.scene.filter(Renderable.id), {self.moving})
+        self.assertEqual(self.ECS.scene.entities, {self.moving})
+
+    def test_registered_query(self):
+        # Teste para verificar se uma consulta registrada antes do carregamento não carrega tudo
+        self.ECS.scene.filter(Position.id)
+        loadState(self.filename, self.ECS, lazy=True)
+        self.assertEqual(self.ECS.scene.entities, set())
+        self.assertEqual(self.ECS.scene.filter(Position.id), {self.moving, self.wall})
+
+    def test_load_columns(self):
+        # Teste para verificar se as linhas carregadas em lote recebem os seus próprios componentes
+        found = self.ECS.scene.filter(Position.id, Renderable.id)
+        self.assertEqual(found, {self.moving})
+        moving = found.pop()
+        self.assertEqual(moving[Position.id], Position(1, 1))
+        self.assertEqual(moving[Renderable.id].glyph, "@")
+        self.assertIs(moving[Position.id].entity, moving)
+        wall = self.ECS.scene.find(self.wall.id)
+        self.assertEqual(wall[Position.id], Position(2, 2))
+        self.assertEqual(set(wall.components), {Position.id})
+
+    def test_find(self):
+        # Teste para verificar se a procura pelo id carrega a entidade
+        entity = self.ECS.scene.find(self.wall.id)
+        self.assertEqual(entity, self.wall)
+        self.assertEqual(entity[Position.id], Position(2, 2))
+        self.assertIsNone(self.ECS.scene.find(-1))
+
+    def tearDown(self):
+        # Limpa o ambiente de teste
+        self.ECS.scene.clear()
+        os.remove(self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from core import EntityComponentSystem, Entity, Scene, Position, Renderable
+from streaming import World
+
+
+class TestWorld(unittest.TestCase):
+    # Testes para a divisão do mundo em blocos carregados sob demanda
+    def setUp(self):
+        # Inicializa o ambiente de teste
+        class ECS(EntityComponentSystem):
+            scene = Scene()
+        self.ECS = ECS
+        self.directory = tempfile.mkdtemp()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.world = World(ECS, self.directory, size=16, radius=0, capacity=1, executor=self.executor)
+
+    def tearDown(self):
+        # Remove os arquivos dos blocos
+        self.executor.shutdown()
+        shutil.rmtree(self.directory)
+
+    def settle(self):
+        # Atualiza o mundo até que as leituras terminem
+        self.world.update()
+        while self.world.loading:
+            for future in list(self.world.loading.values()):
+                future.result()
+            self.world.update()
+
+    def test_evict_load(self):
+        # Teste para verificar se um bloco descarregado volta com as mesmas entidades
+        near = Entity(self.ECS).add(Position(1, 1)).add(Renderable("@"))
+        far = Entity(self.ECS).add(Position(100, 100)).add(Renderable("#"))
+        self.ECS.scene.createMany([near, far])
+        self.world.adopt()
+        self.world.follow((0, 0))
+        self.settle()
+        self.assertIsNone(self.ECS.scene.find(far.id))
+        self.assertIsNotNone(self.ECS.scene.find(near.id))
+        self.assertEqual(list(self.world.resident), [self.world.chunk(0, 0)])
+        self.world.follow((100, 100))
+        self.settle()
+        self.assertIsNone(self.ECS.scene.find(near.id))
+        loaded = self.ECS.scene.find(far.id)
+        self.assertEqual(loaded[Position.id], Position(100, 100))
+        self.assertEqual(loaded[Renderable.id].glyph, "#")
+
+    def test_move_between_chunks(self):
+        # Teste para verificar se uma entidade que entra em um bloco salvo não é perdida
+        walker = Entity(self.ECS).add(Position(1, 1))
+        resident = Entity(self.ECS).add(Position(20, 1))
+        self.ECS.scene.createMany([walker, resident])
+        self.world.adopt()
+        self.world.follow((20, 1))
+        self.settle()
+        self.assertIsNone(self.ECS.scene.find(walker.id))
+        self.world.follow((1, 1))
+        self.settle()
+        walker = self.ECS.scene.find(walker.id)
+        walker[Position.id].x = 21
+        self.settle()
+        self.assertEqual(len(self.ECS.scene.entities), 0)
+        self.world.follow((21, 1))
+        self.settle()
+        self.assertEqual({entity.id for entity in self.ECS.scene.entities}, {walker.id, resident.id})
+
+    def test_spatial_size(self):
+        # Teste para verificar se o mundo usa o índice espacial da cena sem alterar o tamanho dos seus blocos
+        self.assertEqual(self.ECS.scene.spatial.size, 8)
+        self.assertEqual(self.world.ratio, 2)
+        with self.assertRaises(ValueError):
+            World(self.ECS, self.directory, size=12, executor=self.executor)
+
+    def test_global(self):
+        # Teste para verificar se entidades sem posição nunca são descarregadas
+        settings = Entity(self.ECS).add(Renderable("?"))
+        self.ECS.scene.create(settings)
+        self.world.follow((1000, 1000))
+        self.settle()
+        self.world.close()
+        self.assertIs(self.ECS.scene.find(settings.id), settings)
+
+    def test_save_all(self):
+        # Teste para verificar se saveAll mantém os blocos carregados e grava os seus arquivos
+        entity = Entity(self.ECS).add(Position(1, 1))
+        self.ECS.scene.create(entity)
+        self.world.adopt()
+        self.world.follow((1, 1))
+        self.world.saveAll()
+        self.assertIs(self.ECS.scene.find(entity.id), entity)
+        self.ECS.scene.clear()
+        self.world.resident.clear()
+        self.settle()
+        self.assertEqual(self.ECS.scene.find(entity.id)[Position.id], Position(1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()